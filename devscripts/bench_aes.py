@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of AES-128-CBC fragment decryption
+
+Usage: bench_aes.py [--size MiB] [--piece-size SIZE]
+
+The data is fed to the streaming decryptor in pieces, the way it arrives
+from the network. The native implementation is always measured; the
+pycryptodomex one also is if it is installed
+"""
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+import time
+import unittest.mock
+
+from yt_dlp import aes
+from yt_dlp.aes import AESCBCDecryptor, aes_cbc_decrypt, aes_cbc_encrypt_bytes
+from yt_dlp.dependencies import Cryptodome
+from yt_dlp.utils import parse_bytes
+
+KEY, IV = os.urandom(16), os.urandom(16)
+
+
+def stream_decrypt(data, piece_size):
+    decryptor = AESCBCDecryptor(KEY, IV)
+    for i in range(0, len(data), piece_size):
+        decryptor.update(data[i:i + piece_size])
+    decryptor.finalize()
+
+
+def measure(name, func, size):
+    start = time.perf_counter()
+    func()
+    print(f'{name:>14}: {size / 1024 ** 2 / (time.perf_counter() - start):8.2f} MB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=4, help='Size of the data in MiB (default: %(default)s)')
+    parser.add_argument('--piece-size', default='16K', help='Size of each piece passed to the decryptor (default: %(default)s)')
+    args = parser.parse_args()
+
+    size = args.size * 1024 ** 2
+    piece_size = parse_bytes(args.piece_size)
+    data = aes_cbc_encrypt_bytes(os.urandom(size - 1), KEY, IV)
+
+    if Cryptodome.AES:
+        measure('pycryptodomex', lambda: stream_decrypt(data, piece_size), size)
+    with unittest.mock.patch.object(aes.Cryptodome, 'AES', None):
+        measure('native', lambda: stream_decrypt(data, piece_size), size)
+    # The list based implementation that was used before, on a smaller sample as it is very slow
+    sample = data[:min(size, 256 * 1024)]
+    measure('native (lists)', lambda: aes_cbc_decrypt(*map(list, (sample, KEY, IV))), len(sample))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Measure the CPU time spent by HttpFD per GiB downloaded from a local server
+
+Usage: bench_http_download.py [--size MiB] [--buffer-size SIZE] [--compare]
+
+With --compare, the download is also run reading each block with read()
+instead of readinto() into a reused buffer
+"""
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+import http.server
+import multiprocessing
+import tempfile
+import time
+
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Response
+from yt_dlp.networking._urllib import UrllibResponseAdapter
+from yt_dlp.utils import parse_bytes
+from yt_dlp.utils._utils import _YDLLogger
+
+CHUNK = os.urandom(1024 * 1024)
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    size = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(self.size))
+        self.end_headers()
+        for _ in range(self.size // len(CHUNK)):
+            self.wfile.write(CHUNK)
+
+
+def serve(size, port_queue):
+    RequestHandler.size = size
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), RequestHandler)
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def download(port, params):
+    params = {'logger': _YDLLogger(), 'noprogress': True, **params}
+    with tempfile.TemporaryDirectory() as tmpdir, YoutubeDL(params) as ydl:
+        start_cpu, start = time.process_time(), time.perf_counter()
+        assert HttpFD(ydl, params).real_download(os.path.join(tmpdir, 'bench.mp4'), {
+            'url': f'http://127.0.0.1:{port}/bench.mp4',
+        })
+        return time.process_time() - start_cpu, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=1024, help='Size of the download in MiB (default: %(default)s)')
+    parser.add_argument('--buffer-size', default='1024', help='Initial block size (default: %(default)s)')
+    parser.add_argument('--compare', action='store_true', help='Also measure reading blocks with read()')
+    args = parser.parse_args()
+
+    size = args.size * len(CHUNK)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(size, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get()
+
+    runs = [('readinto', UrllibResponseAdapter.readinto)]
+    if args.compare:
+        # The base implementation reads a new bytes object for every block, as read() does, then copies it
+        runs.append(('read', Response.readinto))
+    try:
+        for name, readinto in runs:
+            UrllibResponseAdapter.readinto = readinto
+            cpu, wall = download(port, {'buffersize': parse_bytes(args.buffer_size)})
+            gib = size / 1024 ** 3
+            print(f'{name:>8}: {cpu / gib:6.2f}s CPU/GiB, {gib / wall:6.2f} GiB/s')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
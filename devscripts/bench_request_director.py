@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure the time RequestDirector takes to choose a handler for a request
+
+Usage: bench_request_director.py [--requests N] [--compare]
+
+The request handlers available are registered as YoutubeDL does, along with one that
+answers without any network access and is preferred over them. The requests are made
+as the fragment downloader would. With --compare, the handlers are also validated
+for every request, without the routes the director remembers
+"""
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+import io
+import time
+
+from yt_dlp import YoutubeDL
+from yt_dlp.networking import Request, RequestHandler, Response
+from yt_dlp.networking.common import _REQUEST_HANDLERS
+
+
+class NullRH(RequestHandler):
+    _SUPPORTED_URL_SCHEMES = ('http', 'https')
+    _SUPPORTED_PROXY_SCHEMES = ('http', 'https', 'socks4', 'socks4a', 'socks5', 'socks5h')
+
+    def _check_extensions(self, extensions):
+        super()._check_extensions(extensions)
+        extensions.pop('cookiejar', None)
+        extensions.pop('timeout', None)
+
+    def _send(self, request):
+        return Response(fp=io.BytesIO(b''), headers={}, url=request.url)
+
+
+def run(director, requests):
+    start = time.perf_counter()
+    for request in requests:
+        director.send(request)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=10000, help='Number of requests (default: %(default)s)')
+    parser.add_argument('--compare', action='store_true', help='Also measure without remembering the routes')
+    args = parser.parse_args()
+
+    with YoutubeDL({'quiet': True}) as ydl:
+        director = ydl.build_request_director([*_REQUEST_HANDLERS.values(), NullRH])
+        director.preferences.add(lambda rh, _: 10000 if isinstance(rh, NullRH) else 0)
+        print(f'Handlers: {", ".join(director.handlers)}; {len(director.preferences)} preferences')
+        requests = [
+            Request(f'https://example.com/segment{i}.ts', headers={'Range': 'bytes=0-'}, extensions={
+                'cookiejar': ydl.cookiejar,
+                'timeout': 20.0,
+            }) for i in range(args.requests)]
+
+        runs = [('routes', director._routing_key)]
+        if args.compare:
+            runs.append(('validate', lambda _: None))
+        for name, routing_key in runs:
+            director._routing_key = routing_key
+            elapsed = run(director, requests)
+            print(f'{name:>10}: {elapsed / args.requests * 1e6:6.1f}us per request')
+
+
+if __name__ == '__main__':
+    main()
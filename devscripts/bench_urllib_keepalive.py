@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measure the request rate of UrllibRH against a local HTTP server
+
+Usage: bench_urllib_keepalive.py [--requests N] [--size BYTES] [--https] [--compare]
+
+The requests are sent one after the other, as an extractor making API calls or the
+fragment downloader would. With --compare, they are also sent without keeping the
+connections alive, so that every request opens a new connection
+"""
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+import http.server
+import multiprocessing
+import ssl
+import time
+
+from yt_dlp.networking import Request
+from yt_dlp.networking._urllib import HTTPConnectionPool, UrllibRH
+from yt_dlp.utils._utils import _YDLLogger
+
+CERT_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'testcert.pem')
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and the payload are written separately
+    disable_nagle_algorithm = True
+    payload = b''
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+
+def serve(size, https, port_queue):
+    RequestHandler.payload = b'0' * size
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+    if https:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(CERT_FILE)
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    port_queue.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def run(url, count):
+    with UrllibRH(logger=_YDLLogger(), verify=False) as rh:
+        start = time.perf_counter()
+        for _ in range(count):
+            rh.send(Request(url)).read()
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=2000, help='Number of requests (default: %(default)s)')
+    parser.add_argument('--size', type=int, default=1024, help='Size of the responses in bytes (default: %(default)s)')
+    parser.add_argument('--https', action='store_true', help='Serve over TLS')
+    parser.add_argument('--compare', action='store_true', help='Also measure without keep-alive')
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args.size, args.https, port_queue), daemon=True)
+    server.start()
+    url = f'{"https" if args.https else "http"}://127.0.0.1:{port_queue.get()}/'
+
+    # No idle connection is kept when the pool cannot hold any
+    runs = [('keep-alive', HTTPConnectionPool.MAX_PER_HOST)]
+    if args.compare:
+        runs.append(('close', 0))
+    try:
+        for name, max_per_host in runs:
+            HTTPConnectionPool.MAX_PER_HOST = max_per_host
+            elapsed = run(url, args.requests)
+            print(f'{name:>10}: {args.requests / elapsed:8.0f} requests/s, {elapsed / args.requests * 1000:6.3f}ms per request')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
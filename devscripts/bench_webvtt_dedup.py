@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Measure the time spent deduplicating the cues of a segmented WebVTT stream
+
+Usage: bench_webvtt_dedup.py [--hours HOURS] [--cue-interval SECONDS] [--cue-duration SECONDS] [--compare]
+
+The synthetic stream has rolling captions: a new cue every --cue-interval seconds
+that stays on screen for --cue-duration seconds, and is repeated in every 6 second
+segment it overlaps. With --compare, the list of JSON cues that was used before
+CueDedupWindow is also measured, and checked to produce the same output
+"""
+
+# Allow direct execution
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import argparse
+import io
+import math
+import time
+
+from yt_dlp import webvtt
+
+SEGMENT_DURATION = 6
+
+
+def make_segments(hours, cue_interval, cue_duration):
+    cue_count = int(hours * 3600 / cue_interval)
+    for segment_start in range(0, int(hours * 3600), SEGMENT_DURATION):
+        segment_end = segment_start + SEGMENT_DURATION
+        output = io.StringIO()
+        output.write('WEBVTT\n\n')
+        first = max(0, math.floor((segment_start - cue_duration) / cue_interval))
+        for n in range(first, min(cue_count, math.ceil(segment_end / cue_interval))):
+            start, end = n * cue_interval, n * cue_interval + cue_duration
+            if end > segment_start:
+                webvtt.CueBlock(
+                    id=None, start=int(start * 90000), end=int(end * 90000),
+                    settings=None, text=f'Caption line {n}\n').write_into(output)
+                output.write('\n')
+        yield output.getvalue().encode()
+
+
+def dedup_window(cues):
+    output = io.StringIO()
+    window = webvtt.CueDedupWindow()
+    for cue in cues:
+        for ready in window.add(cue):
+            ready.write_into(output)
+    for cue in window:
+        cue.write_into(output)
+    return output.getvalue()
+
+
+def dedup_list(cues):
+    output = io.StringIO()
+    window = []
+    for block in cues:
+        ready = []
+        i = 0
+        is_new = True
+        while i < len(window):
+            wcue = window[i]
+            wblock = webvtt.CueBlock.from_json(wcue)
+            i += 1
+            if wblock.hinges(block):
+                wcue['end'] = block.end
+                is_new = False
+                continue
+            if wblock == block:
+                is_new = False
+                continue
+            if wblock.end > block.start:
+                continue
+            ready.append(wblock)
+            i -= 1
+            del window[i]
+        if is_new:
+            window.append(block.as_json)
+        for wblock in ready:
+            wblock.write_into(output)
+    for wcue in window:
+        webvtt.CueBlock.from_json(wcue).write_into(output)
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--hours', type=float, default=6, help='Length of the stream (default: %(default)s)')
+    parser.add_argument('--cue-interval', type=float, default=0.5, help='Seconds between cues (default: %(default)s)')
+    parser.add_argument('--cue-duration', type=float, default=30, help='Seconds a cue is shown (default: %(default)s)')
+    parser.add_argument('--compare', action='store_true', help='Also measure the list-based window')
+    args = parser.parse_args()
+
+    segments = list(make_segments(args.hours, args.cue_interval, args.cue_duration))
+    runs = [('window', dedup_window)]
+    if args.compare:
+        runs.append(('list', dedup_list))
+    outputs = set()
+    for name, dedup in runs:
+        # The cues are modified when they are continued, so every run parses its own
+        cues = [block for segment in segments for block in webvtt.parse_fragment(segment)
+                if isinstance(block, webvtt.CueBlock)]
+        start = time.perf_counter()
+        output = dedup(cues)
+        elapsed = time.perf_counter() - start
+        outputs.add(output)
+        print(f'{name:>6}: {elapsed:8.3f}s for {len(cues)} cues in {len(segments)} segments')
+    assert len(outputs) == 1, 'the outputs differ'
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,7 @@
 from yt_dlp.postprocessor.common import PostProcessor
 from yt_dlp.utils import (
     ExtractorError,
+    FragmentTable,
     LazyList,
     OnDemandPagedList,
     int_or_none,
@@ -1316,6 +1317,31 @@ def test(initial_info, note):
 
         try_rm(TEST_FILE)
 
+    def test_infojson_compact_fragments(self):
+        TEST_FILE = 'test_infojson_compact_fragments.info.json'
+        fragments = [{'url': 'https://example.com/init.mp4'}] + [
+            {'path': f'seg-{i}.m4s', 'duration': 2.0} for i in range(10)]
+        fmt = {
+            'url': 'https://example.com/manifest.mpd', 'fragment_base_url': 'https://example.com/',
+            'fragments': fragments, 'protocol': 'http_dash_segments', 'ext': 'mp4',
+        }
+
+        ydl = FakeYDL({'compact_fragments': True})
+        ydl.process_info = lambda x: ydl._write_info_json('test', x, TEST_FILE)
+        ydl.process_ie_result(_make_result([fmt]))
+        with open(TEST_FILE) as infojson:
+            written = json.load(infojson)
+        self.assertTrue(FragmentTable.is_json(written['formats'][0]['fragments']))
+
+        loaded = []
+        ydl.process_info = lambda x: loaded.append(x.copy())
+        ydl.download_with_info_file(TEST_FILE)
+        self.assertIsInstance(loaded[0]['fragments'], FragmentTable)
+        self.assertEqual(loaded[0]['fragments'], fragments)
+        self.assertEqual(ydl.sanitize_info(loaded[0])['fragments'], fragments)
+
+        try_rm(TEST_FILE)
+
     def test_add_headers_cookie(self):
         def check_for_cookie_header(result):
             return traverse_obj(result, ((None, ('formats', 0)), 'http_headers', 'Cookie'), casesense=False, get_all=False)
@@ -9,8 +9,11 @@
 
 
 import base64
+import unittest.mock
 
+from yt_dlp import aes
 from yt_dlp.aes import (
+    AESCBCDecryptor,
     aes_cbc_decrypt,
     aes_cbc_decrypt_bytes,
     aes_cbc_encrypt,
@@ -50,6 +53,34 @@ def test_cbc_decrypt(self):
         if Cryptodome.AES:
             decrypted = aes_cbc_decrypt_bytes(data, bytes(self.key), bytes(self.iv))
             self.assertEqual(decrypted.rstrip(b'\x08'), self.secret_msg)
+        else:
+            # The native implementation also takes the key and iv as lists
+            decrypted = aes_cbc_decrypt_bytes(data, self.key, self.iv)
+            self.assertEqual(decrypted.rstrip(b'\x08'), self.secret_msg)
+
+    def test_cbc_decryptor(self):
+        data = b'\x97\x92+\xe5\x0b\xc3\x18\x91ky9m&\xb3\xb5@\xe6\x27\xc2\x96.\xc8u\x88\xab9-[\x9e|\xf1\xcd'
+
+        def decrypt(data, key, iv, piece_size):
+            decryptor = AESCBCDecryptor(key, iv)
+            decrypted = b''.join(decryptor.update(data[i:i + piece_size]) for i in range(0, len(data), piece_size))
+            return decrypted + decryptor.finalize()
+
+        for piece_size in (1, 15, 16, 17, 32):
+            self.assertEqual(decrypt(data, self.key, self.iv, piece_size), self.secret_msg)
+        with self.assertRaises(ValueError):
+            decrypt(data[:-1], self.key, self.iv, 16)
+
+        msg = bytes(range(256)) * 3 + b'padded'
+        for key_size in (16, 24, 32):
+            key = list(range(key_size))
+            encrypted = bytes(aes_cbc_encrypt(list(msg), key, self.iv))
+            self.assertEqual(decrypt(encrypted, key, self.iv, 100), msg)
+            with unittest.mock.patch.object(aes.Cryptodome, 'AES', None):
+                self.assertEqual(decrypt(encrypted, key, self.iv, 100), msg)
+            self.assertEqual(
+                aes_cbc_decrypt_bytes(encrypted, bytes(key), bytes(self.iv)),
+                bytes(aes_cbc_decrypt(list(encrypted), key, self.iv)))
 
     def test_cbc_encrypt(self):
         data = list(self.secret_msg)
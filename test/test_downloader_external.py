@@ -8,13 +8,18 @@
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import http.cookiejar
+import http.server
+import itertools
+import json
+import threading
 
-from test.helper import FakeYDL
+from test.helper import FakeYDL, http_server_port, try_rm
 from yt_dlp.downloader.external import (
     Aria2cFD,
     AxelFD,
     CurlFD,
     FFmpegFD,
+    Aria2cDaemon,
     HttpieFD,
     WgetFD,
 )
@@ -105,6 +110,138 @@ def test_make_cmd(self):
             self.assertIn(f'--load-cookies={downloader._cookies_tempfile}', cmd)
 
 
+class Aria2cRPCHandler(http.server.BaseHTTPRequestHandler):
+    """Completes the downloads of aria2.addUri at once, writing the url to the file"""
+    calls = []
+    downloads = {}
+    gids = itertools.count()
+
+    def log_message(self, format, *args):
+        pass
+
+    def call(self, method, token, *params):
+        assert token == 'token:secret'
+        self.calls.append(method)
+        if method == 'aria2.addUri':
+            (url,), options = params
+            if 'fail' in url:
+                return {'code': 1, 'message': 'failed'}, None
+            gid = f'{next(self.gids):016x}'
+            with open(os.path.join(options['dir'], options['out']), 'wb') as f:
+                f.write(url.encode())
+            self.downloads[gid] = {'status': 'complete', 'totalLength': str(len(url)), 'completedLength': str(len(url))}
+            return None, gid
+        elif method == 'aria2.tellStatus':
+            return None, self.downloads[params[0]]
+        elif method == 'aria2.removeDownloadResult':
+            del self.downloads[params[0]]
+            return None, 'OK'
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if request['method'] == 'system.multicall':
+            results = []
+            for call in request['params'][0]:
+                error, result = self.call(call['methodName'], *call['params'])
+                results.append({'faultCode': error['code'], 'faultString': error['message']} if error else [result])
+            response = {'result': results}
+        else:
+            error, result = self.call(request['method'], *request['params'])
+            response = {'error': error} if error else {'result': result}
+        body = json.dumps({'id': request['id'], 'jsonrpc': '2.0', **response}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json-rpc')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestAria2cDaemon(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Aria2cRPCHandler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.params = {
+            'aria2c_rpc': f'http://127.0.0.1:{http_server_port(self.httpd)}/jsonrpc',
+            'aria2c_rpc_secret': 'secret',
+            'fragment_retries': 0,
+            'noprogress': True,
+        }
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        Aria2cRPCHandler.calls = []
+        Aria2cDaemon._instances.clear()
+
+    def download(self, info_dict):
+        filename = 'test_aria2c_daemon.mp4'
+        try:
+            with FakeYDL() as ydl:
+                self.assertTrue(Aria2cFD(ydl, self.params).real_download(filename, info_dict))
+            with open(filename, 'rb') as f:
+                return f.read()
+        finally:
+            try_rm(filename)
+
+    def test_download(self):
+        self.assertEqual(self.download(TEST_INFO), TEST_INFO['url'].encode())
+        self.assertEqual(self.download({
+            'url': 'http://www.example.com/playlist.m3u8',
+            'fragments': [{'url': f'http://www.example.com/seg{i}.ts'} for i in range(3)],
+        }), b''.join(f'http://www.example.com/seg{i}.ts'.encode() for i in range(3)))
+        # The downloads are added in one batch, and removed from the daemon once they are complete
+        self.assertEqual(Aria2cRPCHandler.calls.count('aria2.addUri'), 4)
+        self.assertEqual(Aria2cRPCHandler.calls.count('aria2.removeDownloadResult'), 4)
+        # Each download is polled once, by the wait for the downloads to stop
+        self.assertEqual(Aria2cRPCHandler.calls.count('aria2.tellStatus'), 4)
+        self.assertEqual(Aria2cRPCHandler.downloads, {})
+        self.assertEqual(len(Aria2cDaemon._instances), 1)
+
+    def test_failed_fragment(self):
+        self.params['fragment_retries'] = 2
+        self.assertEqual(self.download({
+            'url': 'http://www.example.com/playlist.m3u8',
+            'fragments': [{'url': f'http://www.example.com/{name}.ts'} for name in ('seg0', 'seg1', 'fail2')],
+        }), b'http://www.example.com/seg0.tshttp://www.example.com/seg1.ts')
+        # Only the failed fragment is added again for each retry
+        self.assertEqual(Aria2cRPCHandler.calls.count('aria2.addUri'), 5)
+
+    def test_wait_notifications(self):
+        with FakeYDL() as ydl:
+            downloader = Aria2cFD(ydl, self.params)
+            daemon = Aria2cDaemon.get(downloader)
+            Aria2cRPCHandler.downloads.update({
+                'a': {'status': 'complete'},
+                'b': {'status': 'active'},
+            })
+
+            class FakeWebSocket:
+                def __init__(self, gids):
+                    self.messages = [json.dumps({'method': 'aria2.onDownloadComplete', 'params': [{'gid': gid}]})
+                                     for gid in gids]
+
+                def recv(self):
+                    if self.messages:
+                        return self.messages.pop(0)
+                    # The downloads are polled once the notifications end
+                    raise ValueError
+
+                def close(self):
+                    pass
+
+            daemon._listening = True
+            daemon._watched.add('a')
+            # Only the downloads that are waited for are kept track of
+            daemon._receive(FakeWebSocket(['a', 'other']))
+            self.assertEqual(daemon.wait(ydl, {'a', 'b'}, 0), {'a': {'status': 'complete'}})
+            self.assertEqual(Aria2cRPCHandler.calls.count('aria2.tellStatus'), 1)
+            self.assertEqual(daemon.wait(ydl, {'b'}, 0, active=True), {'b': {'status': 'active'}})
+            daemon.forget({'b'})
+            self.assertEqual((daemon._watched, daemon._stopped), (set(), set()))
+            Aria2cRPCHandler.downloads.clear()
+
+
+
 @unittest.skipUnless(FFmpegFD.available(), 'ffmpeg not found')
 class TestFFmpegFD(unittest.TestCase):
     _args = []
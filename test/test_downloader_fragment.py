@@ -0,0 +1,819 @@
+#!/usr/bin/env python3
+
+# Allow direct execution
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import collections
+import concurrent.futures
+import glob
+import http.server
+import io
+import json
+import re
+import shutil
+import struct
+import threading
+import time
+
+from test.helper import http_server_port, try_rm
+from yt_dlp import YoutubeDL, webvtt
+from yt_dlp.aes import aes_cbc_encrypt_bytes
+from yt_dlp.compat import compat_etree_fromstring
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.downloader.fragment import (
+    FragmentFD,
+    FragmentJournal,
+    FragmentScheduler,
+    FragmentWriter,
+    LiveReloadWait,
+)
+from yt_dlp.downloader.hls import HlsFD
+from yt_dlp.downloader.hls_cache import HlsCache
+from yt_dlp.downloader.youtube_live_chat import YoutubeLiveChatFD
+from yt_dlp.networking import Response
+from yt_dlp.networking.exceptions import HTTPError
+from yt_dlp.utils import DownloadError
+from yt_dlp.utils._utils import _YDLLogger as FakeLogger
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+FRAGMENT_COUNT = 8
+
+
+def fragment_content(index):
+    return bytes([index]) * (1000 + index * 100)
+
+
+EXPECTED_CONTENT = b''.join(map(fragment_content, range(FRAGMENT_COUNT)))
+AES_KEY = bytes(range(16))
+INIT_SEGMENT = b'init' * 100
+# Cues are repeated in every segment they overlap, or continued by a cue with the same text
+WEBVTT_FRAGMENTS = (
+    ('00:00.000 --> 00:02.000\nA', '00:01.000 --> 00:04.000\nB'),
+    ('00:01.000 --> 00:04.000\nB', '00:02.000 --> 00:04.000\nA'),
+    ('00:04.000 --> 00:06.000\nC',),
+)
+
+
+def encrypted_fragment_content(index):
+    content = fragment_content(index)
+    padding = 16 - len(content) % 16
+    return aes_cbc_encrypt_bytes(content + bytes([padding]) * padding, AES_KEY, struct.pack('>8xq', index))
+
+
+class HTTPTestRequestHandler(http.server.BaseHTTPRequestHandler):
+    live_window = 5
+    live_reloads = 0
+    slow_fragments = ()
+    failing_fragments = ()
+    requested = []
+    connections = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, content, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path == '/playlist.m3u8':
+            self.send_body('\n'.join((
+                '#EXTM3U',
+                '#EXT-X-TARGETDURATION:2',
+                '#EXT-X-MEDIA-SEQUENCE:0',
+                *(f'#EXTINF:2.0,\nseg{i}.ts' for i in range(FRAGMENT_COUNT)),
+                '#EXT-X-ENDLIST',
+            )).encode(), 'application/vnd.apple.mpegurl')
+        elif self.path == '/encrypted.m3u8':
+            self.send_body('\n'.join((
+                '#EXTM3U',
+                '#EXT-X-TARGETDURATION:2',
+                '#EXT-X-MEDIA-SEQUENCE:0',
+                '#EXT-X-KEY:METHOD=AES-128,URI="key.bin"',
+                *(f'#EXTINF:2.0,\nenc{i}.ts' for i in range(FRAGMENT_COUNT)),
+                '#EXT-X-ENDLIST',
+            )).encode(), 'application/vnd.apple.mpegurl')
+        elif self.path == '/live.m3u8':
+            # The window of fragments moves forward by one on every reload
+            start = type(self).live_reloads
+            type(self).live_reloads += 1
+            end = min(start + self.live_window, FRAGMENT_COUNT)
+            self.send_body('\n'.join((
+                '#EXTM3U',
+                '#EXT-X-TARGETDURATION:0.05',
+                f'#EXT-X-MEDIA-SEQUENCE:{start}',
+                *(f'#EXTINF:0.05,\nseg{i}.ts' for i in range(start, end)),
+                *(['#EXT-X-ENDLIST'] if end == FRAGMENT_COUNT else []),
+            )).encode(), 'application/vnd.apple.mpegurl')
+        elif self.path == '/live.mpd':
+            # A SegmentTimeline in $Time$ units of fragments that moves forward like live.m3u8
+            start = type(self).live_reloads
+            type(self).live_reloads += 1
+            end = min(start + self.live_window, FRAGMENT_COUNT)
+            self.send_body(f'''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="{'static' if end == FRAGMENT_COUNT else 'dynamic'}"
+     minimumUpdatePeriod="PT0.05S" availabilityStartTime="1970-01-01T00:00:00Z">
+  <Period start="PT0S">
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="20" media="seg$Time$.ts" initialization="init.mp4">
+        <SegmentTimeline><S t="{start}" d="1" r="{end - start - 1}"/></SegmentTimeline>
+      </SegmentTemplate>
+      <Representation id="1" bandwidth="100000"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''.encode(), 'application/dash+xml')
+        elif self.path in ('/init.m3u8', '/init2.m3u8'):
+            self.send_body('\n'.join((
+                '#EXTM3U',
+                '#EXT-X-TARGETDURATION:2',
+                '#EXT-X-MAP:URI="init.mp4"',
+                *(f'#EXTINF:2.0,\nseg{i}.ts' for i in range(FRAGMENT_COUNT)),
+                '#EXT-X-ENDLIST',
+            )).encode(), 'application/vnd.apple.mpegurl')
+        elif self.path == '/subs.m3u8':
+            self.send_body('\n'.join((
+                '#EXTM3U',
+                '#EXT-X-TARGETDURATION:2',
+                *(f'#EXTINF:2.0,\nsub{i}.vtt' for i in range(len(WEBVTT_FRAGMENTS))),
+                '#EXT-X-ENDLIST',
+            )).encode(), 'application/vnd.apple.mpegurl')
+        elif mobj := re.fullmatch(r'/sub(\d+)\.vtt', self.path):
+            self.send_body('\n\n'.join(('WEBVTT', *WEBVTT_FRAGMENTS[int(mobj.group(1))], '')).encode(), 'text/vtt')
+        elif self.path == '/init.mp4':
+            self.requested.append('init')
+            self.send_body(INIT_SEGMENT, 'video/mp4')
+        elif self.path == '/key.bin':
+            self.requested.append('key')
+            self.send_body(AES_KEY, 'application/octet-stream')
+        elif mobj := re.fullmatch(r'/enc(\d+)\.ts', self.path):
+            self.send_body(encrypted_fragment_content(int(mobj.group(1))), 'video/mp2t')
+        elif mobj := re.fullmatch(r'/seg(\d+)\.ts', self.path):
+            index = int(mobj.group(1))
+            self.requested.append(index)
+            self.connections.add(self.client_address)
+            if index in self.slow_fragments:
+                time.sleep(0.5)
+            if index in self.failing_fragments:
+                self.send_error(404)
+                return
+            self.send_body(fragment_content(index), 'video/mp2t')
+        else:
+            assert False, self.path
+
+
+class TestHlsFD(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        HTTPTestRequestHandler.slow_fragments = ()
+        HTTPTestRequestHandler.failing_fragments = ()
+        HTTPTestRequestHandler.requested = []
+        HTTPTestRequestHandler.connections = set()
+        HTTPTestRequestHandler.protocol_version = 'HTTP/1.0'
+        HTTPTestRequestHandler.live_reloads = 0
+
+    def real_download(self, params, filename='testfile.mp4', playlist='playlist.m3u8', **info):
+        params['logger'] = FakeLogger()
+        # Closes the connections kept alive by the request handlers
+        with YoutubeDL(params) as ydl:
+            downloader = HlsFD(ydl, params)
+            return downloader.real_download(filename, {
+                'id': 'test',
+                'ext': 'mp4',
+                'url': f'http://127.0.0.1:{self.port}/{playlist}',
+                **info,
+            })
+
+    def download(self, params, playlist='playlist.m3u8', expected=EXPECTED_CONTENT, **info):
+        filename = 'testfile.mp4'
+        try_rm(filename)
+        try:
+            self.assertTrue(self.real_download(params, filename, playlist, **info))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(glob.glob(f'{filename}*-Frag*'), [])
+        finally:
+            try_rm(filename)
+
+    def interrupt_and_resume(self, params, failing_fragment):
+        filename = 'testfile.mp4'
+        params = {'skip_unavailable_fragments': False, 'fragment_retries': 0, **params}
+        HTTPTestRequestHandler.failing_fragments = (failing_fragment,)
+        try:
+            with self.assertRaises(DownloadError):
+                self.real_download(params.copy(), filename)
+            self.assertTrue(os.path.isfile(f'{filename}.ytdl.journal'))
+            # Data written after the last checkpoint is discarded
+            with open(f'{filename}.part', 'ab') as f:
+                f.write(b'garbage')
+
+            HTTPTestRequestHandler.failing_fragments = ()
+            HTTPTestRequestHandler.requested = []
+            self.assertTrue(self.real_download(params.copy(), filename))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), EXPECTED_CONTENT)
+            for suffix in ('.part', '.ytdl', '.ytdl.journal'):
+                self.assertFalse(os.path.exists(filename + suffix))
+            return HTTPTestRequestHandler.requested
+        finally:
+            for path in (filename, *glob.glob(f'{filename}.*')):
+                try_rm(path)
+
+    def test_regular(self):
+        self.download({})
+
+    def test_concurrent(self):
+        self.download({'concurrent_fragment_downloads': 4})
+
+    def test_fragment_buffer(self):
+        self.download({'fragment_buffer_size': 1024 * 1024})
+
+    @unittest.skipIf(os.name == 'nt', 'Pipes are opened through /dev/fd')
+    def test_pipe(self):
+        read_fd, write_fd = os.pipe()
+        output = []
+
+        def read():
+            with open(read_fd, 'rb') as f:
+                output.append(f.read())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            self.assertTrue(self.real_download(
+                {'concurrent_fragment_downloads': 4, 'fragment_buffer_size': 1024, '_no_ytdl_file': True},
+                f'/dev/fd/{write_fd}'))
+        finally:
+            os.close(write_fd)
+            reader.join()
+        self.assertEqual(output, [EXPECTED_CONTENT])
+        self.download({'fragment_buffer_size': 1024 * 1024, 'concurrent_fragment_downloads': 4})
+        # Fragments larger than the buffer are spilled to disk
+        self.download({'fragment_buffer_size': 1024, 'concurrent_fragment_downloads': 4})
+
+    def test_encrypted(self):
+        self.download({}, 'encrypted.m3u8')
+        # Decrypted while the fragments are downloaded
+        self.download({'fragment_buffer_size': 1024 * 1024}, 'encrypted.m3u8')
+        self.download({'fragment_buffer_size': 1024, 'concurrent_fragment_downloads': 4}, 'encrypted.m3u8')
+        # The key is only fetched once, also for the following downloads
+        self.assertEqual(HTTPTestRequestHandler.requested, ['key'])
+
+    def test_live(self):
+        for params in ({}, {'concurrent_fragment_downloads': 4}):
+            HTTPTestRequestHandler.live_reloads = 0
+            HTTPTestRequestHandler.requested = []
+            self.download({'live_from_start': True, **params}, 'live.m3u8', is_live=True)
+            # Every fragment is only downloaded once, although it is in several reloads of the playlist
+            self.assertEqual(sorted(HTTPTestRequestHandler.requested), list(range(FRAGMENT_COUNT)))
+            self.assertEqual(HTTPTestRequestHandler.live_reloads, FRAGMENT_COUNT - 4)
+
+    def test_live_edge(self):
+        # The recording starts with the last 3 fragments of the playlist
+        self.download({}, 'live.m3u8', b''.join(map(fragment_content, range(2, FRAGMENT_COUNT))), is_live=True)
+
+    def test_webvtt(self):
+        self.download({}, 'subs.m3u8', '\n\n'.join((
+            'WEBVTT',
+            '00:00:00.000 --> 00:00:04.000\nA',
+            '00:00:01.000 --> 00:00:04.000\nB',
+            '00:00:04.000 --> 00:00:06.000\nC',
+            '',
+        )).encode(), ext='vtt')
+
+    def test_init_segment_cache(self):
+        expected = INIT_SEGMENT + EXPECTED_CONTENT
+        self.download({}, 'init.m3u8', expected)
+        self.download({'concurrent_fragment_downloads': 4}, 'init2.m3u8', expected)
+        self.assertEqual(HTTPTestRequestHandler.requested.count('init'), 1)
+
+        cachedir = os.path.join(TEST_DIR, 'test_hls_cache')
+        try:
+            HlsCache.get_instance().clear()
+            HTTPTestRequestHandler.requested = []
+            self.download({'hls_persistent_cache': True, 'cachedir': cachedir}, 'init.m3u8', expected)
+            HlsCache.get_instance().clear()
+            self.download({'hls_persistent_cache': True, 'cachedir': cachedir}, 'init.m3u8', expected)
+            self.assertEqual(HTTPTestRequestHandler.requested.count('init'), 1)
+        finally:
+            shutil.rmtree(cachedir, ignore_errors=True)
+
+    def test_out_of_order(self):
+        HTTPTestRequestHandler.slow_fragments = (1, 2)
+        self.download({'concurrent_fragment_downloads': 4})
+        self.download({'concurrent_fragment_downloads': 4, 'fragment_reorder_window': 4})
+        self.download({'concurrent_fragment_downloads': 4, 'fragment_buffer_size': 1024 * 1024})
+
+    def test_keep_alive(self):
+        HTTPTestRequestHandler.protocol_version = 'HTTP/1.1'
+        self.download({'concurrent_fragment_downloads': 2, 'proxy': ''})
+        self.assertEqual(len(HTTPTestRequestHandler.requested), FRAGMENT_COUNT)
+        self.assertLessEqual(len(HTTPTestRequestHandler.connections), 2)
+
+    def test_retry(self):
+        HTTPTestRequestHandler.failing_fragments = (3,)
+        filename = 'testfile.mp4'
+        try:
+            self.assertTrue(self.real_download({
+                'concurrent_fragment_downloads': 4,
+                'fragment_retries': 2,
+            }, filename))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), EXPECTED_CONTENT.replace(fragment_content(3), b''))
+            self.assertEqual(HTTPTestRequestHandler.requested.count(3), 3)
+        finally:
+            try_rm(filename)
+
+    def test_resume(self):
+        self.assertEqual(self.interrupt_and_resume({}, 5), [5, 6, 7])
+
+    def test_resume_out_of_order(self):
+        HTTPTestRequestHandler.slow_fragments = (1,)
+        requested = self.interrupt_and_resume({'concurrent_fragment_downloads': 4}, 1)
+        # Fragments completed after the failed one are not downloaded again
+        self.assertEqual(requested[0], 1)
+        self.assertNotIn(2, requested)
+        self.assertNotIn(3, requested)
+
+
+class TestDashSegmentsFD(unittest.TestCase):
+    setUp = TestHlsFD.setUp
+    tearDown = TestHlsFD.tearDown
+
+    def test_multiple_formats(self):
+        params = {'logger': FakeLogger(), 'concurrent_fragment_downloads': 4}
+        downloader = DashSegmentsFD(YoutubeDL(params), params)
+        filenames = ['testfile.f1.mp4', 'testfile.f2.m4a']
+        for filename in filenames:
+            try_rm(filename)
+        fmt = {
+            'protocol': 'http_dash_segments',
+            'fragment_base_url': f'http://127.0.0.1:{self.port}/',
+            'fragments': [{'path': f'seg{i}.ts'} for i in range(FRAGMENT_COUNT)],
+        }
+        try:
+            self.assertTrue(downloader.real_download('testfile.mp4', {
+                'id': 'test',
+                'ext': 'mp4',
+                **fmt,
+                'requested_formats': [{**fmt, 'filepath': filename} for filename in filenames],
+            }))
+            for filename in filenames:
+                with open(filename, 'rb') as f:
+                    self.assertEqual(f.read(), EXPECTED_CONTENT)
+        finally:
+            for filename in filenames:
+                try_rm(filename)
+
+
+    def download_live(self, params, expected):
+        params['logger'] = FakeLogger()
+        downloader = DashSegmentsFD(YoutubeDL(params), params)
+        try_rm('testfile.mp4')
+        try:
+            self.assertTrue(downloader.real_download('testfile.mp4', {
+                'id': 'test',
+                'ext': 'mp4',
+                'format_id': 'dash-1',
+                'container': 'mp4_dash',
+                'tbr': 100,
+                'protocol': 'http_dash_segments',
+                'fragment_base_url': f'http://127.0.0.1:{self.port}/',
+                'manifest_url': f'http://127.0.0.1:{self.port}/live.mpd',
+                'fragments': [],
+                'is_live': True,
+            }))
+            with open('testfile.mp4', 'rb') as f:
+                self.assertEqual(f.read(), expected)
+        finally:
+            try_rm('testfile.mp4')
+
+    def test_live(self):
+        for params in ({}, {'concurrent_fragment_downloads': 4}):
+            HTTPTestRequestHandler.live_reloads = 0
+            HTTPTestRequestHandler.requested = []
+            self.download_live({'live_from_start': True, **params}, INIT_SEGMENT + EXPECTED_CONTENT)
+            # The initialization segment and every fragment are only downloaded once
+            self.assertEqual(HTTPTestRequestHandler.requested.count('init'), 1)
+            self.assertEqual(
+                sorted(i for i in HTTPTestRequestHandler.requested if i != 'init'), list(range(FRAGMENT_COUNT)))
+            self.assertEqual(HTTPTestRequestHandler.live_reloads, FRAGMENT_COUNT - 4)
+
+    def test_live_edge(self):
+        # The recording starts with the last 3 segments of the manifest
+        self.download_live({}, INIT_SEGMENT + b''.join(map(fragment_content, range(2, FRAGMENT_COUNT))))
+
+    def test_live_segments(self):
+        mpd_doc = compat_etree_fromstring('''<MPD type="dynamic" availabilityStartTime="2024-01-01T00:00:00Z"
+                timeShiftBufferDepth="PT10S" minimumUpdatePeriod="PT0S">
+            <BaseURL>https://example.com/live/</BaseURL>
+            <Period id="1" start="PT100S">
+                <AdaptationSet mimeType="audio/mp4">
+                    <SegmentTemplate timescale="1000" duration="4000" startNumber="10"
+                        media="$RepresentationID$/$Number%05d$-$Time$.m4s" initialization="$RepresentationID$/init"/>
+                    <Representation id="audio-1" bandwidth="128000"/>
+                    <Representation id="video-audio-1" bandwidth="64000"/>
+                </AdaptationSet>
+            </Period>
+        </MPD>''')
+        downloader = DashSegmentsFD(YoutubeDL({'logger': FakeLogger()}), {})
+
+        def live_segments(format_id, tbr, now=1704067200 + 121):
+            return downloader._live_segments(mpd_doc, 'https://example.com/live.mpd', {
+                'format_id': format_id,
+                'container': 'm4a_dash',
+                'tbr': tbr,
+                'fragment_base_url': 'https://example.com/live/',
+            }, now)
+
+        # 21s after the start of the period: 5 segments of 4s have been published, 2 fit in the buffer
+        segments = live_segments('dash-audio-1', 128)
+        self.assertEqual([segment['url'] for segment in segments], [
+            'https://example.com/live/audio-1/00013-12000.m4s',
+            'https://example.com/live/audio-1/00014-16000.m4s',
+        ])
+        self.assertEqual([segment['position'] for segment in segments], [13, 14])
+        self.assertEqual(segments[0]['init_url'], 'https://example.com/live/audio-1/init')
+        self.assertEqual(segments[0]['duration'], 4)
+        # The representation is not found by the suffix of its format id
+        self.assertEqual(
+            live_segments('dash-video-audio-1', 64)[0]['url'], 'https://example.com/live/video-audio-1/00013-12000.m4s')
+        with self.assertRaises(ValueError):
+            live_segments('dash-audio-1', 256)
+
+
+class TestFragmentWindow(unittest.TestCase):
+    def test_download_fragments_in_window(self):
+        lock = threading.Lock()
+        outstanding, max_outstanding = set(), [0]
+
+        def download(fragment):
+            time.sleep(0.05 if fragment % 3 else 0.15)
+            return fragment * 2
+
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            def submit(fragment):
+                with lock:
+                    outstanding.add(fragment)
+                    max_outstanding[0] = max(max_outstanding[0], len(outstanding))
+                return pool.submit(download, fragment)
+
+            results = []
+            for fragment, result in FragmentFD._download_fragments_in_window(submit, range(20), 6):
+                with lock:
+                    outstanding.discard(fragment)
+                results.append((fragment, result))
+
+        self.assertEqual(results, [(i, i * 2) for i in range(20)])
+        self.assertLessEqual(max_outstanding[0], 6)
+
+    def test_max_bytes_and_discard(self):
+        slow_future = concurrent.futures.Future()
+        submitted, submitted_before_slow, discarded = [], [], []
+
+        def submit(fragment):
+            submitted.append(fragment)
+            if fragment == 1:
+                return slow_future
+            future = concurrent.futures.Future()
+            future.set_result(fragment)
+            return future
+
+        def finish_slow_fragment():
+            time.sleep(0.2)
+            submitted_before_slow.append(len(submitted))
+            slow_future.set_result(1)
+
+        results = FragmentFD._download_fragments_in_window(
+            submit, range(20), 10, max_bytes=25, sizeof=lambda _: 10, discard=discarded.append)
+        self.assertEqual(next(results), (0, 0))
+        threading.Thread(target=finish_slow_fragment).start()
+        self.assertEqual(next(results), (1, 1))
+        # The window had room, but the results held back behind fragment 1 exceeded max_bytes
+        self.assertEqual(submitted_before_slow, [10])
+
+        results.close()
+        self.assertEqual(sorted(discarded), list(range(2, 10)))
+
+    def test_live_reload_wait(self):
+        start = time.monotonic()
+        submitted = {}
+
+        def fragments():
+            yield 0
+            wait = LiveReloadWait(0.3)
+            yield wait
+            self.assertFalse(wait.interrupted)
+            yield 1
+
+        with concurrent.futures.ThreadPoolExecutor(2) as pool:
+            def submit(fragment):
+                submitted[fragment] = time.monotonic() - start
+                return pool.submit(time.sleep, 0.1)
+
+            yielded = {}
+            for fragment, _ in FragmentFD._download_fragments_in_window(submit, fragments(), 4):
+                yielded[fragment] = time.monotonic() - start
+
+        # The first fragment is not held back until the wait for the reload is over
+        self.assertLess(yielded[0], 0.25)
+        self.assertGreaterEqual(submitted[1], 0.3)
+
+
+class TestFragmentScheduler(unittest.TestCase):
+    def test_limits_and_fairness(self):
+        scheduler = FragmentScheduler(3, max_per_host=2)
+        lock = threading.Lock()
+        running = collections.Counter()
+        maximum = collections.Counter()
+        order = []
+
+        def job(key, host):
+            with lock:
+                order.append(key)
+                for name in (key, host, 'total'):
+                    running[name] += 1
+                    maximum[name] = max(maximum[name], running[name])
+            time.sleep(0.02)
+            with lock:
+                for name in (key, host, 'total'):
+                    running[name] -= 1
+            return key
+
+        futures = [
+            scheduler.submit(key, host, max_active, job, key, host)
+            for key, host, max_active in (('a', 'host1', 3), ('b', 'host1', 3), ('c', 'host2', 1))
+            for _ in range(6)]
+        self.assertEqual([f.result() for f in futures], ['a'] * 6 + ['b'] * 6 + ['c'] * 6)
+        self.assertEqual(maximum['total'], 3)
+        self.assertLessEqual(maximum['host1'], 2)
+        self.assertEqual(maximum['c'], 1)
+        # Downloads submitted later are not starved by the earlier ones
+        self.assertIn('b', order[:6])
+        self.assertIn('c', order[:6])
+
+    def test_burst_with_idle_thread(self):
+        scheduler = FragmentScheduler(8)
+        # Leaves one idle thread behind
+        scheduler.submit('warmup', 'host', 1, lambda: None).result()
+        lock = threading.Lock()
+        running, maximum = [0], [0]
+
+        def job():
+            with lock:
+                running[0] += 1
+                maximum[0] = max(maximum[0], running[0])
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+
+        for future in [scheduler.submit('burst', 'host', 8, job) for _ in range(8)]:
+            future.result()
+        self.assertEqual(maximum[0], 8)
+
+    def test_max_per_host_per_download(self):
+        scheduler = FragmentScheduler(4)
+        lock = threading.Lock()
+        running, limited_started_with = [0], []
+
+        def job(limited):
+            with lock:
+                running[0] += 1
+                if limited:
+                    limited_started_with.append(running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        # A download without a limit does not lift the limit of another one on the same host
+        futures = [scheduler.submit('limited', 'host', 4, job, True, max_per_host=2) for _ in range(4)]
+        futures += [scheduler.submit('unlimited', 'host', 4, job, False) for _ in range(4)]
+        for future in futures:
+            future.result()
+        self.assertEqual(len(limited_started_with), 4)
+        self.assertLessEqual(max(limited_started_with), 2)
+
+
+class TestHlsCache(unittest.TestCase):
+    def test_expiry_and_eviction(self):
+        cache = HlsCache()
+        key = HlsCache.make_key('key', 'http://example.com/key', {'referer': 'http://example.com'})
+        self.assertEqual(key, HlsCache.make_key('key', 'http://example.com/key', {'Referer': 'http://example.com'}))
+        self.assertNotEqual(key, HlsCache.make_key('key', 'http://example.com/key'))
+
+        cache.put(key, b'data')
+        self.assertIn(key, cache)
+        self.assertEqual(cache.get(key), b'data')
+        cache.put('expired', b'data', ttl=-1)
+        cache.put('expiring', b'data', ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('expired'))
+        self.assertIsNone(cache.get('expiring'))
+
+        cache.MAX_SIZE = 10
+        cache.put('other', b'12345')
+        cache.get(key)
+        cache.put('new', b'12345')
+        self.assertEqual(cache.get(key), b'data')
+        self.assertIsNone(cache.get('other'))
+        self.assertEqual(cache.get('new'), b'12345')
+
+    def test_ttl(self):
+        self.assertEqual(HlsCache.ttl({}), HlsCache.TTL)
+        self.assertEqual(HlsCache.ttl({'Cache-Control': 'public, max-age=60'}), 60)
+        self.assertEqual(HlsCache.ttl({'Cache-Control': 'no-store'}), 0)
+
+
+class TestCueDedupWindow(unittest.TestCase):
+    def test_window(self):
+        def cue(start, end, text):
+            return webvtt.CueBlock(id=None, start=start, end=end, text=text, settings=None)
+
+        window = webvtt.CueDedupWindow()
+        self.assertEqual(window.add(cue(0, 20, 'A')), [])
+        self.assertEqual(window.add(cue(10, 40, 'B')), [])
+        self.assertEqual(window.add(cue(10, 40, 'B')), [])
+        self.assertEqual(window.add(cue(20, 30, 'A')), [])
+        self.assertEqual(window.as_json, [[None, 0, 30, 'A', None], [None, 10, 40, 'B', None]])
+
+        # Windows of older versions were lists of CueBlock.as_json
+        for data in (window.as_json, [c.as_json for c in window]):
+            restored = webvtt.CueDedupWindow.from_json(data)
+            self.assertEqual([c.as_json for c in restored.add(cue(40, 50, 'C'))], [
+                cue(0, 30, 'A').as_json, cue(10, 40, 'B').as_json])
+            self.assertEqual(restored.as_json, [[None, 40, 50, 'C', None]])
+
+
+class TestFragmentWriter(unittest.TestCase):
+    FILENAME = 'test_fragment_writer.part'
+
+    def tearDown(self):
+        try_rm(self.FILENAME)
+
+    def test_write(self):
+        with open(self.FILENAME, 'wb') as f:
+            writer = FragmentWriter(f, flush_interval=0)
+            for i in range(4):
+                writer.write(fragment_content(i))
+            self.assertEqual(writer.tell(), sum(len(fragment_content(i)) for i in range(4)))
+            writer.flush()
+            self.assertEqual(os.path.getsize(self.FILENAME), writer.tell())
+            writer.close()
+            self.assertTrue(f.closed)
+        with open(self.FILENAME, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(map(fragment_content, range(4))))
+        with self.assertRaises(ValueError):
+            writer.write(b'x')
+
+    @unittest.skipUnless(hasattr(os, 'posix_fallocate'), 'posix_fallocate is not available')
+    def test_preallocate(self):
+        with open(self.FILENAME, 'wb') as f:
+            writer = FragmentWriter(f, flush_interval=0, preallocate=True)
+            writer.write(fragment_content(0))
+            writer.reserve(100000)
+            writer.flush()
+            self.assertEqual(os.path.getsize(self.FILENAME), writer.RESERVE_STEP)
+            writer.write(fragment_content(1))
+            writer.close()
+        with open(self.FILENAME, 'rb') as f:
+            self.assertEqual(f.read(), fragment_content(0) + fragment_content(1))
+
+    def test_error(self):
+        with open(self.FILENAME, 'wb') as f:
+            writer = FragmentWriter(f, flush_interval=0)
+            f.close()
+            writer.write(b'x')
+            with self.assertRaises(ValueError):
+                writer.flush()
+            with self.assertRaises(ValueError):
+                writer.write(b'y')
+            writer.close()
+
+
+class TestFragmentJournal(unittest.TestCase):
+    FILENAME = 'test_fragment_journal.ytdl.journal'
+
+    def tearDown(self):
+        try_rm(self.FILENAME)
+
+    def test_compaction(self):
+        extra_state = {'window': ['x' * 100] * 10}
+        with open(self.FILENAME, 'w') as f:
+            f.write('d 1 100\nd 2 200\na 0 0\n')
+        with open(self.FILENAME) as f:
+            checkpoint, downloaded = FragmentJournal.parse(f)
+
+        journal = FragmentJournal(open(self.FILENAME, 'a'), 0, self.FILENAME, checkpoint, downloaded)
+        journal.COMPACT_SIZE = 4096
+        for index in range(1, 1001):
+            if index == 500:
+                journal.record_download(1002, 300)
+            journal.record_append(index, index * 10, extra_state)
+            journal.flush()
+            self.assertLessEqual(os.path.getsize(self.FILENAME), journal.COMPACT_SIZE + 2048)
+        journal.close()
+
+        with open(self.FILENAME) as f:
+            checkpoint, downloaded = FragmentJournal.parse(f)
+        self.assertEqual(checkpoint, (1000, 10000, extra_state))
+        # Only the fragments downloaded after the last checkpoint are kept
+        self.assertEqual(downloaded, {1002: 300})
+
+
+class TestYoutubeLiveChatFD(unittest.TestCase):
+    FILENAME = 'test_live_chat.json'
+    CONTINUATION_COUNT = 4
+
+    def tearDown(self):
+        for path in (self.FILENAME, *glob.glob(f'{self.FILENAME}.*')):
+            try_rm(path)
+
+    @staticmethod
+    def action(index):
+        return {'replayChatItemAction': {'actions': [{'index': index}], 'videoOffsetTimeMsec': str(index * 1000)}}
+
+    def urlopen(self, request):
+        if isinstance(request, str) or request.data is None:
+            url = request if isinstance(request, str) else request.url
+            if 'live_chat_replay?' in url:
+                continuation = url.rpartition('=')[2]
+                body = f'<script>ytInitialData = {json.dumps(self.continuation(continuation))};</script>'
+            else:
+                continuation = None
+                body = ('<script>ytInitialData = {"contents": {"twoColumnWatchNextResults": {"conversationBar": '
+                        '{"liveChatRenderer": {"continuations": [{"reloadContinuationData": {"continuation": "c0"}}]}}}}};'
+                        'ytcfg.set({"INNERTUBE_API_KEY": "key", "INNERTUBE_CONTEXT": {"client": {}}});</script>')
+        else:
+            url = request.url
+            continuation = json.loads(request.data)['continuation']
+            body = json.dumps(self.continuation(continuation))
+        self.requested.append(continuation)
+        if continuation in self.failing:
+            raise HTTPError(Response(io.BytesIO(b''), url, {}, 500))
+        return Response(io.BytesIO(body.encode()), url, {}, 200)
+
+    def continuation(self, continuation):
+        index = int(continuation[1:])
+        result = {'actions': [self.action(index)]}
+        if index + 1 < self.CONTINUATION_COUNT:
+            result['continuations'] = [{'liveChatReplayContinuationData': {'continuation': f'c{index + 1}'}}]
+        return {'continuationContents': {'liveChatContinuation': result}}
+
+    def real_download(self, progress_hook=None):
+        params = {'logger': FakeLogger(), 'fragment_retries': 0, 'fragment_flush_interval': 0}
+        ydl = YoutubeDL(params)
+        ydl.urlopen = self.urlopen
+        downloader = YoutubeLiveChatFD(ydl, params)
+        if progress_hook:
+            downloader.add_progress_hook(progress_hook)
+        return downloader.real_download(self.FILENAME, {
+            'video_id': 'test',
+            'url': 'https://www.youtube.com/watch?v=test',
+            'protocol': 'youtube_live_chat_replay',
+        })
+
+    def test_resume(self):
+        self.requested, self.failing = [], ('c2',)
+        with self.assertRaises(DownloadError):
+            self.real_download()
+        self.assertEqual(self.requested, [None, 'c0', 'c1', 'c2'])
+
+        self.requested, self.failing = [], ()
+        self.assertTrue(self.real_download())
+        # The download continues from the checkpointed continuation
+        self.assertEqual(self.requested, [None, 'c2', 'c3'])
+        with open(self.FILENAME) as f:
+            self.assertEqual(list(map(json.loads, f)), [self.action(i) for i in range(self.CONTINUATION_COUNT)])
+        self.assertEqual(glob.glob(f'{self.FILENAME}.*'), [])
+
+    def test_progress(self):
+        self.requested, self.failing = [], ()
+        progress = []
+        self.assertTrue(self.real_download(lambda s: progress.append((s['status'], s['downloaded_bytes']))))
+        # The download is only reported as finished once, at its end
+        self.assertEqual([status for status, _ in progress], ['downloading'] * (self.CONTINUATION_COUNT + 1) + ['finished'])
+        downloaded = [downloaded_bytes for _, downloaded_bytes in progress[:-1]]
+        self.assertEqual(downloaded, sorted(downloaded))
+        self.assertLess(downloaded[0], downloaded[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
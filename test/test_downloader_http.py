@@ -9,6 +9,7 @@
 
 
 import http.server
+import json
 import re
 import threading
 
@@ -21,9 +22,13 @@
 
 
 TEST_SIZE = 10 * 1024
+LARGE_CONTENT = bytes(range(256)) * (4 * 1024 * 1024 // 256)
 
 
 class HTTPTestRequestHandler(http.server.BaseHTTPRequestHandler):
+    requested_ranges = []
+    interrupted = False
+
     def log_message(self, format, *args):
         pass
 
@@ -54,8 +59,40 @@ def serve(self, range=True, content_length=True):
         self.end_headers()
         self.wfile.write(b'#' * size)
 
+    def serve_large(self):
+        mobj = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if not mobj:
+            self.send_response(200)
+            start, end = 0, len(LARGE_CONTENT) - 1
+        else:
+            start, end = int(mobj.group(1)), min(int(mobj.group(2) or len(LARGE_CONTENT)), len(LARGE_CONTENT) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(LARGE_CONTENT)}')
+        self.requested_ranges.append((start, end))
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(LARGE_CONTENT[start:end + 1])
+
+    def serve_interrupted(self):
+        # The first response ends halfway through the content
+        if HTTPTestRequestHandler.interrupted:
+            return self.serve_large()
+        HTTPTestRequestHandler.interrupted = True
+        self.requested_ranges.append((0, len(LARGE_CONTENT) - 1))
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(LARGE_CONTENT)))
+        self.end_headers()
+        self.wfile.write(LARGE_CONTENT[:len(LARGE_CONTENT) // 2])
+        self.close_connection = True
+
     def do_GET(self):
-        if self.path == '/regular':
+        if self.path == '/large':
+            self.serve_large()
+        elif self.path == '/interrupted':
+            self.serve_interrupted()
+        elif self.path == '/regular':
             self.serve()
         elif self.path == '/no-content-length':
             self.serve(content_length=False)
@@ -100,6 +137,124 @@ def test_chunked(self):
             'http_chunk_size': 1000,
         })
 
+    def test_http_connections(self):
+        # Falls back to a single connection for small files or without range support
+        self.download_all({'http_connections': 4})
+
+
+class TestHttpFDSegmented(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.filename = 'testfile.mp4'
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        HTTPTestRequestHandler.requested_ranges = []
+        for suffix in ('', '.part', '.ytdl'):
+            try_rm(self.filename + suffix)
+
+    def download(self, params):
+        params['logger'] = FakeLogger()
+        downloader = HttpFD(YoutubeDL(params), params)
+        self.assertTrue(downloader.real_download(self.filename, {
+            'url': f'http://127.0.0.1:{self.port}/large',
+        }))
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), LARGE_CONTENT)
+        self.assertFalse(os.path.exists(self.filename + '.ytdl'))
+
+    def test_segmented(self):
+        self.download({'http_connections': 4})
+        # The probe, then one request per range
+        self.assertEqual(sorted(HTTPTestRequestHandler.requested_ranges), [
+            (0, 0), (0, 1048575), (1048576, 2097151), (2097152, 3145727), (3145728, 4194303)])
+
+    def test_segmented_chunked(self):
+        self.download({'http_connections': 2, 'http_chunk_size': 512 * 1024})
+        self.assertEqual(len(HTTPTestRequestHandler.requested_ranges), 9)
+
+    def test_segmented_resume(self):
+        size = len(LARGE_CONTENT)
+        # The first range was interrupted after 1000 bytes and the second one is complete
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(LARGE_CONTENT[:1000])
+            f.seek(size // 2)
+            f.write(LARGE_CONTENT[size // 2:])
+        with open(self.filename + '.ytdl', 'w') as f:
+            json.dump({'downloader': {'http_segments': {
+                'size': size, 'ranges': [[1000, size // 2 - 1], [size, size - 1]]}}}, f)
+        self.download({'http_connections': 2})
+        self.assertEqual(HTTPTestRequestHandler.requested_ranges, [(0, 0), (1000, size // 2 - 1)])
+
+    def test_segmented_resume_single_connection(self):
+        size = len(LARGE_CONTENT)
+        # Preallocated, with only the first 1000 bytes and the second range downloaded
+        with open(self.filename + '.part', 'wb') as f:
+            f.write(LARGE_CONTENT[:1000])
+            f.seek(size // 2)
+            f.write(LARGE_CONTENT[size // 2:])
+        with open(self.filename + '.ytdl', 'w') as f:
+            json.dump({'downloader': {'http_segments': {
+                'size': size, 'ranges': [[1000, size // 2 - 1], [size, size - 1]]}}}, f)
+        self.download({})
+        self.assertEqual(HTTPTestRequestHandler.requested_ranges, [(1000, size - 1)])
+
+
+class TestHttpFDPipe(unittest.TestCase):
+    def setUp(self):
+        self.httpd = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        HTTPTestRequestHandler.requested_ranges = []
+        HTTPTestRequestHandler.interrupted = False
+
+    def download(self, ep, params):
+        params['logger'] = FakeLogger()
+        read_fd, write_fd = os.pipe()
+        output = []
+
+        def read():
+            with open(read_fd, 'rb') as f:
+                output.append(f.read())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            downloader = HttpFD(YoutubeDL(params), params)
+            self.assertTrue(downloader.real_download(f'/dev/fd/{write_fd}', {
+                'url': f'http://127.0.0.1:{self.port}/{ep}',
+            }))
+        finally:
+            os.close(write_fd)
+            reader.join()
+        self.assertEqual(output, [LARGE_CONTENT])
+
+    @unittest.skipIf(os.name == 'nt', 'Pipes are opened through /dev/fd')
+    def test_pipe(self):
+        # The ranges of several connections cannot be written into a pipe
+        self.download('large', {'http_connections': 4, 'http_chunk_size': 1024 * 1024})
+        self.assertNotIn((0, 0), HTTPTestRequestHandler.requested_ranges)
+
+    @unittest.skipIf(os.name == 'nt', 'Pipes are opened through /dev/fd')
+    def test_pipe_retry(self):
+        # The download continues into the same pipe after the interruption
+        self.download('interrupted', {'retries': 1})
+        size = len(LARGE_CONTENT)
+        self.assertEqual(HTTPTestRequestHandler.requested_ranges, [(0, size - 1), (size // 2, size - 1)])
+
 
 if __name__ == '__main__':
     unittest.main()
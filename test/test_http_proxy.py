@@ -246,7 +246,7 @@ def ctx(request):
 
 
 @pytest.mark.parametrize(
-    'handler', ['Urllib', 'Requests', 'CurlCFFI'], indirect=True)
+    'handler', ['Urllib', 'Requests', 'CurlCFFI', 'Httpx'], indirect=True)
 @pytest.mark.handler_flaky('CurlCFFI', reason='segfaults')
 @pytest.mark.parametrize('ctx', ['http'], indirect=True)  # pure http proxy can only support http
 class TestHTTPProxy:
@@ -315,6 +315,7 @@ def test_http_with_idn(self, handler, ctx):
     'handler,ctx', [
         ('Requests', 'https'),
         ('CurlCFFI', 'https'),
+        ('Httpx', 'https'),
     ], indirect=True)
 @pytest.mark.handler_flaky('CurlCFFI', reason='segfaults')
 class TestHTTPConnectProxy:
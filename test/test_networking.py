@@ -46,7 +46,7 @@
     RequestHandler,
     Response,
 )
-from yt_dlp.networking._urllib import UrllibRH
+from yt_dlp.networking._urllib import HTTPConnectionPool, UrllibRH
 from yt_dlp.networking.exceptions import (
     CertificateVerifyError,
     HTTPError,
@@ -263,6 +263,14 @@ def do_GET(self):
             self.end_headers()
             self.wfile.write(payload)
             self.finish()
+        elif self.path.startswith('/client_port'):
+            payload = str(self.client_address[1]).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            if self.path.endswith('_close'):
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(payload)
         elif self.path == '/get_cookie':
             self.send_response(200)
             self.send_header('Set-Cookie', 'test=ytdlp; path=/')
@@ -311,7 +319,7 @@ def setup_class(cls):
         cls.https_server_thread.start()
 
 
-@pytest.mark.parametrize('handler', ['Urllib', 'Requests', 'CurlCFFI'], indirect=True)
+@pytest.mark.parametrize('handler', ['Urllib', 'Requests', 'CurlCFFI', 'Httpx'], indirect=True)
 @pytest.mark.handler_flaky('CurlCFFI', os.name == 'nt', reason='segfaults')
 class TestHTTPRequestHandler(TestRequestHandlerBase):
 
@@ -766,8 +774,21 @@ def test_partial_read_greater_than_response_then_full_read(self, handler):
                 assert res.read(0) == b''
                 assert res.read() == b''
 
+    def test_readinto(self, handler):
+        with handler() as rh:
+            for encoding in ('', 'gzip', 'deflate'):
+                res = validate_and_send(rh, Request(
+                    f'http://127.0.0.1:{self.http_port}/content-encoding',
+                    headers={'ytdl-encoding': encoding}))
+                buffer = bytearray(16)
+                data = b''
+                while size := res.readinto(memoryview(buffer)[:6]):
+                    data += buffer[:size]
+                assert data == b'<html><video src="/vid.mp4" /></html>'
+                assert res.readinto(buffer) == 0
+
 
-@pytest.mark.parametrize('handler', ['Urllib', 'Requests', 'CurlCFFI'], indirect=True)
+@pytest.mark.parametrize('handler', ['Urllib', 'Requests', 'CurlCFFI', 'Httpx'], indirect=True)
 @pytest.mark.handler_flaky('CurlCFFI', reason='segfaults')
 class TestClientCertificate:
     @classmethod
@@ -931,6 +952,52 @@ def test_http_response_auto_close(self, handler):
             assert res.fp.fp is None
             assert res.closed
 
+    def test_http_keep_alive(self, handler):
+        url = f'http://127.0.0.1:{self.http_port}/client_port'
+        with handler() as rh:
+            port = validate_and_send(rh, Request(url)).read()
+            # The connection is reused once the response has been read to the end
+            assert validate_and_send(rh, Request(url)).read() == port
+
+            # but not after a partial read
+            res = validate_and_send(rh, Request(url))
+            assert res.read(1) == port[:1]
+            res.close()
+            port = validate_and_send(rh, Request(url)).read()
+            assert validate_and_send(rh, Request(url)).read() == port
+
+            # nor when the server or the client asks to close it
+            assert validate_and_send(rh, Request(f'{url}_close')).read() == port
+            port = validate_and_send(rh, Request(url)).read()
+            assert validate_and_send(rh, Request(url, headers={'Connection': 'close'})).read() == port
+            assert validate_and_send(rh, Request(url)).read() != port
+
+            # An idle connection closed by the server is replaced
+            validate_and_send(rh, Request(f'http://127.0.0.1:{self.http_port}/source_address')).read()
+            assert validate_and_send(rh, Request(url)).read()
+
+    def test_http_keep_alive_retry(self, handler, monkeypatch):
+        # The connection closed by the server is reused before this is noticed
+        monkeypatch.setattr('yt_dlp.networking._urllib._is_connection_dropped', lambda sock: False)
+        url = f'http://127.0.0.1:{self.http_port}'
+        with handler() as rh:
+            validate_and_send(rh, Request(f'{url}/source_address')).read()
+            # A request that can safely be sent again is retried over a new connection
+            assert validate_and_send(rh, Request(f'{url}/client_port')).read()
+
+            validate_and_send(rh, Request(f'{url}/source_address')).read()
+            # but not one whose body cannot be sent again
+            with pytest.raises(TransportError):
+                validate_and_send(rh, Request(
+                    f'{url}/method', data=io.BytesIO(b'test'), headers={'Content-Length': '4'}))
+
+    def test_http_keep_alive_idle_timeout(self, handler, monkeypatch):
+        monkeypatch.setattr(HTTPConnectionPool, 'IDLE_TIMEOUT', 0)
+        url = f'http://127.0.0.1:{self.http_port}/client_port'
+        with handler() as rh:
+            port = validate_and_send(rh, Request(url)).read()
+            assert validate_and_send(rh, Request(url)).read() != port
+
     def test_data_uri_partial_read_then_full_read(self, handler):
         with handler() as rh:
             res = validate_and_send(rh, Request('data:text/plain,hello%20world'))
@@ -1268,6 +1335,49 @@ def test_http_response_auto_close(self, handler):
             assert res.closed
 
 
+@pytest.mark.parametrize('handler', ['Httpx'], indirect=True)
+class TestHttpxRequestHandler(TestRequestHandlerBase):
+    def test_http2_preference(self, handler):
+        from yt_dlp.networking._httpx import httpx_preference
+
+        url = f'https://127.0.0.1:{self.https_port}/headers'
+        director = RequestDirector(logger=FakeLogger())
+        director.add_handler(UrllibRH(logger=FakeLogger(), verify=False))
+        director.add_handler(handler(verify=False))
+        director.preferences.add(httpx_preference)
+        try:
+            # The first request to a server finds out whether it negotiates HTTP/2
+            with director.send(Request(url)) as res:
+                assert res.extensions['http_version'] == 'HTTP/1.1'
+            assert director.handlers['Httpx'].supports_http2(url) is False
+            # The test server does not, so it is left to the other handlers
+            with director.send(Request(url)) as res:
+                assert 'http_version' not in res.extensions
+            # HTTP/2 is only negotiated over TLS
+            with director.send(Request(f'http://127.0.0.1:{self.http_port}/headers')) as res:
+                assert 'http_version' not in res.extensions
+        finally:
+            director.close()
+
+    def test_response_reader(self, handler):
+        with handler() as rh:
+            res = validate_and_send(rh, Request(f'http://127.0.0.1:{self.http_port}/gen_200'))
+            assert res.read(2) == b'<h'
+            assert not res.closed
+            assert res.read(1000) == b'tml></html>'
+            # Should automatically close the response once it is fully read
+            assert res.fp.closed
+            assert res.closed
+            assert res.read() == b''
+
+    def test_incompleteread_partial(self, handler):
+        with handler(timeout=2) as rh:
+            res = validate_and_send(rh, Request(f'http://127.0.0.1:{self.http_port}/incompleteread'))
+            with pytest.raises(IncompleteRead, match='13 bytes read, 234221 more expected'):
+                res.read(1024 * 1024)
+            assert res.fp.closed
+
+
 def run_validation(handler, error, req, **handler_kwargs):
     with handler(**handler_kwargs) as rh:
         if error:
@@ -1316,6 +1426,10 @@ class HTTPSupportedRH(ValidationRH):
             ('http', False, {}),
             ('https', False, {}),
         ]),
+        ('Httpx', [
+            ('http', False, {}),
+            ('https', False, {}),
+        ]),
         (NoCheckRH, [('http', False, {})]),
         (ValidationRH, [('http', UnsupportedRequest, {})]),
     ]
@@ -1347,6 +1461,14 @@ class HTTPSupportedRH(ValidationRH):
             ('socks5', False),
             ('socks5h', False),
         ]),
+        ('Httpx', 'http', [
+            ('http', False),
+            ('https', False),
+            ('socks4', UnsupportedRequest),
+            ('socks4a', UnsupportedRequest),
+            ('socks5', UnsupportedRequest),
+            ('socks5h', UnsupportedRequest),
+        ]),
         ('Websockets', 'ws', [
             ('http', UnsupportedRequest),
             ('https', UnsupportedRequest),
@@ -1375,6 +1497,10 @@ class HTTPSupportedRH(ValidationRH):
             ('all', 'http', False),
             ('unrelated', 'http', False),
         ]),
+        ('Httpx', 'http', [
+            ('all', 'http', False),
+            ('unrelated', 'http', False),
+        ]),
         ('Websockets', 'ws', [
             ('all', 'socks5', False),
             ('unrelated', 'socks5', False),
@@ -1426,6 +1552,17 @@ class HTTPSupportedRH(ValidationRH):
             ({'legacy_ssl': True}, False),
             ({'legacy_ssl': 'notabool'}, AssertionError),
         ]),
+        ('Httpx', 'http', [
+            ({'cookiejar': 'notacookiejar'}, AssertionError),
+            ({'cookiejar': YoutubeDLCookieJar()}, False),
+            ({'timeout': 1}, False),
+            ({'timeout': 'notatimeout'}, AssertionError),
+            ({'unsupported': 'value'}, UnsupportedRequest),
+            ({'legacy_ssl': False}, False),
+            ({'legacy_ssl': True}, False),
+            ({'legacy_ssl': 'notabool'}, AssertionError),
+            ({'keep_header_casing': True}, UnsupportedRequest),
+        ]),
         (NoCheckRH, 'http', [
             ({'cookiejar': 'notacookiejar'}, False),
             ({'somerandom': 'test'}, False),  # but any extension is allowed through
@@ -1443,6 +1580,7 @@ class HTTPSupportedRH(ValidationRH):
         ('Urllib', False, 'http'),
         ('Requests', False, 'http'),
         ('CurlCFFI', False, 'http'),
+        ('Httpx', False, 'http'),
         ('Websockets', False, 'ws'),
     ], indirect=['handler'])
     def test_no_proxy(self, handler, fail, scheme):
@@ -1454,6 +1592,7 @@ def test_no_proxy(self, handler, fail, scheme):
         (HTTPSupportedRH, 'http'),
         ('Requests', 'http'),
         ('CurlCFFI', 'http'),
+        ('Httpx', 'http'),
         ('Websockets', 'ws'),
     ], indirect=['handler'])
     def test_empty_proxy(self, handler, scheme):
@@ -1466,6 +1605,7 @@ def test_empty_proxy(self, handler, scheme):
         (HTTPSupportedRH, 'http'),
         ('Requests', 'http'),
         ('CurlCFFI', 'http'),
+        ('Httpx', 'http'),
         ('Websockets', 'ws'),
     ], indirect=['handler'])
     def test_invalid_proxy_url(self, handler, scheme, proxy_url):
@@ -1652,6 +1792,43 @@ def some_preference(rh, request):
         assert director.send(Request('http://')).read() == b''
         assert director.send(Request('http://', headers={'prefer': '1'})).read() == b'supported'
 
+    def test_routes(self):
+        validated = []
+
+        class CountingRH(FakeRH):
+            def _validate(self, request):
+                validated.append(request.url)
+                if request.extensions.get('unsupported'):
+                    raise UnsupportedRequest('unsupported extension')
+
+        director = RequestDirector(logger=FakeLogger())
+        director.add_handler(CountingRH(logger=FakeLogger()))
+
+        director.send(Request('http://example.com/1'))
+        director.send(Request('http://example.com/2', headers={'X': 'y'}))
+        assert validated == ['http://example.com/1']
+
+        # Each scheme, proxies and extensions are validated separately
+        director.send(Request('https://example.com/3'))
+        director.send(Request('http://example.com/4', proxies={'http': 'http://127.0.0.1:3128'}))
+        with pytest.raises(NoSupportingHandlers, match='unsupported extension'):
+            director.send(Request('http://example.com/5', extensions={'unsupported': True}))
+        with pytest.raises(NoSupportingHandlers, match='unsupported extension'):
+            director.send(Request('http://example.com/6', extensions={'unsupported': True}))
+        assert validated == [
+            'http://example.com/1', 'https://example.com/3', 'http://example.com/4', 'http://example.com/5']
+
+        # Unhashable extensions are validated every time
+        director.send(Request('http://example.com/7', extensions={'unhashable': []}))
+        director.send(Request('http://example.com/8', extensions={'unhashable': []}))
+        assert validated[-2:] == ['http://example.com/7', 'http://example.com/8']
+
+        # A new handler is validated again
+        validated.clear()
+        director.add_handler(CountingRH(logger=FakeLogger()))
+        director.send(Request('http://example.com/9'))
+        assert validated == ['http://example.com/9']
+
     def test_close(self, monkeypatch):
         director = RequestDirector(logger=FakeLogger())
         director.add_handler(FakeRH(logger=FakeLogger()))
@@ -2136,6 +2313,15 @@ def read(self, size=-1, /):
         res.read()
         assert res.closed
 
+    def test_readinto(self):
+        res = Response(io.BytesIO(b'test'), url='test://', headers={}, status=200)
+        buffer = bytearray(3)
+        assert res.readinto(buffer) == 3
+        assert buffer == b'tes'
+        assert res.readinto(buffer) == 1
+        assert buffer[:1] == b't'
+        assert res.readinto(buffer) == 0
+
     def test_close(self):
         # Should not call close() on the underlying file when already closed
         fp = MagicMock()
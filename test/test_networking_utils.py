@@ -8,16 +8,22 @@
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import gc
 import io
 import random
+import socket
 import ssl
+import time
 
 from yt_dlp.cookies import YoutubeDLCookieJar
 from yt_dlp.dependencies import certifi
 from yt_dlp.networking import Response
 from yt_dlp.networking._helper import (
+    DNSCache,
     InstanceStoreMixin,
     add_accept_encoding_header,
+    create_connection,
+    dns_cache,
     get_redirect_method,
     make_socks_proxy_opts,
     ssl_load_certs,
@@ -166,6 +172,174 @@ def test_mixin(self):
         mixin._clear_instances()
         assert mixin._get_instance(t=1234) != m
 
+    def test_unhashable(self):
+        class Unhashable:
+            __hash__ = None
+
+        mixin = self.FakeInstanceStoreMixin()
+        value = Unhashable()
+        assert mixin._get_instance(u=value, d={'a': [1]}) == mixin._get_instance(u=value, d={'a': [1]})
+        assert mixin._get_instance(u=value) != mixin._get_instance(u=Unhashable())
+
+    def test_eviction(self, monkeypatch):
+        closed = []
+
+        class ClosingInstanceStoreMixin(InstanceStoreMixin):
+            def _create_instance(self, **kwargs):
+                return kwargs['proxies']['all']
+
+            def _close_instance(self, instance):
+                closed.append(instance)
+
+        monkeypatch.setattr(ClosingInstanceStoreMixin, '_MAX_INSTANCES', 2)
+        mixin = ClosingInstanceStoreMixin()
+        mixin._get_instance(proxies={'all': 'http://proxy1'})
+        mixin._get_instance(proxies={'all': 'http://proxy2'})
+        # The most recently used one is kept
+        mixin._get_instance(proxies={'all': 'http://proxy1'})
+        mixin._get_instance(proxies={'all': 'http://proxy3'})
+        assert closed == ['http://proxy2']
+        assert mixin._instance_stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'live': 2}
+
+        mixin._clear_instances()
+        assert sorted(closed) == ['http://proxy1', 'http://proxy2', 'http://proxy3']
+        assert mixin._instance_stats()['live'] == 0
+
+    def test_eviction_in_use(self, monkeypatch):
+        closed = []
+
+        class LeasingInstanceStoreMixin(InstanceStoreMixin):
+            def _create_instance(self, **kwargs):
+                return kwargs['proxies']['all']
+
+            def _close_instance(self, instance):
+                closed.append(instance)
+
+            @InstanceStoreMixin.leases_instances
+            def _send(self, proxy):
+                self._get_instance(proxies={'all': proxy})
+                response = Response(io.BytesIO(), url='http://example.com', headers={}, status=404 if 'error' in proxy else 200)
+                if 'error' in proxy:
+                    raise HTTPError(response)
+                return response
+
+        monkeypatch.setattr(LeasingInstanceStoreMixin, '_MAX_INSTANCES', 1)
+        mixin = LeasingInstanceStoreMixin()
+        res = mixin._send('http://proxy1')
+        # Not closed while its response is still in use
+        mixin._send('http://proxy2')
+        assert closed == []
+        res.close()
+        del res
+        assert closed == ['http://proxy1']
+
+        # The instance that is no longer in use is closed when evicted
+        with pytest.raises(HTTPError) as exc_info:
+            mixin._send('http://proxy3-error')
+        assert closed == ['http://proxy1', 'http://proxy2']
+        # as is the one in use by the response of an HTTPError, once it is released
+        mixin._send('http://proxy4')
+        assert closed == ['http://proxy1', 'http://proxy2']
+        exc_info.value.response.close()
+        del exc_info
+        gc.collect()
+        assert closed == ['http://proxy1', 'http://proxy2', 'http://proxy3-error']
+        assert mixin._instance_stats() == {'hits': 0, 'misses': 4, 'evictions': 3, 'live': 1}
+
+
+class TestDNSCache:
+
+    @staticmethod
+    def fake_getaddrinfo(monkeypatch, addrinfos):
+        calls = []
+
+        def getaddrinfo(host, *args, **kwargs):
+            calls.append(host)
+            if isinstance(addrinfos, Exception):
+                raise addrinfos
+            return addrinfos
+
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        return calls
+
+    def test_cache(self, monkeypatch):
+        addrinfo = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 443))
+        calls = self.fake_getaddrinfo(monkeypatch, [addrinfo])
+        cache = DNSCache()
+        assert cache.getaddrinfo('example.com', 443) == [addrinfo]
+        assert cache.getaddrinfo('example.com', 443) == [addrinfo]
+        assert calls == ['example.com']
+
+        cache.getaddrinfo('example.com', 443, socket.AF_INET)
+        assert calls == ['example.com'] * 2
+
+        cache.invalidate('example.com')
+        cache.getaddrinfo('example.com', 443)
+        assert calls == ['example.com'] * 3
+
+        monkeypatch.setattr(DNSCache, 'TTL', 0)
+        cache.clear()
+        cache.getaddrinfo('example.com', 443)
+        cache.getaddrinfo('example.com', 443)
+        assert calls == ['example.com'] * 5
+
+    def test_negative_cache(self, monkeypatch):
+        calls = self.fake_getaddrinfo(monkeypatch, socket.gaierror(socket.EAI_NONAME, 'Name or service not known'))
+        cache = DNSCache()
+        for _ in range(2):
+            with pytest.raises(socket.gaierror, match='not known'):
+                cache.getaddrinfo('nxdomain.invalid', 443)
+        assert calls == ['nxdomain.invalid']
+
+        # Temporary failures are not cached
+        calls = self.fake_getaddrinfo(monkeypatch, socket.gaierror(socket.EAI_AGAIN, 'Temporary failure'))
+        for _ in range(2):
+            with pytest.raises(socket.gaierror, match='Temporary'):
+                cache.getaddrinfo('example.com', 443)
+        assert calls == ['example.com'] * 2
+
+    def test_happy_eyeballs(self, monkeypatch):
+        class FakeSocket:
+            closed = False
+
+            def __init__(self, addr):
+                self.addr = addr
+
+            def close(self):
+                self.closed = True
+
+        addrinfos = [
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::1', 443, 0, 0)),
+            (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::2', 443, 0, 0)),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 443)),
+        ]
+        self.fake_getaddrinfo(monkeypatch, addrinfos)
+        monkeypatch.setattr(dns_cache, '_entries', {})
+        attempts = []
+
+        def create_socket(ip_addr, timeout, source_address):
+            attempts.append(ip_addr[4][0])
+            if ip_addr[0] == socket.AF_INET6:
+                # Unreachable IPv6 network
+                time.sleep(2)
+                raise OSError('timed out')
+            return FakeSocket(ip_addr[4][0])
+
+        start = time.monotonic()
+        sock = create_connection(('example.com', 443), _create_socket_func=create_socket)
+        assert time.monotonic() - start < 1.5
+        assert sock.addr == '192.0.2.1'
+        # The families are interleaved
+        assert attempts == ['2001:db8::1', '192.0.2.1']
+
+        def fail(ip_addr, timeout, source_address):
+            raise OSError(f'refused {ip_addr[4][0]}')
+
+        with pytest.raises(OSError, match='refused'):
+            create_connection(('example.com', 443), _create_socket_func=fail)
+        # Addresses that could not be connected to are resolved again
+        assert ('example.com', 443, 0, socket.SOCK_STREAM) not in dns_cache._entries
+
 
 class TestNetworkingExceptions:
 
@@ -10,10 +10,17 @@
 
 import subprocess
 
+from test.helper import try_rm
 from yt_dlp import YoutubeDL
+from yt_dlp.postprocessor.ffmpeg import FFmpegFusedPP, FFmpegPostProcessorError
 from yt_dlp.utils import shell_quote
 from yt_dlp.postprocessor import (
     ExecPP,
+    FFmpegEmbedSubtitlePP,
+    FFmpegFixupStretchedPP,
+    FFmpegFixupTimestampPP,
+    FFmpegMetadataPP,
+    FFmpegPostProcessor,
     FFmpegThumbnailsConvertorPP,
     MetadataFromFieldPP,
     MetadataParserPP,
@@ -76,6 +83,118 @@ def test_escaping(self):
         os.remove(initial_file)
 
 
+class TestFFmpegProbeCache(unittest.TestCase):
+    FILENAME = 'test_probe_cache.mkv'
+
+    def tearDown(self):
+        try_rm(self.FILENAME)
+
+    def test_cache(self):
+        probes = []
+
+        class CountingPP(FFmpegPostProcessor):
+            def _run_ffprobe(self, path, opts=()):
+                probes.append(path)
+                return super()._run_ffprobe(path, opts)
+
+        pp = CountingPP()
+        if not pp.available or pp.probe_basename != 'ffprobe':
+            print('Skipping: ffmpeg or ffprobe not found')
+            return
+
+        subprocess.check_call([
+            pp.executable, '-y', '-f', 'lavfi', '-i', 'sine=duration=1', '-c:a', 'flac', self.FILENAME,
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.assertEqual(pp.get_audio_codec(self.FILENAME), 'flac')
+        self.assertAlmostEqual(pp._get_real_video_duration(self.FILENAME), 1, delta=0.1)
+        self.assertEqual(pp.get_stream_number(self.FILENAME, ('codec_type', ), 'audio'), (0, 1))
+        self.assertEqual(len(probes), 1)
+
+        # The file is probed again once it is rewritten
+        pp.run_ffmpeg(self.FILENAME, 'temp.' + self.FILENAME, ['-c:a', 'pcm_s16le'])
+        os.replace('temp.' + self.FILENAME, self.FILENAME)
+        self.assertEqual(pp.get_audio_codec(self.FILENAME), 'pcm_s16le')
+        self.assertEqual(len(probes), 2)
+
+
+class TestFFmpegFusedPP(unittest.TestCase):
+    FILENAME = 'test_fused.mp4'
+    SUBTITLE = 'test_fused.en.vtt'
+
+    def setUp(self):
+        for filename in (self.FILENAME, self.SUBTITLE):
+            with open(filename, 'w'):
+                pass
+        self.commands = []
+        self.fail_fused = False
+
+    def tearDown(self):
+        try_rm(self.FILENAME)
+        try_rm(self.SUBTITLE)
+        try_rm('test_fused.meta')
+
+    def run_pps(self, pps, params={}):
+        def run_ffmpeg_multiple_files(input_paths, out_path, opts):
+            self.assertTrue(all(map(os.path.exists, input_paths)))
+            self.commands.append((list(input_paths), list(opts)))
+            if self.fail_fused and len(input_paths) > 2:
+                raise FFmpegPostProcessorError('Invalid argument')
+            with open(out_path, 'w'):
+                pass
+
+        ydl = YoutubeDL({'quiet': True, **params})
+        pps = [pp(ydl) for pp in pps]
+        for pp in pps:
+            pp.run_ffmpeg_multiple_files = run_ffmpeg_multiple_files
+            pp._features = {'setts': True}
+        info = {
+            'id': 'fused', 'ext': 'mp4', 'filepath': self.FILENAME, 'vcodec': 'avc1', 'acodec': 'mp4a',
+            'stretched_ratio': 2, 'title': 'Fused',
+            'chapters': [{'start_time': 0, 'end_time': 1, 'title': 'Intro'}],
+            'requested_subtitles': {'en': {'ext': 'vtt', 'filepath': self.SUBTITLE}},
+        }
+        for pp in FFmpegFusedPP.fuse(ydl, pps):
+            files_to_delete, info = pp.run(info)
+        return pps, files_to_delete
+
+    def test_fused(self):
+        _, files_to_delete = self.run_pps([FFmpegFixupStretchedPP, FFmpegEmbedSubtitlePP, FFmpegMetadataPP])
+        self.assertEqual(files_to_delete, [self.SUBTITLE])
+        self.assertFalse(os.path.exists('test_fused.meta'))
+        self.assertEqual(len(self.commands), 1)
+        inputs, opts = self.commands[0]
+        self.assertEqual(inputs, [self.FILENAME, self.SUBTITLE, 'test_fused.meta'])
+        self.assertEqual(opts[:8], [*FFmpegPostProcessor.stream_copy_opts(ext='mp4')])
+        self.assertEqual(opts[8:16], ['-aspect', '2.000000', '-map', '-0:s', '-map', '1:0', '-metadata:s:s:0', 'language=eng'])
+        self.assertIn('-map_metadata', opts)
+        self.assertEqual(opts[opts.index('-map_metadata') + 1], '2')
+
+    def test_fallback(self):
+        self.fail_fused = True
+        _, files_to_delete = self.run_pps([FFmpegFixupStretchedPP, FFmpegEmbedSubtitlePP, FFmpegMetadataPP])
+        self.assertEqual(files_to_delete, [self.SUBTITLE])
+        self.assertFalse(os.path.exists('test_fused.meta'))
+        # The failed command, then one per postprocessor
+        self.assertEqual([inputs for inputs, _ in self.commands], [
+            [self.FILENAME, self.SUBTITLE, 'test_fused.meta'],
+            [self.FILENAME], [self.FILENAME, self.SUBTITLE], [self.FILENAME, 'test_fused.meta']])
+        self.assertIn('-aspect', self.commands[1][1])
+
+    def test_incompatible(self):
+        # The trimming of the timestamps would also apply to the embedded subtitles
+        self.run_pps([FFmpegEmbedSubtitlePP, FFmpegFixupTimestampPP, FFmpegFixupStretchedPP])
+        self.assertEqual([inputs for inputs, _ in self.commands], [[self.FILENAME, self.SUBTITLE], [self.FILENAME]])
+        self.assertIn('-aspect', self.commands[1][1])
+        self.assertEqual(self.commands[1][1].count('-bsf'), 1)
+
+    def test_not_fused(self):
+        self.run_pps([FFmpegFixupStretchedPP, FFmpegMetadataPP], {'compat_opts': ['no-fused-postprocessors']})
+        self.assertEqual(len(self.commands), 2)
+        self.commands.clear()
+        self.run_pps([FFmpegFixupStretchedPP, FFmpegMetadataPP], {'postprocessor_args': {'metadata': ['-v', '0']}})
+        self.assertEqual(len(self.commands), 2)
+
+
 class TestExec(unittest.TestCase):
     def test_parse_cmd(self):
         pp = ExecPP(YoutubeDL(), '')
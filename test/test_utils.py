@@ -26,8 +26,10 @@
 )
 from yt_dlp.utils import (
     Config,
+    DashFragments,
     DateRange,
     ExtractorError,
+    FragmentTable,
     InAdvancePagedList,
     LazyList,
     NO_DEFAULT,
@@ -1975,6 +1977,94 @@ def test(ll, idx, val, cache):
         ll = reversed(ll)
         test(ll, -15, 14, range(15))
 
+    def test_DashFragments(self):
+        fragments = DashFragments([{'url': 'init.mp4'}])
+        fragments.add_template('path', 'seg-%(Time)d-%(Number)d-%(Bandwidth)d.m4s', 10, [
+            (5, 0, 20, 2), (7, 40, 10, 0), (7, 40, 30, 3)], Bandwidth=100)
+        expected = [
+            {'url': 'init.mp4'},
+            {'path': 'seg-0-5-100.m4s', 'duration': 2.0},
+            {'path': 'seg-20-6-100.m4s', 'duration': 2.0},
+            {'path': 'seg-40-7-100.m4s', 'duration': 3.0},
+            {'path': 'seg-70-8-100.m4s', 'duration': 3.0},
+            {'path': 'seg-100-9-100.m4s', 'duration': 3.0},
+        ]
+        self.assertEqual(len(fragments), 6)
+        self.assertEqual(list(fragments), expected)
+        # The initialization segment has no duration
+        self.assertIsNone(fragments.duration())
+        self.assertEqual(DashFragments(fragments[1:]).duration(), 13)
+        self.assertEqual(fragments, expected)
+        self.assertNotEqual(fragments, expected[1:])
+        self.assertEqual([fragments[i] for i in range(-6, 6)], expected * 2)
+        self.assertEqual(fragments[2:5], expected[2:5])
+        self.assertEqual(fragments[::-2], expected[::-2])
+        self.assertRaises(IndexError, lambda: fragments[6])
+        self.assertRaises(IndexError, lambda: fragments[-7])
+
+        # The fragments of a template are not kept
+        fragments[1]['path'] = 'changed'
+        self.assertEqual(fragments[1], expected[1])
+
+        merged = DashFragments(fragments)
+        merged.extend(fragments)
+        merged.append({'url': 'last.mp4'})
+        merged.extend([])
+        self.assertEqual(merged, expected * 2 + [{'url': 'last.mp4'}])
+        templates = DashFragments()
+        templates.add_template('path', 'seg-%(Number)d.m4s', 10, [(1, 0, 20, 2), (3, 40, 30, 3)])
+        templates.extend([{'path': 'last.m4s', 'duration': 1.5}])
+        self.assertEqual(templates.duration(), 14.5)
+        templates.add_template('path', 'seg-%(Number)d.m4s', 10, [(1, 0, None, 2)])
+        self.assertIsNone(templates.duration())
+        self.assertEqual(len(fragments), 6)
+        # The segments are identified by their $Number$ if the template has one, by their $Time$ otherwise
+        self.assertEqual(list(fragments.positions()), [None, 5, 6, 7, 8, 9])
+        time_fragments = DashFragments()
+        time_fragments.add_template('path', 'seg-%(Time)d.m4s', 10, [(1, 0, 20, 2), (3, 40, 30, 2)])
+        self.assertEqual(list(time_fragments.positions()), [0, 20, 40, 70])
+        self.assertEqual(DashFragments(), [])
+
+    def test_FragmentTable(self):
+        key = {'METHOD': 'AES-128', 'URI': 'https://example.com/key'}
+        fragments = [{'url': 'https://example.com/init.mp4', 'byte_range': {'start': 0, 'end': 100}, 'init_segment': True}]
+        fragments.extend({
+            'url': f'https://example.com/seg-{i}.ts',
+            'duration': 6.0 if i < 10 else 2.5,
+            'byte_range': {},
+            'decrypt_info': key,
+            'media_sequence': i,
+            'flag': i % 2 == 0 or i,
+        } for i in range(20))
+        table = FragmentTable(fragments)
+        self.assertEqual(len(table), 21)
+        self.assertEqual(list(table), fragments)
+        self.assertEqual(table, fragments)
+        self.assertEqual(table[-1], fragments[-1])
+        self.assertEqual(table[3:7], fragments[3:7])
+        self.assertRaises(IndexError, lambda: table[21])
+        self.assertNotIn('duration', table[0])
+        self.assertEqual([type(fragment['flag']) for fragment in table[1:5]], [bool, int, bool, int])
+        # The values of a run are shared, so that e.g. a fetched key is kept
+        self.assertIs(table[1]['decrypt_info'], table[2]['decrypt_info'])
+
+        encoded = json.loads(json.dumps(table.to_json()))
+        self.assertTrue(FragmentTable.is_json(encoded))
+        self.assertEqual(encoded['columns']['url']['prefix'], 'https://example.com/')
+        # The run is continued over the init fragment, which has no duration
+        self.assertEqual(encoded['columns']['duration']['runs'], [[6.0, 11], [2.5, 10]])
+        self.assertEqual(encoded['columns']['duration']['absent'], [0])
+        self.assertEqual(FragmentTable.from_json(encoded), fragments)
+        self.assertLess(len(json.dumps(encoded)), len(json.dumps(fragments)))
+
+        loaded = FragmentTable.load_json({'formats': [{'fragments': encoded}, {'fragments': fragments}]})
+        self.assertIsInstance(loaded['formats'][0]['fragments'], FragmentTable)
+        self.assertEqual(loaded['formats'][0]['fragments'], fragments)
+        self.assertEqual(loaded['formats'][1]['fragments'], fragments)
+
+        self.assertEqual(FragmentTable(), [])
+        self.assertEqual(FragmentTable.from_json(FragmentTable().to_json()), [])
+
     def test_format_bytes(self):
         self.assertEqual(format_bytes(0), '0.00B')
         self.assertEqual(format_bytes(1000), '1000.00B')
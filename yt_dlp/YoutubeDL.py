@@ -28,7 +28,14 @@
 from .compat import urllib  # isort: split
 from .compat import urllib_req_to_req
 from .cookies import CookieLoadError, LenientSimpleCookie, load_cookies
-from .downloader import FFmpegFD, get_suitable_downloader, shorten_protocol_name
+from .downloader import (
+    DashSegmentsFD,
+    FFmpegFD,
+    HlsFD,
+    HttpFD,
+    get_suitable_downloader,
+    shorten_protocol_name,
+)
 from .downloader.rtmp import rtmpdump_version
 from .extractor import gen_extractor_classes, get_info_extractor, import_extractors
 from .extractor.common import UnsupportedURLIE
@@ -71,6 +78,7 @@
     MoveFilesAfterDownloadPP,
     get_postprocessor,
 )
+from .postprocessor.ffmpeg import FFmpegFusedPP
 from .postprocessor.ffmpeg import resolve_mapping as resolve_recode_mapping
 from .update import (
     REPOSITORY,
@@ -92,6 +100,7 @@
     STR_FORMAT_RE_TMPL,
     STR_FORMAT_TYPES,
     ContentTooShortError,
+    DashFragments,
     DateRange,
     DownloadCancelled,
     DownloadError,
@@ -99,6 +108,7 @@
     ExistingVideoReached,
     ExtractorError,
     FormatSorter,
+    FragmentTable,
     GeoRestrictedError,
     ISO3166Utils,
     LazyList,
@@ -304,6 +314,8 @@ class YoutubeDL:
     writedescription:  Write the video description to a .description file
     writeinfojson:     Write the video description to a .info.json file
     clean_infojson:    Remove internal metadata from the infojson
+    compact_fragments: Write the fragments of the formats as a compact table
+                       in the infojson and the JSON output
     getcomments:       Extract video comments. This will not be written to disk
                        unless writeinfojson is also given
     writethumbnail:    Write the thumbnail image to a file
@@ -424,6 +436,8 @@ class YoutubeDL:
                        Progress hooks are guaranteed to be called at least twice
                        (with status "started" and "finished") if the processing is successful.
     merge_output_format: "/" separated list of extensions to use when merging formats.
+    stream_merge:      Merge the formats while they are downloaded, by writing them
+                       into pipes that ffmpeg reads from, when possible
     final_ext:         Expected final extension; used to detect when the file was
                        already downloaded and converted
     fixup:             Automatically correct known faults of the file.
@@ -512,8 +526,9 @@ class YoutubeDL:
     the downloader (see yt_dlp/downloader/common.py):
     nopart, updatetime, buffersize, ratelimit, throttledratelimit, min_filesize,
     max_filesize, test, noresizebuffer, retries, file_access_retries, fragment_retries,
-    continuedl, hls_use_mpegts, http_chunk_size, external_downloader_args,
-    concurrent_fragment_downloads, progress_delta.
+    continuedl, hls_use_mpegts, hls_persistent_cache, http_chunk_size, external_downloader_args,
+    concurrent_fragment_downloads, fragment_buffer_size, http_connections,
+    aria2c_rpc, aria2c_rpc_secret, progress_delta.
 
     The following options are used by the post processors:
     ffmpeg_location:   Location of the ffmpeg binary; either the path
@@ -1391,7 +1406,7 @@ def sanitize(key, value):
                 return filename_sanitizer(key, value, restricted=self.params.get('restrictfilenames'))
 
         def _dumpjson_default(obj):
-            if isinstance(obj, (set, LazyList)):
+            if isinstance(obj, (set, LazyList, DashFragments, FragmentTable)):
                 return list(obj)
             return repr(obj)
 
@@ -3238,9 +3253,10 @@ def print_field(field, actual_field=None, optional=False):
         print_field('format')
 
         if self.params.get('forcejson'):
-            self.to_stdout(json.dumps(self.sanitize_info(info_dict)))
+            self.to_stdout(json.dumps(self.sanitize_info(
+                info_dict, compact_fragments=self.params.get('compact_fragments'))))
 
-    def dl(self, name, info, subtitle=False, test=False):
+    def dl(self, name, info, subtitle=False, test=False, *, params=None):
         if not info.get('url'):
             self.raise_no_formats(info, True)
 
@@ -3258,7 +3274,7 @@ def dl(self, name, info, subtitle=False, test=False):
                 'overwrites': True,
                 '_no_ytdl_file': True,
             }
-        else:
+        elif params is None:
             params = self.params
 
         fd = get_suitable_downloader(info, params, to_stdout=(name == '-'))(self, params)
@@ -3277,6 +3293,48 @@ def dl(self, name, info, subtitle=False, test=False):
             new_info['http_headers'] = self._calc_headers(new_info)
         return fd.download(name, new_info, subtitle)
 
+    def _can_stream_merge(self, info_dict, filename, merger):
+        if (not self.params.get('stream_merge') or filename == '-'
+                or self.params.get('allow_unplayable_formats') or not merger.can_stream(info_dict)):
+            return False
+        for f in info_dict['requested_formats']:
+            fd = get_suitable_downloader(f, self.params)
+            # Only the native downloaders write their output in order
+            if fd is HttpFD:
+                continue
+            frag_protocol = {DashSegmentsFD: 'dash_frag_urls', HlsFD: 'm3u8_frag_urls'}.get(fd)
+            if not frag_protocol or get_suitable_downloader(f, self.params, None, protocol=frag_protocol):
+                return False
+        return True
+
+    def _stream_merge(self, filename, info_dict, merger):
+        """Download the requested formats into pipes that ffmpeg merges them from"""
+        params = {
+            **self.params,
+            'overwrites': True,
+            '_no_ytdl_file': True,
+            # Fragment files cannot be written next to a pipe
+            'keep_fragments': False,
+            'fragment_buffer_size': self.params.get('fragment_buffer_size') or 10 * 1024 * 1024,
+        }
+
+        def download(f, pipe):
+            new_info = dict(info_dict)
+            del new_info['requested_formats']
+            new_info.update(f)
+            # The downloads run at the same time, so only the progress of the first one is shown
+            success, _ = self.dl(pipe, new_info, params={
+                **params,
+                'noprogress': params.get('noprogress') or f is not info_dict['requested_formats'][0],
+            })
+            return success
+
+        try:
+            return merger.stream(info_dict, filename, download)
+        except PostProcessingError as e:
+            self.report_error(f'Unable to merge formats: {e}')
+            return False
+
     def existing_file(self, filepaths, *, default_overwrite=True):
         existing_files = list(filter(os.path.exists, orderedSet(filepaths)))
         if existing_files and not self.params.get('overwrites', default_overwrite):
@@ -3482,6 +3540,10 @@ def correct_ext(filename, ext=new_ext):
                         info_dict['url'] = '\n'.join(f['url'] for f in info_dict['requested_formats'])
                         success, real_download = self.dl(temp_filename, info_dict)
                         info_dict['__real_download'] = real_download
+                    elif self._can_stream_merge(info_dict, temp_filename, merger):
+                        if not self._ensure_dir_exists(temp_filename):
+                            return
+                        success = info_dict['__real_download'] = self._stream_merge(temp_filename, info_dict, merger)
                     else:
                         if self.params.get('allow_unplayable_formats'):
                             self.report_warning(
@@ -3645,7 +3707,8 @@ def wrapper(*args, **kwargs):
             else:
                 if self.params.get('dump_single_json', False):
                     self.post_extract(res)
-                    self.to_stdout(json.dumps(self.sanitize_info(res)))
+                    self.to_stdout(json.dumps(self.sanitize_info(
+                        res, compact_fragments=self.params.get('compact_fragments'))))
         return wrapper
 
     def download(self, url_list):
@@ -3669,7 +3732,7 @@ def download_with_info_file(self, info_filename):
                 [info_filename], mode='r',
                 openhook=fileinput.hook_encoded('utf-8'))) as f:
             # FileInput doesn't have a read method, we can't call json.load
-            infos = [self.sanitize_info(info, self.params.get('clean_infojson', True))
+            infos = [FragmentTable.load_json(self.sanitize_info(info, self.params.get('clean_infojson', True)))
                      for info in variadic(json.loads('\n'.join(f)))]
         for info in infos:
             try:
@@ -3687,8 +3750,12 @@ def download_with_info_file(self, info_filename):
         return self._download_retcode
 
     @staticmethod
-    def sanitize_info(info_dict, remove_private_keys=False):
-        """ Sanitize the infodict for converting to json """
+    def sanitize_info(info_dict, remove_private_keys=False, *, compact_fragments=False):
+        """
+        Sanitize the infodict for converting to json
+
+        With compact_fragments, the fragments of the formats are encoded as a FragmentTable
+        """
         if info_dict is None:
             return info_dict
         info_dict.setdefault('epoch', int(time.time()))
@@ -3709,10 +3776,14 @@ def sanitize_info(info_dict, remove_private_keys=False):
         else:
             reject = lambda k, v: False
 
-        def filter_fn(obj):
+        def filter_fn(obj, key=None):
             if isinstance(obj, dict):
-                return {k: filter_fn(v) for k, v in obj.items() if not reject(k, v)}
-            elif isinstance(obj, (list, tuple, set, LazyList)):
+                return {k: filter_fn(v, k) for k, v in obj.items() if not reject(k, v)}
+            elif (compact_fragments and key == 'fragments' and isinstance(obj, (list, DashFragments, FragmentTable))
+                    and all(isinstance(fragment, dict) for fragment in obj)):
+                return filter_fn(FragmentTable(
+                    {k: v for k, v in fragment.items() if not reject(k, v)} for fragment in obj).to_json())
+            elif isinstance(obj, (list, tuple, set, LazyList, DashFragments, FragmentTable)):
                 return list(map(filter_fn, obj))
             elif isinstance(obj, ImpersonateTarget):
                 return str(obj)
@@ -3778,7 +3849,7 @@ def run_pp(self, pp, infodict):
     def run_all_pps(self, key, info, *, additional_pps=None):
         if key != 'video':
             self._forceprint(key, info)
-        for pp in (additional_pps or []) + self._pps[key]:
+        for pp in FFmpegFusedPP.fuse(self, (additional_pps or []) + self._pps[key]):
             info = self.run_pp(pp, info)
         return info
 
@@ -4364,7 +4435,9 @@ def _write_info_json(self, label, ie_result, infofn, overwrite=None):
 
         self.to_screen(f'[info] Writing {label} metadata as JSON to: {infofn}')
         try:
-            write_json_file(self.sanitize_info(ie_result, self.params.get('clean_infojson', True)), infofn)
+            write_json_file(self.sanitize_info(
+                ie_result, self.params.get('clean_infojson', True),
+                compact_fragments=self.params.get('compact_fragments')), infofn)
             return True
         except OSError:
             self.report_error(f'Cannot write {label} metadata to JSON file {infofn}')
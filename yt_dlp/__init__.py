@@ -217,6 +217,7 @@ def validate_minmax(min_val, max_val, min_name, max_name=None):
     validate_positive('autonumber start', opts.autonumber_start)
     validate_positive('autonumber size', opts.autonumber_size, True)
     validate_positive('concurrent fragments', opts.concurrent_fragment_downloads, True)
+    validate_positive('http connections', opts.http_connections, True)
     validate_positive('playlist start', opts.playliststart, True)
     if opts.playlistend != -1:
         validate_minmax(opts.playliststart, opts.playlistend, 'playlist start', 'playlist end')
@@ -320,6 +321,7 @@ def validate_bytes(name, value, strict_positive=False):
     opts.max_filesize = validate_bytes('max filesize', opts.max_filesize)
     opts.buffersize = validate_bytes('buffer size', opts.buffersize, True)
     opts.http_chunk_size = validate_bytes('http chunk size', opts.http_chunk_size)
+    opts.fragment_buffer_size = validate_bytes('fragment buffer size', opts.fragment_buffer_size, True)
 
     # Output templates
     def validate_outtmpl(tmpl, msg):
@@ -845,7 +847,9 @@ def parse_options(argv=None):
         'retry_sleep_functions': opts.retry_sleep,
         'skip_unavailable_fragments': opts.skip_unavailable_fragments,
         'keep_fragments': opts.keep_fragments,
+        'fragment_buffer_size': opts.fragment_buffer_size,
         'concurrent_fragment_downloads': opts.concurrent_fragment_downloads,
+        'http_connections': opts.http_connections,
         'buffersize': opts.buffersize,
         'noresizebuffer': opts.noresizebuffer,
         'http_chunk_size': opts.http_chunk_size,
@@ -868,6 +872,7 @@ def parse_options(argv=None):
         'writeinfojson': opts.writeinfojson,
         'allow_playlist_files': opts.allow_playlist_files,
         'clean_infojson': opts.clean_infojson,
+        'compact_fragments': opts.compact_fragments,
         'getcomments': opts.getcomments,
         'writethumbnail': opts.writethumbnail is True,
         'write_all_thumbnails': opts.writethumbnail == 'all',
@@ -924,6 +929,7 @@ def parse_options(argv=None):
         'wait_for_video': opts.wait_for_video,
         'mark_watched': opts.mark_watched,
         'merge_output_format': opts.merge_output_format,
+        'stream_merge': opts.stream_merge,
         'final_ext': final_ext,
         'postprocessors': postprocessors,
         'fixup': opts.fixup,
@@ -943,8 +949,11 @@ def parse_options(argv=None):
         'ffmpeg_location': opts.ffmpeg_location,
         'hls_prefer_native': opts.hls_prefer_native,
         'hls_use_mpegts': opts.hls_use_mpegts,
+        'hls_persistent_cache': opts.hls_persistent_cache,
         'hls_split_discontinuity': opts.hls_split_discontinuity,
         'external_downloader_args': opts.external_downloader_args,
+        'aria2c_rpc': opts.aria2c_rpc,
+        'aria2c_rpc_secret': opts.aria2c_rpc_secret,
         'postprocessor_args': opts.postprocessor_args,
         'geo_verification_proxy': opts.geo_verification_proxy,
         'geo_bypass': opts.geo_bypass,
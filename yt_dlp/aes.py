@@ -1,4 +1,6 @@
 import base64
+import functools
+import struct
 from math import ceil
 
 from .compat import compat_ord
@@ -16,7 +18,9 @@ def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
 else:
     def aes_cbc_decrypt_bytes(data, key, iv):
         """ Decrypt bytes with AES-CBC using native implementation since pycryptodome is unavailable """
-        return bytes(aes_cbc_decrypt(*map(list, (data, key, iv))))
+        if len(data) % BLOCK_SIZE_BYTES:
+            return bytes(aes_cbc_decrypt(*map(list, (data, key, iv))))
+        return _aes_cbc_decrypt_blocks(data, bytes(key), struct.unpack('>4I', bytes(iv)))[0]
 
     def aes_gcm_decrypt_and_verify_bytes(data, key, tag, nonce):
         """ Decrypt bytes with AES-GCM using native implementation since pycryptodome is unavailable """
@@ -531,7 +535,129 @@ def ghash(subkey, data):
     return last_y
 
 
+class AESCBCDecryptor:
+    """
+    Incremental AES-CBC decryption with PKCS#7 padding
+
+    Ciphertext can be passed to `update` in pieces of any size as it arrives;
+    the last block is held back until `finalize` since it carries the padding.
+    The native implementation is used if pycryptodome is unavailable, with
+    the key schedules cached per key
+    """
+
+    def __init__(self, key, iv):
+        key, iv = bytes(key), bytes(iv)
+        if Cryptodome.AES:
+            self._decrypt = Cryptodome.AES.new(key, Cryptodome.AES.MODE_CBC, iv).decrypt
+        else:
+            self._key = key
+            self._previous_block = struct.unpack('>4I', iv)
+            self._decrypt = self._decrypt_native
+        self._pending = bytearray()
+
+    def _decrypt_native(self, data):
+        plaintext, self._previous_block = _aes_cbc_decrypt_blocks(data, self._key, self._previous_block)
+        return plaintext
+
+    def update(self, data):
+        """ Returns the plaintext of the data received so far, except for the last block """
+        self._pending += data
+        size = (len(self._pending) - 1) // BLOCK_SIZE_BYTES * BLOCK_SIZE_BYTES
+        if size <= 0:
+            return b''
+        with memoryview(self._pending) as view:
+            plaintext = self._decrypt(view[:size])
+        del self._pending[:size]
+        return plaintext
+
+    def finalize(self):
+        """ Returns the unpadded plaintext of the last block """
+        if len(self._pending) % BLOCK_SIZE_BYTES:
+            raise ValueError(f'Length of data should be a multiple of {BLOCK_SIZE_BYTES} bytes')
+        if not self._pending:
+            return b''
+        plaintext = self._decrypt(bytes(self._pending))
+        self._pending.clear()
+        return unpad_pkcs7(plaintext)
+
+
+def _gf_multiply(a, b):
+    if not a or not b:
+        return 0
+    return RIJNDAEL_EXP_TABLE[(RIJNDAEL_LOG_TABLE[a] + RIJNDAEL_LOG_TABLE[b]) % 0xFF]
+
+
+@functools.cache
+def _decryption_tables():
+    """
+    Lookup tables combining the inverse S-box with the inverse MixColumns step
+
+    @returns                   tables for each byte position of a 32-bit column
+    """
+    table = tuple(
+        _gf_multiply(s, 0xE) << 24 | _gf_multiply(s, 0x9) << 16 | _gf_multiply(s, 0xD) << 8 | _gf_multiply(s, 0xB)
+        for s in SBOX_INV)
+    return table, *(
+        tuple((word >> shift | word << (32 - shift)) & 0xFFFFFFFF for word in table)
+        for shift in (8, 16, 24))
+
+
+@functools.lru_cache(maxsize=16)
+def _decryption_key_schedule(key):
+    """
+    Key schedule for the equivalent inverse cipher
+
+    @param {bytes} key         16/24/32-Byte cipher key
+    @returns                   (number of rounds, round keys as 32-bit words)
+    """
+    expanded_key = bytes(key_expansion(list(key)))
+    words = struct.unpack(f'>{len(expanded_key) // 4}I', expanded_key)
+    rounds = len(words) // 4 - 1
+    td0, td1, td2, td3 = _decryption_tables()
+    round_keys = []
+    for round_ in range(rounds, -1, -1):
+        for word in words[round_ * 4: round_ * 4 + 4]:
+            if 0 < round_ < rounds:
+                word = (td0[SBOX[word >> 24]] ^ td1[SBOX[word >> 16 & 0xFF]]
+                        ^ td2[SBOX[word >> 8 & 0xFF]] ^ td3[SBOX[word & 0xFF]])
+            round_keys.append(word)
+    return rounds, tuple(round_keys)
+
+
+def _aes_cbc_decrypt_blocks(data, key, previous_block):
+    """
+    Decrypt whole blocks with AES-CBC, working on 32-bit columns
+
+    @param data                cipher, a multiple of 16 bytes long
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param previous_block      previous cipher block (or IV) as 4 32-bit words
+    @returns                   (decrypted bytes, last cipher block as 4 32-bit words)
+    """
+    rounds, rk = _decryption_key_schedule(key)
+    td0, td1, td2, td3 = _decryption_tables()
+    si = SBOX_INV
+    p0, p1, p2, p3 = previous_block
+    decrypted = []
+    for c0, c1, c2, c3 in struct.iter_unpack('>4I', data):
+        s0, s1, s2, s3 = c0 ^ rk[0], c1 ^ rk[1], c2 ^ rk[2], c3 ^ rk[3]
+        for k in range(4, rounds * 4, 4):
+            s0, s1, s2, s3 = (
+                td0[s0 >> 24] ^ td1[s3 >> 16 & 0xFF] ^ td2[s2 >> 8 & 0xFF] ^ td3[s1 & 0xFF] ^ rk[k],
+                td0[s1 >> 24] ^ td1[s0 >> 16 & 0xFF] ^ td2[s3 >> 8 & 0xFF] ^ td3[s2 & 0xFF] ^ rk[k + 1],
+                td0[s2 >> 24] ^ td1[s1 >> 16 & 0xFF] ^ td2[s0 >> 8 & 0xFF] ^ td3[s3 & 0xFF] ^ rk[k + 2],
+                td0[s3 >> 24] ^ td1[s2 >> 16 & 0xFF] ^ td2[s1 >> 8 & 0xFF] ^ td3[s0 & 0xFF] ^ rk[k + 3])
+        k = rounds * 4
+        decrypted += (
+            (si[s0 >> 24] << 24 | si[s3 >> 16 & 0xFF] << 16 | si[s2 >> 8 & 0xFF] << 8 | si[s1 & 0xFF]) ^ rk[k] ^ p0,
+            (si[s1 >> 24] << 24 | si[s0 >> 16 & 0xFF] << 16 | si[s3 >> 8 & 0xFF] << 8 | si[s2 & 0xFF]) ^ rk[k + 1] ^ p1,
+            (si[s2 >> 24] << 24 | si[s1 >> 16 & 0xFF] << 16 | si[s0 >> 8 & 0xFF] << 8 | si[s3 & 0xFF]) ^ rk[k + 2] ^ p2,
+            (si[s3 >> 24] << 24 | si[s2 >> 16 & 0xFF] << 16 | si[s1 >> 8 & 0xFF] << 8 | si[s0 & 0xFF]) ^ rk[k + 3] ^ p3)
+        p0, p1, p2, p3 = c0, c1, c2, c3
+    return struct.pack(f'>{len(decrypted)}I', *decrypted), (p0, p1, p2, p3)
+
+
 __all__ = [
+    'AESCBCDecryptor',
     'aes_cbc_decrypt',
     'aes_cbc_decrypt_bytes',
     'aes_cbc_encrypt',
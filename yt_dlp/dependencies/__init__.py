@@ -66,6 +66,11 @@
 except ImportError:
     requests = None
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 try:
     import xattr  # xattr or pyxattr
 except ImportError:
@@ -113,7 +113,7 @@ def _get_suitable_downloader(info_dict, protocol, params, default):
         return HlsFakeHeaderFD
 
     if protocol in ('m3u8', 'm3u8_native'):
-        if info_dict.get('is_live'):
+        if info_dict.get('is_live') and (external_downloader or '').lower() != 'native':
             return FFmpegFD
         elif (external_downloader or '').lower() == 'native':
             return HlsFD
@@ -4,6 +4,7 @@
 import os
 import random
 import re
+import stat
 import threading
 import time
 
@@ -178,6 +179,16 @@ def filesize_or_none(unencoded_filename):
             return os.path.getsize(unencoded_filename)
         return 0
 
+    @staticmethod
+    def is_pipe(filename):
+        """Whether the output is stdout or a pipe, where written data cannot be rewound"""
+        if filename == '-':
+            return True
+        try:
+            return stat.S_ISFIFO(os.stat(filename).st_mode)
+        except OSError:
+            return False
+
     @staticmethod
     def best_block_size(elapsed_time, bytes):
         new_min = max(bytes / 2.0, 1.0)
@@ -431,12 +442,11 @@ def download(self, filename, info_dict, subtitle=False):
         """Download to a filename using the info from info_dict
         Return True on success and False otherwise
         """
-        nooverwrites_and_exists = (
-            not self.params.get('overwrites', True)
-            and os.path.exists(filename)
-        )
-
         if not hasattr(filename, 'write'):
+            nooverwrites_and_exists = (
+                not self.params.get('overwrites', True)
+                and os.path.exists(filename)
+            )
             continuedl_and_exists = (
                 self.params.get('continuedl', True)
                 and os.path.isfile(filename)
@@ -1,22 +1,48 @@
+import functools
 import time
 import urllib.parse
+import xml.etree.ElementTree
 
 from . import get_suitable_downloader
-from .fragment import FragmentFD
-from ..utils import ReExtractInfo, update_url_query, urljoin
+from .fragment import FragmentFD, LiveReloadWait
+from ..compat import compat_etree_fromstring
+from ..extractor.common import InfoExtractor
+from ..utils import (
+    FragmentTable,
+    ReExtractInfo,
+    base_url,
+    parse_duration,
+    update_url_query,
+    urljoin,
+)
 
 
 class DashSegmentsFD(FragmentFD):
     """
     Download segments in a DASH manifest. External downloaders can take over
     the fragment downloads by supporting the 'dash_frag_urls' protocol
+
+    Live streams with a dynamic manifest are recorded by refreshing the manifest
+    until they end, unless the extractor provides the fragments itself
     """
 
     FD_NAME = 'dashsegments'
 
+    # Number of segments from the live edge to start recording at
+    _LIVE_EDGE_SEGMENTS = 3
+    # Number of update periods without new segments after which a live recording is stopped
+    _LIVE_TIMEOUT = 10
+    _LIVE_DEFAULT_UPDATE_PERIOD = 2
+
     def real_download(self, filename, info_dict):
+        requested_formats = [{**info_dict, **fmt} for fmt in info_dict.get('requested_formats', [])]
+        is_live = False
         if 'http_dash_segments_generator' in info_dict['protocol'].split('+'):
             real_downloader = None  # No external FD can support --live-from-start
+        elif info_dict.get('is_live') and all(fmt.get('manifest_url') for fmt in requested_formats or [info_dict]):
+            is_live = True
+            real_downloader = None  # Refreshing the manifest is not supported for external downloaders
+            self.to_screen(f'[{self.FD_NAME}] Recording live stream; the manifest will be refreshed until it ends')
         else:
             if info_dict.get('is_live'):
                 self.report_error('Live DASH videos are not supported')
@@ -25,9 +51,10 @@ def real_download(self, filename, info_dict):
 
         real_start = time.time()
 
-        requested_formats = [{**info_dict, **fmt} for fmt in info_dict.get('requested_formats', [])]
         args = []
         for fmt in requested_formats or [info_dict]:
+            if is_live:
+                fmt = {**fmt, 'fragments': functools.partial(self._live_fragments, fmt)}
             # Re-extract if --load-info-json is used and 'fragments' was originally a generator
             # See https://github.com/yt-dlp/yt-dlp/issues/13906
             if isinstance(fmt['fragments'], str):
@@ -59,7 +86,7 @@ def real_download(self, filename, info_dict):
             if real_downloader:
                 self.to_screen(
                     f'[{self.FD_NAME}] Fragment downloads will be delegated to {real_downloader.get_basename()}')
-                info_dict['fragments'] = list(fragments_to_download)
+                info_dict['fragments'] = FragmentTable(fragments_to_download)
                 fd = real_downloader(self.ydl, self.params)
                 return fd.real_download(filename, info_dict)
 
@@ -76,7 +103,10 @@ def _get_fragments(self, fmt, ctx, extra_query):
         fragments = self._resolve_fragments(fmt['fragments'], ctx)
 
         frag_index = 0
-        for i, fragment in enumerate(fragments):
+        for fragment in fragments:
+            if isinstance(fragment, LiveReloadWait):
+                yield fragment
+                continue
             frag_index += 1
             if frag_index <= ctx['fragment_index']:
                 continue
@@ -90,6 +120,108 @@ def _get_fragments(self, fmt, ctx, extra_query):
             yield {
                 'frag_index': frag_index,
                 'fragment_count': fragment.get('fragment_count'),
-                'index': i,
+                'index': frag_index - 1,
                 'url': fragment_url,
             }
+
+    def _live_fragments(self, fmt, ctx):
+        """
+        Yield the segments of a dynamic manifest as they become available, until the stream ends
+
+        The manifest is refreshed every minimumUpdatePeriod (or segment duration) and parsed
+        like the extractors do; the segments of the format that follow the last one that was
+        yielded, as identified by its $Number$ or $Time$ (or its URL without a template), are new. The recording starts at the beginning of the time shift buffer with
+        live_from_start, and _LIVE_EDGE_SEGMENTS from the live edge otherwise. It stops when
+        the manifest becomes static, is gone or has had no new segments for _LIVE_TIMEOUT
+        update periods, or on KeyboardInterrupt. A LiveReloadWait is yielded until each refresh
+        """
+        manifest_url = fmt['manifest_url']
+        last_position = last_init_url = None
+        last_update = time.monotonic()
+        while True:
+            reloaded = time.monotonic()
+            try:
+                manifest = self._fetch_live_manifest(fmt, manifest_url)
+            except KeyboardInterrupt:
+                self.to_screen(f'[{self.FD_NAME}] Interrupted by user; finishing the recording')
+                return
+            if not manifest:
+                return
+            try:
+                mpd_doc = compat_etree_fromstring(manifest[0])
+                segments = self._live_segments(mpd_doc, manifest[1], fmt, time.time())
+            except (xml.etree.ElementTree.ParseError, KeyError, ValueError) as e:
+                self.report_warning(f'Unable to parse the live manifest: {e}; stopping the recording')
+                return
+            location = mpd_doc.find('{*}Location')
+            if location is not None and location.text:
+                manifest_url = urllib.parse.urljoin(manifest[1], location.text.strip())
+            dynamic = mpd_doc.get('type') == 'dynamic'
+
+            if last_position is None:
+                new = segments if not dynamic or self.params.get('live_from_start') else (
+                    segments[-self._LIVE_EDGE_SEGMENTS:])
+            else:
+                positions = [segment['position'] for segment in segments]
+                # Segments that have left the time shift buffer in the meantime are missed
+                new = segments[len(positions) - positions[::-1].index(last_position):] if (
+                    last_position in positions) else segments
+
+            if new:
+                last_update = reloaded
+                last_position = new[-1]['position']
+                for segment in new:
+                    # The initialization segment is only needed again when it changes
+                    if segment['init_url'] and segment['init_url'] != last_init_url:
+                        last_init_url = segment['init_url']
+                        yield {'url': last_init_url}
+                    yield {'url': segment['url'], 'duration': segment['duration']}
+
+            if not dynamic:
+                return
+            update_period = parse_duration(mpd_doc.get('minimumUpdatePeriod')) or (
+                segments and segments[-1]['duration']) or self._LIVE_DEFAULT_UPDATE_PERIOD
+            if time.monotonic() - last_update > self._LIVE_TIMEOUT * update_period:
+                self.report_warning(
+                    f'The live manifest has had no new segments for {self._LIVE_TIMEOUT * update_period:.0f} '
+                    'seconds; stopping the recording')
+                return
+            # The segments are still downloaded and appended until the refresh
+            wait = LiveReloadWait(update_period - (time.monotonic() - reloaded))
+            yield wait
+            if wait.interrupted:
+                self.to_screen(f'[{self.FD_NAME}] Interrupted by user; finishing the recording')
+                return
+
+    def _live_segments(self, mpd_doc, mpd_url, fmt, now):
+        """
+        Get the segments of the format that are available at the time now in a refreshed manifest
+
+        @returns [{'url', 'init_url', 'duration', 'position'}, ...], where the position is
+                 the $Number$ or $Time$ of the segment, or its URL if it has no template
+        """
+        formats, _ = InfoExtractor(self.ydl)._parse_mpd_formats_and_subtitles(
+            mpd_doc, mpd_base_url=base_url(mpd_url), mpd_url=mpd_url, now=now)
+        # The representation is found again by its mimeType and bandwidth, and then its base URL
+        candidates = [f for f in formats if f.get('fragments') is not None and all(
+            f.get(key) == fmt.get(key) for key in ('container', 'tbr'))]
+        if not candidates:
+            raise ValueError(f'format {fmt["format_id"]} is not in the manifest')
+        refreshed = max(candidates, key=lambda f: (
+            f['fragment_base_url'] == fmt.get('fragment_base_url'),
+            f.get('manifest_stream_number') == fmt.get('manifest_stream_number')))
+
+        segments, init_url = [], None
+        for fragment, position in zip(refreshed['fragments'], refreshed['fragments'].positions(), strict=True):
+            url = fragment.get('url') or urljoin(refreshed['fragment_base_url'], fragment['path'])
+            # Only the initialization segments have no duration
+            if fragment.get('duration') is None:
+                init_url = url
+            else:
+                segments.append({
+                    'url': url,
+                    'init_url': init_url,
+                    'duration': fragment['duration'],
+                    'position': url if position is None else position,
+                })
+        return segments
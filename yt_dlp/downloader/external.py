@@ -1,3 +1,5 @@
+import atexit
+import contextlib
 import enum
 import functools
 import json
@@ -6,11 +8,13 @@
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import uuid
 
 from .fragment import FragmentFD
 from ..networking import Request
+from ..networking.exceptions import RequestError
 from ..postprocessor.ffmpeg import EXT_TO_OUT_FORMATS, FFmpegPostProcessor
 from ..utils import (
     Popen,
@@ -167,7 +171,11 @@ def _call_downloader(self, tmpfilename, info_dict):
             continue
         if not skip_unavailable_fragments and retry_manager.error:
             return -1
+        return self._join_fragments(tmpfilename, info_dict)
 
+    def _join_fragments(self, tmpfilename, info_dict):
+        """Concatenate the -Frag files written by the downloader into tmpfilename"""
+        skip_unavailable_fragments = self.params.get('skip_unavailable_fragments', True)
         decrypt_fragment = self.decrypter(info_dict)
         dest, _ = self.sanitize_open(tmpfilename, 'wb')
         for frag_index, fragment in enumerate(info_dict['fragments']):
@@ -178,6 +186,7 @@ def _call_downloader(self, tmpfilename, info_dict):
                 if skip_unavailable_fragments and frag_index > 1:
                     self.report_skip_fragment(frag_index, err)
                     continue
+                dest.close()
                 self.report_error(f'Unable to open fragment {frag_index}; {err}')
                 return -1
             dest.write(decrypt_fragment(fragment, src.read()))
@@ -266,6 +275,171 @@ def _make_cmd(self, tmpfilename, info_dict):
         return cmd
 
 
+class Aria2cRPCError(Exception):
+    pass
+
+
+class Aria2cDaemon:
+    """
+    An aria2c process that is controlled through its JSON-RPC interface
+
+    One daemon is shared by all the downloads in the process, so that aria2c is
+    not started again for each download and keeps its connections alive in
+    between. Either a daemon is started (url 'auto'), or an existing one is used.
+    Downloads that stopped are reported through the websocket notifications of
+    aria2c when a websocket request handler is available, and polled otherwise
+    """
+
+    _EVENTS = ('aria2.onDownloadComplete', 'aria2.onDownloadError', 'aria2.onDownloadStop')
+    _START_TIMEOUT = 10
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, fd):
+        url, secret = fd.params['aria2c_rpc'], fd.params.get('aria2c_rpc_secret')
+        with cls._instances_lock:
+            daemon = cls._instances.get((url, secret))
+            if not daemon or (daemon._process and daemon._process.poll() is not None):
+                daemon = cls._instances[url, secret] = cls.start(fd) if url == 'auto' else cls(url, secret)
+            return daemon
+
+    @classmethod
+    def start(cls, fd):
+        port, secret = find_available_port() or 19190, str(uuid.uuid4())
+        cmd = [
+            fd.exe, '--enable-rpc', f'--rpc-listen-port={port}', f'--rpc-secret={secret}',
+            '--no-conf', '--console-log-level=warn', '--summary-interval=0', '--download-result=hide', '-j16',
+            # Exit with yt-dlp, even when it is killed
+            f'--stop-with-process={os.getpid()}',
+            *fd._option('--interface', 'source_address'),
+            *fd._configuration_args()]
+        fd._debug_cmd(cmd)
+        process = Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        atexit.register(process.terminate)
+        daemon = cls(f'http://localhost:{port}/jsonrpc', secret, process)
+
+        deadline = time.monotonic() + cls._START_TIMEOUT
+        while True:
+            try:
+                daemon.call(fd.ydl, 'aria2.getVersion')
+                return daemon
+            except RequestError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    process.terminate()
+                    raise Aria2cRPCError('Unable to start the aria2c daemon')
+                time.sleep(0.1)
+
+    def __init__(self, url, secret=None, process=None):
+        self.url = url
+        self._secret = secret
+        self._process = process
+        self._cond = threading.Condition()
+        # The downloads that are waited for, and those of them that were notified as stopped
+        self._watched = set()
+        self._stopped = set()
+        self._listening = None
+
+    def _params(self, params):
+        return [f'token:{self._secret}', *params] if self._secret is not None else list(params)
+
+    def call(self, ydl, method, *params):
+        return self._request(ydl, method, self._params(params))
+
+    def _request(self, ydl, method, params):
+        data = json.dumps({
+            'jsonrpc': '2.0',
+            'id': str(uuid.uuid4()),
+            'method': method,
+            'params': params,
+        }).encode()
+        request = Request(self.url, data=data, headers={'Content-Type': 'application/json'}, proxies={'all': None})
+        with ydl.urlopen(request) as response:
+            result = json.load(response)
+        if 'error' in result:
+            raise Aria2cRPCError(f'aria2c RPC call {method} failed: {result["error"].get("message")}')
+        return result['result']
+
+    def multicall(self, ydl, calls):
+        """@returns the results of the (method, *params) calls; those of failed calls are Aria2cRPCError"""
+        if not calls:
+            return []
+        # The secret is given to each call rather than to system.multicall
+        results = self._request(ydl, 'system.multicall', [[
+            {'methodName': method, 'params': self._params(params)} for method, *params in calls]])
+        return [
+            result[0] if isinstance(result, list)
+            else Aria2cRPCError(f'aria2c RPC call {method} failed: {result.get("faultString")}')
+            for (method, *_), result in zip(calls, results, strict=True)]
+
+    def listen(self, ydl):
+        """Start receiving the notifications of the daemon, if possible. Call before adding downloads"""
+        with self._cond:
+            if self._listening is not None:
+                return
+            try:
+                ws = ydl.urlopen(Request(re.sub(r'^http', 'ws', self.url), proxies={'all': None}))
+            except RequestError as e:
+                ydl.write_debug(f'Polling the aria2c daemon; unable to receive its notifications: {e}')
+                self._listening = False
+                return
+            self._listening = True
+        threading.Thread(target=self._receive, args=(ws,), name='aria2c-notifications', daemon=True).start()
+
+    def _receive(self, ws):
+        try:
+            while True:
+                message = json.loads(ws.recv())
+                if message.get('method') in self._EVENTS:
+                    with self._cond:
+                        self._stopped.update(
+                            event['gid'] for event in message['params'] if event['gid'] in self._watched)
+                        self._cond.notify_all()
+        except (RequestError, ValueError, KeyError, TypeError):
+            pass
+        finally:
+            ws.close()
+            with self._cond:
+                self._listening = False
+                self._cond.notify_all()
+
+    def wait(self, ydl, gids, timeout, keys=('status',), active=False):
+        """
+        Wait until some of the downloads gids stop, or for timeout seconds
+
+        @param keys    The keys of aria2.tellStatus to get
+        @param active  Whether to also get the status of the downloads that have not stopped
+        @returns       {gid: status, or Aria2cRPCError} of the downloads that stopped, and of
+                       the other ones with active. The downloads that stopped are no longer waited for
+        """
+        with self._cond:
+            self._watched.update(gids)
+            if self._listening:
+                self._cond.wait_for(lambda: self._stopped & gids or not self._listening, timeout)
+            notified = self._stopped & gids
+            listening = self._listening
+        if not listening:
+            time.sleep(timeout)
+        # Without a notification, the downloads are polled in case it was missed
+        queried = list(gids if active or not notified else notified)
+        results = dict(zip(queried, self.multicall(ydl, [
+            ('aria2.tellStatus', gid, list(keys)) for gid in queried]), strict=True))
+        stopped = {gid for gid, status in results.items() if isinstance(status, Aria2cRPCError)
+                   or status['status'] in ('complete', 'error', 'removed')}
+        with self._cond:
+            self._watched -= stopped
+            # Also those that were notified but not found stopped, which are polled again after a timeout
+            self._stopped -= stopped | notified
+        return results if active else {gid: results[gid] for gid in stopped}
+
+    def forget(self, gids):
+        """Stop waiting for the downloads gids"""
+        with self._cond:
+            self._watched.difference_update(gids)
+            self._stopped.difference_update(gids)
+
+
 class Aria2cFD(ExternalFD):
     AVAILABLE_OPT = '-v'
     SUPPORTED_PROTOCOLS = ('http', 'https', 'ftp', 'ftps', 'dash_frag_urls', 'm3u8_frag_urls')
@@ -284,6 +458,8 @@ def _aria2c_filename(fn):
         return fn if os.path.isabs(fn) else f'.{os.path.sep}{fn}'
 
     def _call_downloader(self, tmpfilename, info_dict):
+        if self.params.get('aria2c_rpc'):
+            return self._call_daemon(tmpfilename, info_dict)
         # FIXME: Disabled due to https://github.com/yt-dlp/yt-dlp/issues/5931
         if False and 'no-external-downloader-progress' not in self.params.get('compat_opts', []):
             info_dict['__rpc'] = {
@@ -348,6 +524,148 @@ def _make_cmd(self, tmpfilename, info_dict):
             cmd += ['--', info_dict['url']]
         return cmd
 
+    def _daemon_downloads(self, tmpfilename, info_dict):
+        """@returns the (url, options) to add to the aria2c daemon"""
+        # The daemon may have another working directory
+        dn = os.path.abspath(os.path.dirname(tmpfilename)) + os.path.sep
+        options = {
+            'continue': 'true',
+            'http-accept-gzip': 'true',
+            'file-allocation': 'none',
+            'auto-file-renaming': 'false',
+            'dir': dn,
+            'max-connection-per-server': '16',
+            'split': '16',
+        }
+        if self.params.get('ratelimit'):
+            options['max-download-limit'] = str(self.params['ratelimit'])
+        if self.params.get('proxy'):
+            options['all-proxy'] = self.params['proxy']
+        if self.params.get('nocheckcertificate'):
+            options['check-certificate'] = 'false'
+        if self.params.get('updatetime') is not None:
+            options['remote-time'] = 'true' if self.params['updatetime'] else 'false'
+        headers = [f'{key}: {val}' for key, val in (info_dict.get('http_headers') or {}).items()]
+
+        def with_cookies(url):
+            # The cookies file can only be given when the daemon is started
+            cookie_header = self.ydl.cookiejar.get_cookie_header(url)
+            return [*headers, f'Cookie: {cookie_header}'] if cookie_header else headers
+
+        if 'fragments' not in info_dict:
+            return [(info_dict['url'], {
+                **options,
+                'min-split-size': '1M',
+                'header': with_cookies(info_dict['url']),
+                'out': self._aria2c_filename(os.path.basename(tmpfilename)),
+            })]
+        return [(fragment['url'], {
+            **options,
+            'allow-overwrite': 'true',
+            'allow-piece-length-change': 'true',
+            'header': with_cookies(fragment['url']),
+            'out': self._aria2c_filename(f'{os.path.basename(tmpfilename)}-Frag{frag_index}'),
+        }) for frag_index, fragment in enumerate(info_dict['fragments'])]
+
+    def _call_daemon(self, tmpfilename, info_dict):
+        try:
+            daemon = Aria2cDaemon.get(self)
+        except Aria2cRPCError as err:
+            self.report_error(str(err))
+            return -1
+        downloads = self._daemon_downloads(tmpfilename, info_dict)
+        if 'fragments' not in info_dict:
+            errors = self._download_with_daemon(daemon, downloads, info_dict)
+            if errors:
+                self.to_stderr(errors[0])
+            return 1 if errors else 0
+
+        skip_unavailable_fragments = self.params.get('skip_unavailable_fragments', True)
+        retry_manager = RetryManager(self.params.get('fragment_retries'), self.report_retry,
+                                     frag_index=None, fatal=not skip_unavailable_fragments)
+        for retry in retry_manager:
+            errors = self._download_with_daemon(daemon, downloads, info_dict)
+            if not errors:
+                break
+            # Only the failed fragments are downloaded again
+            downloads = [downloads[index] for index in errors]
+            retry.error = Aria2cRPCError(next(iter(errors.values())))
+        if not skip_unavailable_fragments and retry_manager.error:
+            return -1
+        return self._join_fragments(tmpfilename, info_dict)
+
+    def _download_with_daemon(self, daemon, downloads, info_dict):
+        """@returns {index in downloads: error message} of the downloads that failed"""
+        try:
+            daemon.listen(self.ydl)
+            gids = daemon.multicall(self.ydl, [('aria2.addUri', [url], options) for url, options in downloads])
+        except (Aria2cRPCError, RequestError) as err:
+            return dict.fromkeys(range(len(downloads)), str(err))
+        errors = {index: str(gid) for index, gid in enumerate(gids) if isinstance(gid, Aria2cRPCError)}
+        pending = {gid: index for index, gid in enumerate(gids) if index not in errors}
+
+        started = time.time()
+        fragmented = 'fragments' in info_dict
+        status = {
+            'filename': info_dict.get('_filename'),
+            'status': 'downloading',
+            'elapsed': 0,
+            'downloaded_bytes': 0,
+            'fragment_count': len(downloads) if fragmented else None,
+            'fragment_index': 0 if fragmented else None,
+        }
+        self._hook_progress(status, info_dict)
+        finished_bytes = 0
+        keys = ['status', 'totalLength', 'completedLength', 'downloadSpeed', 'errorMessage']
+        try:
+            while pending:
+                # The active downloads are only queried for the progress
+                statuses = daemon.wait(self.ydl, set(pending), 1, keys, active=not self.params.get('noprogress'))
+                active_bytes = active_total = speed = 0
+                stopped = []
+                for gid, result in statuses.items():
+                    if isinstance(result, Aria2cRPCError):
+                        result = {'status': 'error', 'errorMessage': str(result)}
+                    if result.get('status') not in ('complete', 'error', 'removed'):
+                        active_bytes += int(result.get('completedLength') or 0)
+                        active_total += int(result.get('totalLength') or 0)
+                        speed += int(result.get('downloadSpeed') or 0)
+                        continue
+                    stopped.append(gid)
+                    index = pending.pop(gid)
+                    if result['status'] == 'complete':
+                        finished_bytes += int(result.get('totalLength') or 0)
+                    else:
+                        errors[index] = result.get('errorMessage') or f'the download was {result["status"]}'
+                daemon.multicall(self.ydl, [('aria2.removeDownloadResult', gid) for gid in stopped])
+
+                done = len(downloads) - len(pending)
+                downloaded = finished_bytes + active_bytes
+                if fragmented:
+                    total = finished_bytes / done * len(downloads) if done else None
+                else:
+                    total = active_total or finished_bytes or None
+                status.update({
+                    'downloaded_bytes': downloaded,
+                    'speed': speed,
+                    'total_bytes': None if fragmented else total,
+                    'total_bytes_estimate': total,
+                    'eta': (total - downloaded) / speed if total and speed else None,
+                    'fragment_index': min(len(downloads), done + 1) if fragmented else None,
+                    'elapsed': time.time() - started,
+                })
+                self._hook_progress(status, info_dict)
+        except (Aria2cRPCError, RequestError) as err:
+            errors.update(dict.fromkeys(pending.values(), str(err)))
+        except BaseException:
+            # Leave the daemon to the other downloads
+            with contextlib.suppress(Aria2cRPCError, RequestError):
+                daemon.multicall(self.ydl, [('aria2.forceRemove', gid) for gid in pending])
+            raise
+        finally:
+            daemon.forget(pending)
+        return errors
+
     def aria2c_rpc(self, rpc_port, rpc_secret, method, params=()):
         # Does not actually need to be UUID, just unique
         sanitycheck = str(uuid.uuid4())
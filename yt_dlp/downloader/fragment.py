@@ -1,17 +1,29 @@
+import collections
 import concurrent.futures
 import contextlib
+import functools
+import io
 import json
-import math
 import os
 import struct
+import tempfile
+import threading
 import time
+import urllib.parse
 
 from .common import FileDownloader
+from .hls_cache import HlsCache
 from .http import HttpFD
-from ..aes import aes_cbc_decrypt_bytes, unpad_pkcs7
+from ..aes import AESCBCDecryptor, aes_cbc_decrypt_bytes, unpad_pkcs7
 from ..networking import Request
-from ..networking.exceptions import HTTPError, IncompleteRead
-from ..utils import DownloadError, RetryManager, traverse_obj
+from ..networking.exceptions import HTTPError, IncompleteRead, TransportError
+from ..utils import (
+    NO_DEFAULT,
+    DownloadError,
+    RetryManager,
+    join_nonempty,
+    traverse_obj,
+)
 from ..utils.networking import HTTPHeaderDict
 from ..utils.progress import ProgressCalculator
 
@@ -23,6 +35,435 @@ def to_screen(self, *args, **kargs):
     to_console_title = to_screen
 
 
+class FragmentScheduler:
+    """
+    Process-wide pool of fragment download threads shared by all FragmentFD downloads
+
+    Jobs are queued per download and dispatched round-robin between the downloads
+    that have work queued, so that concurrently downloaded formats and videos share
+    the threads fairly and idle threads are lent to whichever download needs them.
+    At most `max_workers` jobs run at once in total, and at most the limits given at
+    submission per download and per host. `max_per_host` is the host limit of the
+    jobs that are submitted without one
+    """
+
+    _IDLE_TIMEOUT = 5
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, max_workers):
+        """Get the shared scheduler, raising its thread budget if necessary"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(max_workers)
+            else:
+                cls._instance._update_limits(max_workers)
+            return cls._instance
+
+    def __init__(self, max_workers, max_per_host=None):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()
+        self._active_hosts = collections.Counter()
+        self._active_keys = collections.Counter()
+        self._queued = 0
+        self._threads = 0
+        # Threads are counted as idle from when they are started until they take a job
+        self._idle = 0
+
+    def _update_limits(self, max_workers):
+        with self._cond:
+            self.max_workers = max(self.max_workers, max_workers)
+            self._cond.notify_all()
+
+    def submit(self, key, host, max_active, func, *args, max_per_host=None, **kwargs):
+        """
+        Queue func(*args, **kwargs) on behalf of the download identified by `key`
+
+        @param host         Host the job connects to
+        @param max_active   Maximum number of jobs of this download running at once
+        @param max_per_host Maximum number of jobs running at once against the host,
+                            counting those of the other downloads
+        @returns            A concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        with self._cond:
+            self._queues.setdefault(key, collections.deque()).append((
+                future, host, max_active, max_per_host or self.max_per_host,
+                functools.partial(func, *args, **kwargs)))
+            self._queued += 1
+            if self._queued > self._idle and self._threads < self.max_workers:
+                self._threads += 1
+                self._idle += 1
+                threading.Thread(target=self._worker, daemon=True).start()
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        for key, queue in self._queues.items():
+            future, host, max_active, max_per_host, func = queue[0]
+            if self._active_keys[key] >= max_active:
+                continue
+            if max_per_host and self._active_hosts[host] >= max_per_host:
+                continue
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self._queued -= 1
+            return key, future, host, func
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while (job := self._next_job()) is None:
+                    if not self._cond.wait(self._IDLE_TIMEOUT):
+                        break
+                self._idle -= 1
+                if job is None:
+                    self._threads -= 1
+                    return
+                key, future, host, func = job
+                self._active_hosts[host] += 1
+                self._active_keys[key] += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func())
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active_hosts[host] -= 1
+                    self._active_keys[key] -= 1
+                    self._idle += 1
+                    self._cond.notify_all()
+
+
+def _dump_extra_state(extra_state):
+    """Values of extra_state may be objects with an as_json property, which is only computed at checkpoints"""
+    def default(obj):
+        try:
+            return obj.as_json
+        except AttributeError:
+            raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+    return json.dumps(extra_state, default=default)
+
+
+class FragmentJournal:
+    """
+    Append-only log of the progress of a fragment download
+
+    Each line of the journal is one of:
+        a <index> <size> [<extra state>]
+                All the fragments up to <index> have been appended to the output,
+                which was <size> bytes long after flushing them
+        d <index> <size>
+                Fragment <index> has been completely downloaded into its -Frag file,
+                but has not been appended to the output yet
+
+    Records are buffered and written in batches. A line that was only partially
+    written (e.g. because of a crash) ends the journal when it is read back.
+
+    Once the journal outgrows COMPACT_SIZE, it is replaced at the next flush by a
+    snapshot of the records that are still needed: the last checkpoint, and the
+    fragments downloaded after it. This needs the filename of the journal, and
+    the state that was read back from it when resuming
+    """
+
+    BATCH_SIZE = 32
+    BATCH_INTERVAL = 2
+    COMPACT_SIZE = 1024 * 1024
+
+    def __init__(self, stream, batch_interval=None, filename=None, checkpoint=None, downloaded=None):
+        self._stream = stream
+        self._batch_interval = self.BATCH_INTERVAL if batch_interval is None else batch_interval
+        self._filename = filename
+        self._lock = threading.Lock()
+        self._pending = []
+        self._checkpoint = None
+        self._appended = 0
+        self._last_flush = time.monotonic()
+        # The records that a snapshot would consist of
+        self._last_checkpoint = checkpoint and self._checkpoint_line(*checkpoint)
+        self._last_index = checkpoint[0] if checkpoint else 0
+        self._downloaded = dict(downloaded or {})
+        self._size = stream.tell() if filename else 0
+
+    @staticmethod
+    def _checkpoint_line(index, size, extra_state):
+        return join_nonempty(
+            'a', index, size, extra_state is not None and _dump_extra_state(extra_state), delim=' ') + '\n'
+
+    @staticmethod
+    def parse(stream):
+        """@returns (index, size, extra_state) of the last checkpoint or None, {index: size} of unappended fragments"""
+        checkpoint, downloaded = None, {}
+        for line in stream:
+            if not line.endswith('\n'):
+                break
+            kind, _, record = line[:-1].partition(' ')
+            try:
+                if kind == 'a':
+                    index, size, *extra_state = record.split(' ', 2)
+                    checkpoint = int(index), int(size), json.loads(extra_state[0]) if extra_state else None
+                elif kind == 'd':
+                    index, size = record.split(' ')
+                    downloaded[int(index)] = int(size)
+                else:
+                    break
+            except ValueError:
+                break
+        if checkpoint:
+            downloaded = {index: size for index, size in downloaded.items() if index > checkpoint[0]}
+        return checkpoint, downloaded
+
+    def record_download(self, frag_index, size):
+        with self._lock:
+            self._pending.append(f'd {frag_index} {size}\n')
+            self._downloaded[frag_index] = size
+
+    def record_append(self, frag_index, size, extra_state=None):
+        """@returns whether the journal should be flushed"""
+        with self._lock:
+            self._checkpoint = frag_index, size, extra_state
+            self._appended += 1
+            return (self._appended >= self.BATCH_SIZE
+                    or time.monotonic() - self._last_flush >= self._batch_interval)
+
+    def flush(self):
+        """Write the pending records. The output must have been flushed before calling this"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if self._checkpoint:
+                self._last_index = self._checkpoint[0]
+                self._last_checkpoint = self._checkpoint_line(*self._checkpoint)
+                lines.append(self._last_checkpoint)
+            self._checkpoint, self._appended = None, 0
+            self._last_flush = time.monotonic()
+            if not lines:
+                return
+            data = ''.join(lines)
+            self._stream.write(data)
+            self._stream.flush()
+            self._size += len(data)
+            if self._filename and self._size > self.COMPACT_SIZE:
+                self._compact()
+
+    def _compact(self):
+        self._downloaded = {
+            index: size for index, size in self._downloaded.items() if index > self._last_index}
+        snapshot = ''.join((
+            *(f'd {index} {size}\n' for index, size in self._downloaded.items()),
+            self._last_checkpoint or ''))
+        # The journal is replaced at once, so that a crash leaves either the old or the new one
+        temp_filename = f'{self._filename}.part'
+        with open(temp_filename, 'w') as f:
+            f.write(snapshot)
+        self._stream.close()
+        os.replace(temp_filename, self._filename)
+        self._stream = open(self._filename, 'a')
+        self._size = len(snapshot)
+
+    def close(self):
+        self._stream.close()
+
+
+class FragmentWriter:
+    """
+    File-like object that writes the output of a fragment download from a dedicated thread
+
+    write() queues the data and only blocks while more than MAX_PENDING_BYTES are
+    waiting to be written. The output is flushed every flush_interval seconds,
+    and flush() waits until all the queued data has been written and flushed.
+    Errors of the thread are raised by the next call.
+
+    With preallocate, reserve() allocates disk space for the estimated final size
+    ahead of the writes, so that the file is not grown piecemeal. The space that
+    was not written to is truncated away when closing
+    """
+
+    MAX_PENDING_BYTES = 64 * 1024 * 1024
+    RESERVE_STEP = 16 * 1024 * 1024
+
+    def __init__(self, stream, flush_interval, preallocate=False):
+        self._stream = stream
+        self._flush_interval = flush_interval
+        self._preallocate = preallocate and hasattr(os, 'posix_fallocate')
+        self._position = stream.tell() if stream.seekable() else 0
+        self._allocated = max(os.fstat(stream.fileno()).st_size, self._position)
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._pending_bytes = 0
+        self._error = None
+        self._error_raised = False
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, name='fragment-writer', daemon=True)
+        self._thread.start()
+
+    def _check_error(self):
+        if self._error is not None:
+            self._error_raised = True
+            raise self._error
+
+    def _put(self, kind, value, size=0):
+        with self._cond:
+            if self.closed:
+                raise ValueError('I/O operation on closed file.')
+            self._cond.wait_for(lambda: self._pending_bytes < self.MAX_PENDING_BYTES or self._error)
+            self._check_error()
+            self._queue.append((kind, value))
+            self._pending_bytes += size
+            self._cond.notify_all()
+
+    def write(self, data):
+        self._put('write', data, len(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        """Size of the output once the queued writes are done"""
+        return self._position
+
+    def reserve(self, size):
+        if not self._preallocate:
+            return
+        target = max(int(size or 0), self._position)
+        if target <= self._allocated:
+            return
+        target = max(target, self._allocated + self.RESERVE_STEP)
+        self._put('reserve', (self._allocated, target - self._allocated))
+        self._allocated = target
+
+    def flush(self):
+        done = threading.Event()
+        self._put('flush', done)
+        done.wait()
+        with self._cond:
+            self._check_error()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.append(None)
+            self._cond.notify_all()
+        self._thread.join()
+        try:
+            if self._error is None and self._allocated > self._position:
+                self._stream.truncate(self._position)
+        finally:
+            self._stream.close()
+        if not self._error_raised:
+            self._check_error()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                item = self._queue.popleft()
+            kind, value = item or ('flush', None)
+            try:
+                if self._error is not None:
+                    pass
+                elif kind == 'write':
+                    self._stream.write(value)
+                elif kind == 'reserve':
+                    try:
+                        os.posix_fallocate(self._stream.fileno(), *value)
+                    except OSError:
+                        # Not supported by the filesystem, or not enough space; the writes will tell
+                        self._preallocate = False
+                if self._error is None and (
+                        kind == 'flush' or time.monotonic() - last_flush >= self._flush_interval):
+                    self._stream.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self._error = e
+            finally:
+                if kind == 'flush' and value is not None:
+                    value.set()
+                with self._cond:
+                    if kind == 'write':
+                        self._pending_bytes -= len(value)
+                    self._cond.notify_all()
+            if item is None:
+                return
+
+
+class _DecryptingBuffer:
+    """
+    Fragment buffer that decrypts AES-128 data as it is written to it
+
+    Only the plaintext is stored. Restarting the download with seek(0) and
+    truncate() also restarts the decryption
+    """
+
+    def __init__(self, buffer, key, iv):
+        self._buffer = buffer
+        self._key, self._iv = key, iv
+        self._decryptor = AESCBCDecryptor(key, iv)
+
+    def write(self, data):
+        self._buffer.write(self._decryptor.update(data))
+        return len(data)
+
+    def seek(self, *args):
+        return self._buffer.seek(*args)
+
+    def truncate(self, size=None):
+        if (self._buffer.tell() if size is None else size) != 0:
+            raise io.UnsupportedOperation('can only truncate an encrypted fragment buffer to zero')
+        self._decryptor = AESCBCDecryptor(self._key, self._iv)
+        return self._buffer.truncate(0)
+
+    def finalize(self):
+        self._buffer.write(self._decryptor.finalize())
+
+    def read(self, *args):
+        return self._buffer.read(*args)
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LiveReloadWait:
+    """
+    Yielded by the fragments of a live stream until its manifest is to be reloaded
+
+    The downloader keeps appending the fragments that complete in the meantime
+    instead of sleeping in the generator. `interrupted` is set when the wait
+    is interrupted by the user; the recording should then be finished
+    """
+
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + max(0, seconds)
+        self.interrupted = False
+
+    def remaining(self):
+        return max(0, self.deadline - time.monotonic())
+
+    def sleep(self):
+        try:
+            time.sleep(self.remaining())
+        except KeyboardInterrupt:
+            self.interrupted = True
+
+
 class FragmentFD(FileDownloader):
     """
     A base file downloader class for fragmented media (e.g. f4m/m3u8 manifests).
@@ -35,7 +476,24 @@ class FragmentFD(FileDownloader):
                         Skip unavailable fragments (DASH and hlsnative only)
     keep_fragments:     Keep downloaded fragments on disk after downloading is
                         finished
-    concurrent_fragment_downloads:  The number of threads to use for native hls and dash downloads
+    concurrent_fragment_downloads:  The number of threads to use for native hls and dash downloads.
+                        The threads are shared by all the fragment downloads in the process
+    concurrent_fragments_per_host: Maximum number of fragments downloaded at once
+                        from a single host, counting those of all the downloads
+                        in the process. Only limits the fragments of this download
+    fragment_buffer_size: Download fragments into memory instead of temporary
+                        files. Fragments larger than this size (in bytes) are
+                        spilled to disk. Not used with keep_fragments
+    fragment_reorder_window: Maximum number of fragments that are being downloaded
+                        or are waiting for a preceding fragment to be appended
+                        when downloading concurrently. Default is four times the
+                        number of threads
+    fragment_reorder_buffer_size: Maximum number of bytes of the downloaded fragments
+                        that are held in memory while waiting for a preceding
+                        fragment to be appended. Default is 64MiB; None for no limit
+    fragment_flush_interval: Minimum number of seconds between flushes of the
+                        output file and checkpoints of the journal. Default is
+                        FragmentJournal.BATCH_INTERVAL; 0 flushes after every fragment
     _no_ytdl_file:      Don't use .ytdl file
 
     For each incomplete fragment download yt-dlp keeps on disk a special
@@ -56,9 +514,17 @@ class FragmentFD(FileDownloader):
             fragment_count:
                 Total count of fragments
 
+    The progress of the download is not stored in the .ytdl file itself, but
+    appended in batches to a journal file with a .ytdl.journal extension, see
+    FragmentJournal. When resuming, the output is truncated to the size recorded
+    at the last checkpoint of the journal, and fragments that had already been
+    downloaded out of order are not downloaded again.
+
     This feature is experimental and file format may change in future.
     """
 
+    _key_lock = threading.Lock()
+
     def report_retry_fragment(self, err, frag_index, count, retries):
         self.deprecation_warning('yt_dlp.downloader.FragmentFD.report_retry_fragment is deprecated. '
                                  'Use yt_dlp.downloader.FileDownloader.report_retry instead')
@@ -72,12 +538,29 @@ def _prepare_url(self, info_dict, url):
         headers = info_dict.get('http_headers')
         return Request(url, None, headers) if headers else url
 
+    def _fetch_live_manifest(self, info_dict, url):
+        """@returns (content, url) of the refreshed manifest of a live stream, or None once it is gone"""
+        for retry in RetryManager(self.params.get('fragment_retries'), self.report_retry, fatal=False):
+            try:
+                urlh = self.ydl.urlopen(self._prepare_url(info_dict, url))
+                return urlh.read(), urlh.url
+            except HTTPError as err:
+                if err.status in (404, 410):
+                    self.to_screen(f'[{self.FD_NAME}] The live manifest is no longer available')
+                    return None
+                retry.error = err
+            except TransportError as err:
+                retry.error = err
+        self.report_warning(f'Unable to refresh the live manifest: {retry.error}')
+        return None
+
     def _prepare_and_start_frag_download(self, ctx, info_dict):
         self._prepare_frag_download(ctx)
         self._start_frag_download(ctx, info_dict)
 
     def __do_ytdl_file(self, ctx):
-        return ctx['live'] is not True and ctx['tmpfilename'] != '-' and not self.params.get('_no_ytdl_file')
+        return ((ctx['live'] is not True or ctx.get('resumable'))
+                and ctx['tmpfilename'] != '-' and not self.params.get('_no_ytdl_file'))
 
     def _read_ytdl_file(self, ctx):
         assert 'ytdl_corrupt' not in ctx
@@ -92,6 +575,40 @@ def _read_ytdl_file(self, ctx):
         finally:
             stream.close()
 
+    def journal_filename(self, filename):
+        return self.ytdl_filename(filename) + '.journal'
+
+    def _read_fragment_journal(self, ctx):
+        """@returns the size of the output at the last checkpoint (0 if none), or None if there is no journal"""
+        journal_filename = self.journal_filename(ctx['filename'])
+        if not os.path.isfile(journal_filename):
+            return None
+        stream, _ = self.sanitize_open(journal_filename, 'r')
+        with stream:
+            checkpoint, ctx['downloaded_fragments'] = FragmentJournal.parse(stream)
+        ctx['journal_checkpoint'] = checkpoint
+        if not checkpoint:
+            ctx['fragment_index'] = 0
+            return 0
+        ctx['fragment_index'], resume_len, extra_state = checkpoint
+        if extra_state is not None:
+            ctx['extra_state'] = extra_state
+        return resume_len
+
+    def _flush_fragment_journal(self, ctx):
+        if not ctx['dest_stream'].closed:
+            ctx['dest_stream'].flush()
+        ctx['fragment_journal'].flush()
+
+    def _reuse_downloaded_fragment(self, ctx, frag_index):
+        """Use the -Frag file of a fragment that was completely downloaded before resuming"""
+        size = ctx.get('downloaded_fragments', {}).pop(frag_index, None)
+        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], frag_index)
+        if size is None or self.filesize_or_none(fragment_filename) != size:
+            return False
+        ctx['fragment_filename_sanitized'] = fragment_filename
+        return True
+
     def _write_ytdl_file(self, ctx):
         frag_index_stream, _ = self.sanitize_open(self.ytdl_filename(ctx['filename']), 'w')
         try:
@@ -104,18 +621,22 @@ def _write_ytdl_file(self, ctx):
                 downloader['extra_state'] = ctx['extra_state']
             if ctx.get('fragment_count') is not None:
                 downloader['fragment_count'] = ctx['fragment_count']
-            frag_index_stream.write(json.dumps({'downloader': downloader}))
+            frag_index_stream.write(_dump_extra_state({'downloader': downloader}))
         finally:
             frag_index_stream.close()
 
     def _download_fragment(self, ctx, frag_url, info_dict, headers=None, request_data=None):
-        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], ctx['fragment_index'])
         fragment_info_dict = {
             'url': frag_url,
             'http_headers': headers or info_dict.get('http_headers'),
             'request_data': request_data,
             'ctx_id': ctx.get('ctx_id'),
         }
+        buffer_size = self.params.get('fragment_buffer_size')
+        if buffer_size and not self.params.get('keep_fragments', False):
+            return self._download_fragment_to_buffer(ctx, fragment_info_dict, buffer_size)
+
+        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], ctx['fragment_index'])
         frag_resume_len = 0
         if ctx['dl'].params.get('continuedl', True):
             frag_resume_len = self.filesize_or_none(self.temp_name(fragment_filename))
@@ -129,7 +650,35 @@ def _download_fragment(self, ctx, frag_url, info_dict, headers=None, request_dat
         ctx['fragment_filename_sanitized'] = fragment_filename
         return True
 
+    def _download_fragment_to_buffer(self, ctx, fragment_info_dict, buffer_size):
+        # The buffer rolls over to an anonymous temporary file next to the output once it outgrows buffer_size,
+        # or into the temporary directory when the output is a pipe
+        fragment_buffer = tempfile.SpooledTemporaryFile(
+            buffer_size, dir=None if self.is_pipe(ctx['tmpfilename']) else os.path.dirname(os.path.abspath(ctx['tmpfilename'])))
+        if ctx.get('fragment_cipher'):
+            fragment_buffer = _DecryptingBuffer(fragment_buffer, *ctx['fragment_cipher'])
+        fragment_info_dict['frag_resume_len'] = ctx['frag_resume_len'] = 0
+        try:
+            success, _ = ctx['dl'].download(fragment_buffer, fragment_info_dict)
+        except BaseException:
+            fragment_buffer.close()
+            raise
+        if not success:
+            fragment_buffer.close()
+            return False
+        if fragment_info_dict.get('filetime'):
+            ctx['fragment_filetime'] = fragment_info_dict.get('filetime')
+        ctx['fragment_buffer'] = fragment_buffer
+        return True
+
     def _read_fragment(self, ctx):
+        if ctx.get('fragment_buffer'):
+            with ctx.pop('fragment_buffer') as fragment_buffer:
+                if isinstance(fragment_buffer, _DecryptingBuffer):
+                    fragment_buffer.finalize()
+                    ctx['fragment_decrypted'] = True
+                fragment_buffer.seek(0)
+                return fragment_buffer.read()
         if not ctx.get('fragment_filename_sanitized'):
             return None
         try:
@@ -146,16 +695,25 @@ def _read_fragment(self, ctx):
     def _fixup_fragment(self, ctx, frag_bytes):
         return frag_bytes
 
-    def _append_fragment(self, ctx, frag_content):
+    def _append_fragment(self, ctx, frag_content, frag_index=None):
+        # ctx['fragment_index'] counts the finished fragments, which may run ahead of
+        # the appended ones when they are downloaded concurrently
+        if frag_index is None:
+            frag_index = ctx['fragment_index']
+        dest_stream = ctx['dest_stream']
         try:
-            ctx['dest_stream'].write(frag_content)
-            ctx['dest_stream'].flush()
+            dest_stream.write(frag_content)
+            if isinstance(dest_stream, FragmentWriter):
+                dest_stream.reserve(ctx.get('total_bytes_estimate'))
+            else:
+                dest_stream.flush()
+            if self.__do_ytdl_file(ctx) and ctx['fragment_journal'].record_append(
+                    frag_index, dest_stream.tell(), ctx.get('extra_state')):
+                self._flush_fragment_journal(ctx)
         finally:
-            if self.__do_ytdl_file(ctx):
-                self._write_ytdl_file(ctx)
-            if not self.params.get('keep_fragments', False):
-                self.try_remove(ctx['fragment_filename_sanitized'])
-            del ctx['fragment_filename_sanitized']
+            fragment_filename = ctx.pop('fragment_filename_sanitized', None)
+            if fragment_filename and not self.params.get('keep_fragments', False):
+                self.try_remove(fragment_filename)
 
     def _prepare_frag_download(self, ctx):
         if not ctx.setdefault('live', False):
@@ -177,11 +735,15 @@ def _prepare_frag_download(self, ctx):
         })
         tmpfilename = self.temp_name(ctx['filename'])
         open_mode = 'wb'
+        flush_interval = self.params.get('fragment_flush_interval')
+        if flush_interval is None:
+            flush_interval = FragmentJournal.BATCH_INTERVAL
 
         # Establish possible resume length
         resume_len = self.filesize_or_none(tmpfilename)
         if resume_len > 0:
-            open_mode = 'ab'
+            # Not opened for appending, since the output may be preallocated past the written data
+            open_mode = 'r+b'
 
         # Should be initialized before ytdl file check
         ctx.update({
@@ -192,10 +754,14 @@ def _prepare_frag_download(self, ctx):
         if self.__do_ytdl_file(ctx):
             ytdl_file_exists = os.path.isfile(self.ytdl_filename(ctx['filename']))
             continuedl = self.params.get('continuedl', True)
+            journal_mode = 'w'
             if continuedl and ytdl_file_exists:
                 self._read_ytdl_file(ctx)
+                journal_len = None if ctx.get('ytdl_corrupt') else self._read_fragment_journal(ctx)
                 is_corrupt = ctx.get('ytdl_corrupt') is True
-                is_inconsistent = ctx['fragment_index'] > 0 and resume_len == 0
+                is_inconsistent = (
+                    (ctx['fragment_index'] > 0 and resume_len == 0)
+                    or (journal_len is not None and journal_len > resume_len))
                 if is_corrupt or is_inconsistent:
                     message = (
                         '.ytdl file is corrupt' if is_corrupt else
@@ -203,19 +769,41 @@ def _prepare_frag_download(self, ctx):
                     self.report_warning(
                         f'{message}. Restarting from the beginning ...')
                     ctx['fragment_index'] = resume_len = 0
+                    open_mode = 'wb'
+                    ctx.pop('downloaded_fragments', None)
                     if 'ytdl_corrupt' in ctx:
                         del ctx['ytdl_corrupt']
                     self._write_ytdl_file(ctx)
+                else:
+                    journal_mode = 'a'
+                    if journal_len is not None and journal_len < resume_len:
+                        # Discard whatever was appended after the last checkpoint
+                        os.truncate(tmpfilename, journal_len)
+                        resume_len = journal_len
+                        open_mode = 'r+b' if resume_len else 'wb'
 
             else:
                 if not continuedl:
                     if ytdl_file_exists:
                         self._read_ytdl_file(ctx)
                     ctx['fragment_index'] = resume_len = 0
+                    open_mode = 'wb'
                 self._write_ytdl_file(ctx)
                 assert ctx['fragment_index'] == 0
 
+            journal_stream, journal_filename = self.sanitize_open(
+                self.journal_filename(ctx['filename']), journal_mode)
+            ctx['fragment_journal'] = FragmentJournal(
+                journal_stream, flush_interval, journal_filename,
+                ctx.get('journal_checkpoint') if journal_mode == 'a' else None,
+                ctx.get('downloaded_fragments') if journal_mode == 'a' else None)
+
         dest_stream, tmpfilename = self.sanitize_open(tmpfilename, open_mode)
+        if tmpfilename != '-':
+            if resume_len:
+                dest_stream.seek(resume_len)
+            # Preallocated space is only discarded when resuming from the journal
+            dest_stream = FragmentWriter(dest_stream, flush_interval, preallocate=self.__do_ytdl_file(ctx))
 
         ctx.update({
             'dl': dl,
@@ -266,7 +854,7 @@ def frag_progress_hook(s):
                     / (state['fragment_index'] + 1) * total_frags)
                 progress.total = estimated_size
                 progress.update(s.get('downloaded_bytes'))
-                state['total_bytes_estimate'] = progress.total
+                state['total_bytes_estimate'] = ctx['total_bytes_estimate'] = progress.total
             else:
                 progress.update(s.get('downloaded_bytes'))
 
@@ -288,12 +876,17 @@ def frag_progress_hook(s):
     def _finish_frag_download(self, ctx, info_dict):
         ctx['dest_stream'].close()
         if self.__do_ytdl_file(ctx):
+            ctx['fragment_journal'].close()
+            self.try_remove(self.journal_filename(ctx['filename']))
             self.try_remove(self.ytdl_filename(ctx['filename']))
         elapsed = time.time() - ctx['started']
 
-        to_file = ctx['tmpfilename'] != '-'
+        to_file = not self.is_pipe(ctx['tmpfilename'])
         if to_file:
             downloaded_bytes = self.filesize_or_none(ctx['tmpfilename'])
+        elif ctx['tmpfilename'] != '-':
+            # The size of the data that was written into the pipe
+            downloaded_bytes = ctx['dest_stream'].tell()
         else:
             downloaded_bytes = ctx['complete_frags_downloaded_bytes']
 
@@ -341,32 +934,55 @@ def _prepare_external_frag_download(self, ctx):
             'fragment_index': 0,
         })
 
-    def decrypter(self, info_dict):
-        _key_cache = {}
-
-        def _get_key(url):
-            if url not in _key_cache:
-                _key_cache[url] = self.ydl.urlopen(self._prepare_url(info_dict, url)).read()
-            return _key_cache[url]
+    def decrypter(self, info_dict, key_cache=None):
+        if key_cache is None:
+            key_cache = {}
 
         def decrypt_fragment(fragment, frag_content):
             if frag_content is None:
                 return
-            decrypt_info = fragment.get('decrypt_info')
-            if not decrypt_info or decrypt_info['METHOD'] != 'AES-128':
-                return frag_content
-            iv = decrypt_info.get('IV') or struct.pack('>8xq', fragment['media_sequence'])
-            decrypt_info['KEY'] = (decrypt_info.get('KEY')
-                                   or _get_key(traverse_obj(info_dict, ('hls_aes', 'uri')) or decrypt_info['URI']))
+            cipher = self._fragment_cipher(info_dict, fragment, key_cache)
             # Don't decrypt the content in tests since the data is explicitly truncated and it's not to a valid block
             # size (see https://github.com/ytdl-org/youtube-dl/pull/27660). Tests only care that the correct data downloaded,
             # not what it decrypts to.
-            if self.params.get('test', False):
+            if not cipher or self.params.get('test', False):
                 return frag_content
-            return unpad_pkcs7(aes_cbc_decrypt_bytes(frag_content, decrypt_info['KEY'], iv))
+            return unpad_pkcs7(aes_cbc_decrypt_bytes(frag_content, *cipher))
 
         return decrypt_fragment
 
+    def _fragment_cipher(self, info_dict, fragment, key_cache):
+        """
+        Get the key and IV of a fragment encrypted with AES-128, fetching the key if needed
+
+        @param key_cache    dict of the keys that were already fetched, by url
+        @returns            (key, iv), or None if the fragment is not encrypted
+        """
+        decrypt_info = fragment.get('decrypt_info')
+        if not decrypt_info or decrypt_info['METHOD'] != 'AES-128':
+            return None
+        if not decrypt_info.get('KEY'):
+            url = traverse_obj(info_dict, ('hls_aes', 'uri')) or decrypt_info['URI']
+            # The fragments may be downloaded by several threads at once
+            with self._key_lock:
+                if url not in key_cache:
+                    key_cache[url] = self._fetch_key(info_dict, url)
+            decrypt_info['KEY'] = key_cache[url]
+        return decrypt_info['KEY'], decrypt_info.get('IV') or struct.pack('>8xq', fragment['media_sequence'])
+
+    def _persistent_cache(self):
+        return self.ydl.cache if self.params.get('hls_persistent_cache') else None
+
+    def _fetch_key(self, info_dict, url):
+        hls_cache = HlsCache.get_instance()
+        cache_key = HlsCache.make_key('key', url, info_dict.get('http_headers'))
+        key = hls_cache.get(cache_key, self._persistent_cache())
+        if key is None:
+            response = self.ydl.urlopen(self._prepare_url(info_dict, url))
+            key = response.read()
+            hls_cache.put(cache_key, key, self._persistent_cache(), HlsCache.ttl(response.headers))
+        return key
+
     def download_and_append_fragments_multiple(self, *args, **kwargs):
         """
         @params (ctx1, fragments1, info_dict1), (ctx2, fragments2, info_dict2), ...
@@ -376,21 +992,15 @@ def download_and_append_fragments_multiple(self, *args, **kwargs):
         max_progress = len(args)
         if max_progress == 1:
             return self.download_and_append_fragments(*args[0], **kwargs)
-        max_workers = self.params.get('concurrent_fragment_downloads', 1)
         if max_progress > 1:
             self._prepare_multiline_status(max_progress)
         is_live = any(traverse_obj(args, (..., 2, 'is_live')))
 
-        def thread_func(idx, ctx, fragments, info_dict, tpe):
+        def thread_func(idx, ctx, fragments, info_dict):
             ctx['max_progress'] = max_progress
             ctx['progress_idx'] = idx
             return self.download_and_append_fragments(
-                ctx, fragments, info_dict, **kwargs, tpe=tpe, interrupt_trigger=interrupt_trigger)
-
-        class FTPE(concurrent.futures.ThreadPoolExecutor):
-            # has to stop this or it's going to wait on the worker thread itself
-            def __exit__(self, exc_type, exc_val, exc_tb):
-                pass
+                ctx, fragments, info_dict, **kwargs, interrupt_trigger=interrupt_trigger)
 
         if os.name == 'nt':
             def future_result(future):
@@ -411,47 +1021,126 @@ def interrupt_trigger_iter(fg):
                     break
                 yield f
 
-        spins = []
-        for idx, (ctx, fragments, info_dict) in enumerate(args):
-            tpe = FTPE(math.ceil(max_workers / max_progress))
-            job = tpe.submit(thread_func, idx, ctx, interrupt_trigger_iter(fragments), info_dict, tpe)
-            spins.append((tpe, job))
+        # The fragments themselves are downloaded by the shared FragmentScheduler
+        tpe = concurrent.futures.ThreadPoolExecutor(max_progress)
+        jobs = [
+            tpe.submit(thread_func, idx, ctx, interrupt_trigger_iter(fragments), info_dict)
+            for idx, (ctx, fragments, info_dict) in enumerate(args)]
 
         result = True
-        for tpe, job in spins:
-            try:
-                result = result and future_result(job)
-            except KeyboardInterrupt:
-                interrupt_trigger[0] = False
-            finally:
-                tpe.shutdown(wait=True)
+        try:
+            for job in jobs:
+                try:
+                    result = result and future_result(job)
+                except KeyboardInterrupt:
+                    interrupt_trigger[0] = False
+        finally:
+            tpe.shutdown(wait=True)
         if not interrupt_trigger[0] and not is_live:
             raise KeyboardInterrupt
         # we expect the user wants to stop and DO WANT the preceding postprocessors to run;
         # so returning a intermediate result here instead of KeyboardInterrupt on live
         return result
 
+    @staticmethod
+    def _download_fragments_in_window(submit, fragments, window, max_bytes=None, sizeof=None, discard=None):
+        """
+        Download fragments concurrently, yielding (fragment, result) in the original order
+
+        Fragments may complete in any order; they are held back until all the preceding
+        ones have been yielded. No new fragment is submitted while `window` fragments
+        are either downloading or waiting to be yielded, or while the results waiting
+        to be yielded add up to `max_bytes` according to `sizeof(result)`.
+        `discard(result)` is called for the results that are never yielded.
+        No fragment is taken from `fragments` before a LiveReloadWait from it has expired
+        """
+        fragments = iter(fragments)
+        pending, completed = {}, {}
+        submitted = yielded = held_bytes = 0
+        wait = None
+        try:
+            while True:
+                if wait and (wait.interrupted or not wait.remaining()):
+                    wait = None
+                while not wait and submitted - yielded < window and (max_bytes is None or held_bytes < max_bytes):
+                    fragment = next(fragments, NO_DEFAULT)
+                    if fragment is NO_DEFAULT:
+                        break
+                    elif isinstance(fragment, LiveReloadWait):
+                        wait = fragment
+                        break
+                    pending[submit(fragment)] = submitted, fragment
+                    submitted += 1
+                if not pending:
+                    # Every fragment preceding a pending one has been yielded
+                    if not wait:
+                        return
+                    wait.sleep()
+                    continue
+                try:
+                    done, _ = concurrent.futures.wait(
+                        pending, wait and wait.remaining(), return_when=concurrent.futures.FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    if not wait:
+                        raise
+                    wait.interrupted = True
+                    continue
+                for future in done:
+                    position, fragment = pending.pop(future)
+                    completed[position] = fragment, future.result()
+                    if sizeof:
+                        held_bytes += sizeof(completed[position][1])
+                while yielded in completed:
+                    fragment, result = completed.pop(yielded)
+                    if sizeof:
+                        held_bytes -= sizeof(result)
+                    yield fragment, result
+                    yielded += 1
+        finally:
+            for future in pending:
+                if not future.cancel() and discard:
+                    future.add_done_callback(
+                        lambda f: f.exception() is None and discard(f.result()))
+            if discard:
+                for _, result in completed.values():
+                    discard(result)
+
     def download_and_append_fragments(
             self, ctx, fragments, info_dict, *, is_fatal=(lambda idx: False),
             pack_func=(lambda content, idx: content), finish_func=None,
-            tpe=None, interrupt_trigger=(True, )):
+            interrupt_trigger=(True, )):
 
         if not self.params.get('skip_unavailable_fragments', True):
             is_fatal = lambda _: True
 
-        def download_fragment(fragment, ctx):
-            if not interrupt_trigger[0]:
-                return
-
-            frag_index = ctx['fragment_index'] = fragment['frag_index']
-            ctx['last_error'] = None
+        def fragment_headers(fragment):
             headers = HTTPHeaderDict(info_dict.get('http_headers'))
             byte_range = fragment.get('byte_range')
             if byte_range:
                 headers['Range'] = 'bytes=%d-%d' % (byte_range['start'], byte_range['end'] - 1)
+            return headers
 
+        def is_fragment_fatal(fragment):
             # Never skip the first fragment
-            fatal = is_fatal(fragment.get('index') or (frag_index - 1))
+            return is_fatal(fragment.get('index') or (fragment['frag_index'] - 1))
+
+        def download_fragment(fragment, ctx):
+            if not interrupt_trigger[0]:
+                return
+
+            frag_index = ctx['fragment_index'] = fragment['frag_index']
+            ctx['last_error'] = None
+            if self._reuse_downloaded_fragment(ctx, frag_index):
+                return
+            init_segment_key = fragment.get('init_segment') and HlsCache.make_key(
+                'init', fragment['url'], fragment_headers(fragment))
+            if init_segment_key:
+                content = hls_cache.get(init_segment_key, self._persistent_cache())
+                if content is not None:
+                    ctx['fragment_buffer'] = io.BytesIO(content)
+                    return
+            headers = fragment_headers(fragment)
+            fatal = is_fragment_fatal(fragment)
 
             def error_callback(err, count, retries):
                 if fatal and count > retries:
@@ -459,6 +1148,11 @@ def error_callback(err, count, retries):
                 self.report_retry(err, count, retries, frag_index, fatal)
                 ctx['last_error'] = err
 
+            # Fragments downloaded into a buffer are decrypted while they are received,
+            # except init segments, which are cached as they were downloaded
+            ctx['fragment_cipher'] = (
+                stream_decrypt and not init_segment_key and self._fragment_cipher(info_dict, fragment, key_cache))
+
             for retry in RetryManager(self.params.get('fragment_retries'), error_callback):
                 try:
                     ctx['fragment_count'] = fragment.get('fragment_count')
@@ -466,6 +1160,9 @@ def error_callback(err, count, retries):
                             ctx, fragment['url'], info_dict, headers, info_dict.get('request_data')):
                         return
                 except (HTTPError, IncompleteRead) as err:
+                    if isinstance(err, HTTPError):
+                        # Only the error is reported; the response would otherwise be kept open with it
+                        err.close()
                     retry.error = err
                     continue
                 except DownloadError:  # has own retry settings
@@ -474,7 +1171,7 @@ def error_callback(err, count, retries):
 
         def append_fragment(frag_content, frag_index, ctx):
             if frag_content:
-                self._append_fragment(ctx, pack_func(frag_content, frag_index))
+                self._append_fragment(ctx, pack_func(frag_content, frag_index), frag_index)
             elif not is_fatal(frag_index - 1):
                 self.report_skip_fragment(frag_index, 'fragment not found')
             else:
@@ -483,47 +1180,107 @@ def append_fragment(frag_content, frag_index, ctx):
                 return False
             return True
 
-        decrypt_fragment = self.decrypter(info_dict)
+        key_cache = {}
+        hls_cache = HlsCache.get_instance()
+        decrypt_fragment = self.decrypter(info_dict, key_cache)
+        # Fixups work on the encrypted data, so they prevent decrypting while downloading
+        stream_decrypt = (
+            self.params.get('fragment_buffer_size') and not self.params.get('keep_fragments', False)
+            and not self.params.get('test', False) and type(self)._fixup_fragment is FragmentFD._fixup_fragment)
+
+        def read_fragment(fragment, ctx):
+            frag_bytes = self._read_fragment(ctx)
+            if frag_bytes and fragment.get('init_segment'):
+                cache_key = HlsCache.make_key('init', fragment['url'], fragment_headers(fragment))
+                if cache_key not in hls_cache:
+                    hls_cache.put(cache_key, frag_bytes, self._persistent_cache())
+            frag_bytes = self._fixup_fragment(ctx, frag_bytes)
+            if ctx.pop('fragment_decrypted', False):
+                return frag_bytes
+            return decrypt_fragment(fragment, frag_bytes)
 
-        max_workers = math.ceil(
-            self.params.get('concurrent_fragment_downloads', 1) / ctx.get('max_progress', 1))
-        if max_workers > 1:
-            def _download_fragment(fragment):
-                ctx_copy = ctx.copy()
-                download_fragment(fragment, ctx_copy)
-                return fragment, fragment['frag_index'], ctx_copy.get('fragment_filename_sanitized')
-
-            with tpe or concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
-                try:
-                    for fragment, frag_index, frag_filename in pool.map(_download_fragment, fragments):
-                        ctx.update({
-                            'fragment_filename_sanitized': frag_filename,
-                            'fragment_index': frag_index,
-                        })
-                        frag_bytes = self._fixup_fragment(ctx, self._read_fragment(ctx))
-                        if not append_fragment(decrypt_fragment(fragment, frag_bytes), frag_index, ctx):
-                            return False
-                except KeyboardInterrupt:
-                    self._finish_multiline_status()
-                    self.report_error(
-                        'Interrupted by user. Waiting for all threads to shutdown...', is_error=False, tb=False)
-                    pool.shutdown(wait=False)
-                    raise
-        else:
-            for fragment in fragments:
-                if not interrupt_trigger[0]:
-                    break
-                try:
-                    download_fragment(fragment, ctx)
-                    frag_bytes = self._fixup_fragment(ctx, self._read_fragment(ctx))
-                    result = append_fragment(
-                        decrypt_fragment(fragment, frag_bytes), fragment['frag_index'], ctx)
-                except KeyboardInterrupt:
-                    if info_dict.get('is_live'):
+        max_workers = self.params.get('concurrent_fragment_downloads', 1)
+        finished = False
+        try:
+            if max_workers > 1:
+                def _download_fragment(fragment):
+                    ctx_copy = ctx.copy()
+                    download_fragment(fragment, ctx_copy)
+                    frag_filename = ctx_copy.get('fragment_filename_sanitized')
+                    if frag_filename and self.__do_ytdl_file(ctx):
+                        # Allows resuming without downloading this fragment again if it cannot be appended yet
+                        ctx['fragment_journal'].record_download(
+                            fragment['frag_index'], self.filesize_or_none(frag_filename))
+                    return frag_filename, ctx_copy.get('fragment_buffer')
+
+                scheduler = FragmentScheduler.get(max_workers)
+                scheduler_key = object()
+
+                def submit(fragment):
+                    return scheduler.submit(
+                        scheduler_key, urllib.parse.urlparse(fragment['url']).netloc,
+                        max_workers, _download_fragment, fragment,
+                        max_per_host=self.params.get('concurrent_fragments_per_host'))
+
+                def buffered_size(result):
+                    _, frag_buffer = result
+                    if isinstance(frag_buffer, _DecryptingBuffer):
+                        frag_buffer = frag_buffer._buffer
+                    # Fragments that were spilled to disk do not take up memory
+                    if frag_buffer is None or getattr(frag_buffer, '_rolled', False):
+                        return 0
+                    return frag_buffer.seek(0, os.SEEK_END)
+
+                def discard(result):
+                    _, frag_buffer = result
+                    if frag_buffer is not None:
+                        frag_buffer.close()
+
+                window = max(self.params.get('fragment_reorder_window') or 4 * max_workers, max_workers)
+                # Closing the generator cancels the fragments that have not been started yet
+                with contextlib.closing(self._download_fragments_in_window(
+                        submit, fragments, window, self.params.get('fragment_reorder_buffer_size', 64 * 1024 * 1024),
+                        buffered_size, discard)) as results:
+                    try:
+                        for fragment, (frag_filename, frag_buffer) in results:
+                            frag_index = fragment['frag_index']
+                            ctx.update({
+                                'fragment_filename_sanitized': frag_filename,
+                                'fragment_buffer': frag_buffer,
+                                'fragment_index': frag_index,
+                            })
+                            if not append_fragment(read_fragment(fragment, ctx), frag_index, ctx):
+                                return False
+                    except KeyboardInterrupt:
+                        self._finish_multiline_status()
+                        self.report_error(
+                            'Interrupted by user. Waiting for all threads to shutdown...', is_error=False, tb=False)
+                        raise
+            else:
+                for fragment in fragments:
+                    if not interrupt_trigger[0]:
                         break
-                    raise
-                if not result:
-                    return False
+                    if isinstance(fragment, LiveReloadWait):
+                        fragment.sleep()
+                        continue
+                    try:
+                        download_fragment(fragment, ctx)
+                        result = append_fragment(read_fragment(fragment, ctx), fragment['frag_index'], ctx)
+                    except KeyboardInterrupt:
+                        if info_dict.get('is_live'):
+                            break
+                        raise
+                    if not result:
+                        return False
+            finished = True
+        finally:
+            # Also checkpoints the fragments appended before an error or interruption
+            if self.__do_ytdl_file(ctx):
+                self._flush_fragment_journal(ctx)
+                if not finished:
+                    ctx['fragment_journal'].close()
+            if not finished:
+                ctx['dest_stream'].close()
 
         if finish_func is not None:
             ctx['dest_stream'].write(finish_func())
@@ -1,15 +1,18 @@
 import binascii
 import io
 import re
+import time
 import urllib.parse
 
 from . import get_suitable_downloader
 from .external import FFmpegFD
-from .fragment import FragmentFD
+from .fragment import FragmentFD, LiveReloadWait
 from .. import webvtt
 from ..dependencies import Cryptodome
 from ..utils import (
+    FragmentTable,
     bug_reports_message,
+    float_or_none,
     parse_m3u8_attributes,
     remove_start,
     traverse_obj,
@@ -24,10 +27,20 @@ class HlsFD(FragmentFD):
     Download segments in a m3u8 manifest. External downloaders can take over
     the fragment downloads by supporting the 'm3u8_frag_urls' protocol and
     re-defining 'supports_manifest' function
+
+    The keys and initialization segments are cached for all the downloads in
+    the process (see HlsCache), and also in the cache directory with the
+    hls_persistent_cache option
     """
 
     FD_NAME = 'hlsnative'
 
+    # Number of fragments from the end of a live playlist to start recording at (RFC 8216, 6.3.3)
+    _LIVE_EDGE_FRAGMENTS = 3
+    # Number of target durations without new fragments after which a live recording is stopped
+    _LIVE_TIMEOUT = 10
+    _LIVE_DEFAULT_TARGET_DURATION = 6
+
     @staticmethod
     def _has_drm(manifest):  # TODO: https://github.com/yt-dlp/yt-dlp/pull/5039
         return bool(re.search('|'.join((
@@ -64,129 +77,66 @@ def can_download(cls, manifest, info_dict, allow_unplayable_formats=False):
             ]
 
         def check_results():
-            yield not info_dict.get('is_live')
             for feature in UNSUPPORTED_FEATURES:
                 yield not re.search(feature, manifest)
             if not allow_unplayable_formats:
                 yield not cls._has_drm(manifest)
         return all(check_results())
 
-    def real_download(self, filename, info_dict):
-        man_url = info_dict['url']
-
-        s = info_dict.get('hls_media_playlist_data')
-        if s:
-            self.to_screen(f'[{self.FD_NAME}] Using m3u8 manifest from extracted info')
-        else:
-            self.to_screen(f'[{self.FD_NAME}] Downloading m3u8 manifest')
-            urlh = self.ydl.urlopen(self._prepare_url(info_dict, man_url))
-            man_url = urlh.url
-            s_bytes = urlh.read()
-            if self.params.get('write_pages'):
-                dump_filename = _request_dump_filename(
-                    man_url, info_dict['id'], None,
-                    trim_length=self.params.get('trim_file_name'))
-                self.to_screen(f'[{self.FD_NAME}] Saving request to {dump_filename}')
-                with open(dump_filename, 'wb') as outf:
-                    outf.write(s_bytes)
-            s = s_bytes.decode('utf-8', 'ignore')
-
-        can_download, message = self.can_download(s, info_dict, self.params.get('allow_unplayable_formats')), None
-        if can_download:
-            has_ffmpeg = FFmpegFD.available()
-            if not Cryptodome.AES and '#EXT-X-KEY:METHOD=AES-128' in s:
-                # Even if pycryptodomex isn't available, force HlsFD for m3u8s that won't work with ffmpeg
-                ffmpeg_can_dl = not traverse_obj(info_dict, ((
-                    'extra_param_to_segment_url', 'extra_param_to_key_url',
-                    'hls_media_playlist_data', ('hls_aes', ('uri', 'key', 'iv')),
-                ), any))
-                message = 'The stream has AES-128 encryption and {} available'.format(
-                    'neither ffmpeg nor pycryptodomex are' if ffmpeg_can_dl and not has_ffmpeg else
-                    'pycryptodomex is not')
-                if has_ffmpeg and ffmpeg_can_dl:
-                    can_download = False
-                else:
-                    message += '; decryption will be performed natively, but will be extremely slow'
-            elif info_dict.get('extractor_key') == 'Generic' and re.search(r'(?m)#EXT-X-MEDIA-SEQUENCE:(?!0$)', s):
-                install_ffmpeg = '' if has_ffmpeg else 'install ffmpeg and '
-                message = ('Live HLS streams are not supported by the native downloader. If this is a livestream, '
-                           f'please {install_ffmpeg}add "--downloader ffmpeg --hls-use-mpegts" to your command')
-        if not can_download:
-            if self._has_drm(s) and not self.params.get('allow_unplayable_formats'):
-                if info_dict.get('has_drm') and self.params.get('test'):
-                    self.to_screen(f'[{self.FD_NAME}] This format is DRM protected', skip_eol=True)
-                else:
-                    self.report_error(
-                        'This format is DRM protected; Try selecting another format with --format or '
-                        'add --check-formats to automatically fallback to the next best format', tb=False)
-                return False
-            message = message or 'Unsupported features have been detected'
-            fd = FFmpegFD(self.ydl, self.params)
-            self.report_warning(f'{message}; extraction will be delegated to {fd.get_basename()}')
-            return fd.real_download(filename, info_dict)
-        elif message:
-            self.report_warning(message)
-
-        is_webvtt = info_dict['ext'] == 'vtt'
-        if is_webvtt:
-            real_downloader = None  # Packing the fragments is not currently supported for external downloader
-        else:
-            real_downloader = get_suitable_downloader(
-                info_dict, self.params, None, protocol='m3u8_frag_urls', to_stdout=(filename == '-'))
-        if real_downloader and not real_downloader.supports_manifest(s):
-            real_downloader = None
-        if real_downloader:
-            self.to_screen(f'[{self.FD_NAME}] Fragment downloads will be delegated to {real_downloader.get_basename()}')
-
-        def is_ad_fragment_start(s):
-            return ((s.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in s)
-                    or (s.startswith('#UPLYNK-SEGMENT') and s.endswith(',ad')))
-
-        def is_ad_fragment_end(s):
-            return ((s.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in s)
-                    or (s.startswith('#UPLYNK-SEGMENT') and s.endswith(',segment')))
+    @staticmethod
+    def _is_ad_fragment_start(line):
+        return ((line.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in line)
+                or (line.startswith('#UPLYNK-SEGMENT') and line.endswith(',ad')))
 
-        fragments = []
+    @staticmethod
+    def _is_ad_fragment_end(line):
+        return ((line.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in line)
+                or (line.startswith('#UPLYNK-SEGMENT') and line.endswith(',segment')))
 
+    @staticmethod
+    def _is_live(manifest, info_dict):
+        if '#EXT-X-ENDLIST' in manifest or re.search(r'(?m)^#EXT-X-PLAYLIST-TYPE:\s*VOD', manifest):
+            return False
+        # Playlists of the generic extractor are not flagged; one that has already dropped segments is live
+        return bool(info_dict.get('is_live') or (
+            info_dict.get('extractor_key') == 'Generic' and re.search(r'(?m)#EXT-X-MEDIA-SEQUENCE:(?!0$)', manifest)))
+
+    def _count_fragments(self, manifest):
+        """@returns the number of media and ad fragments"""
         media_frags = 0
         ad_frags = 0
         ad_frag_next = False
-        for line in s.splitlines():
+        for line in manifest.splitlines():
             line = line.strip()
             if not line:
                 continue
             if line.startswith('#'):
-                if is_ad_fragment_start(line):
+                if self._is_ad_fragment_start(line):
                     ad_frag_next = True
-                elif is_ad_fragment_end(line):
+                elif self._is_ad_fragment_end(line):
                     ad_frag_next = False
                 continue
             if ad_frag_next:
                 ad_frags += 1
                 continue
             media_frags += 1
+        return media_frags, ad_frags
 
-        ctx = {
-            'filename': filename,
-            'total_frags': media_frags,
-            'ad_frags': ad_frags,
-        }
-
-        if real_downloader:
-            self._prepare_external_frag_download(ctx)
-        else:
-            self._prepare_and_start_frag_download(ctx, info_dict)
-
-        extra_state = ctx.setdefault('extra_state', {})
+    def _parse_fragments(self, manifest, man_url, info_dict, format_index=None):
+        """
+        Get the fragments of a media playlist, without their frag_index
 
-        format_index = info_dict.get('format_index')
+        Ad fragments are skipped, and only the fragments after the discontinuity
+        format_index are returned if it is given. Raises ValueError if the
+        playlist cannot be downloaded
+        """
+        fragments = []
         extra_segment_query = None
         if extra_param_to_segment_url := info_dict.get('extra_param_to_segment_url'):
             extra_segment_query = urllib.parse.parse_qs(extra_param_to_segment_url)
         extra_key_query = None
         if extra_param_to_key_url := info_dict.get('extra_param_to_key_url'):
             extra_key_query = urllib.parse.parse_qs(extra_param_to_key_url)
-        i = 0
         media_sequence = 0
         decrypt_info = {'METHOD': 'NONE'}
         external_aes_key = traverse_obj(info_dict, ('hls_aes', 'key'))
@@ -199,9 +149,8 @@ def is_ad_fragment_end(s):
         byte_range = {}
         byte_range_offset = 0
         discontinuity_count = 0
-        frag_index = 0
         ad_frag_next = False
-        for line in s.splitlines():
+        for line in manifest.splitlines():
             line = line.strip()
             if line:
                 if not line.startswith('#'):
@@ -209,15 +158,11 @@ def is_ad_fragment_end(s):
                         continue
                     if ad_frag_next:
                         continue
-                    frag_index += 1
-                    if frag_index <= ctx['fragment_index']:
-                        continue
                     frag_url = urljoin(man_url, line)
                     if extra_segment_query:
                         frag_url = update_url_query(frag_url, extra_segment_query)
 
                     fragments.append({
-                        'frag_index': frag_index,
                         'url': frag_url,
                         'decrypt_info': decrypt_info,
                         'byte_range': byte_range,
@@ -233,11 +178,8 @@ def is_ad_fragment_end(s):
                 elif line.startswith('#EXT-X-MAP'):
                     if format_index is not None and discontinuity_count != format_index:
                         continue
-                    if frag_index > 0:
-                        self.report_error(
-                            'Initialization fragment found after media fragments, unable to download')
-                        return False
-                    frag_index += 1
+                    if fragments:
+                        raise ValueError('Initialization fragment found after media fragments')
                     map_info = parse_m3u8_attributes(line[11:])
                     frag_url = urljoin(man_url, map_info.get('URI'))
                     if extra_segment_query:
@@ -254,11 +196,12 @@ def is_ad_fragment_end(s):
                         }
 
                     fragments.append({
-                        'frag_index': frag_index,
                         'url': frag_url,
                         'decrypt_info': decrypt_info,
                         'byte_range': map_byte_range,
                         'media_sequence': media_sequence,
+                        # Shared by the formats of the video, so it is cached
+                        'init_segment': True,
                     })
                     media_sequence += 1
 
@@ -290,20 +233,189 @@ def is_ad_fragment_end(s):
                         'start': sub_range_start,
                         'end': sub_range_start + int(splitted_byte_range[0]),
                     }
-                elif is_ad_fragment_start(line):
+                elif self._is_ad_fragment_start(line):
                     ad_frag_next = True
-                elif is_ad_fragment_end(line):
+                elif self._is_ad_fragment_end(line):
                     ad_frag_next = False
                 elif line.startswith('#EXT-X-DISCONTINUITY'):
                     discontinuity_count += 1
-                i += 1
+        return fragments
+
+    def _live_fragments(self, manifest, man_url, info_dict):
+        """
+        Yield the fragments of a live playlist as they are added to it, until it ends
+
+        The playlist is reloaded every target duration, or half of it after a reload
+        that had no new fragments (RFC 8216, 6.3.4). Fragments are told apart by their
+        media sequence number. The recording starts at the beginning of the playlist
+        with live_from_start, and _LIVE_EDGE_FRAGMENTS from its end otherwise.
+        It stops at EXT-X-ENDLIST, when the playlist is gone or has not been updated
+        for _LIVE_TIMEOUT target durations, or on KeyboardInterrupt.
+        A LiveReloadWait is yielded until each reload
+        """
+        frag_index = 0
+        last_sequence = last_init_segment = None
+        last_update = time.monotonic()
+        while True:
+            reloaded = time.monotonic()
+            try:
+                fragments = self._parse_fragments(manifest, man_url, info_dict)
+            except ValueError as e:
+                self.report_warning(f'{e}; stopping the recording')
+                return
+            init_segments = [fragment for fragment in fragments if fragment.get('init_segment')]
+            media = [fragment for fragment in fragments if not fragment.get('init_segment')]
+            if last_sequence is None:
+                new = media if self.params.get('live_from_start') else media[-self._LIVE_EDGE_FRAGMENTS:]
+            elif media and media[-1]['media_sequence'] + len(media) < last_sequence:
+                self.report_warning('The media sequence of the live stream went back; assuming that it was restarted')
+                new = media
+            else:
+                new = [fragment for fragment in media if fragment['media_sequence'] > last_sequence]
+
+            if new:
+                last_update = reloaded
+                last_sequence = new[-1]['media_sequence']
+                # The initialization segment is only needed again when it changes
+                init_segment = init_segments and init_segments[-1]
+                if init_segment and (init_segment['url'], init_segment['byte_range']) != last_init_segment:
+                    last_init_segment = init_segment['url'], init_segment['byte_range']
+                    new.insert(0, init_segment)
+                for fragment in new:
+                    frag_index += 1
+                    fragment['frag_index'] = frag_index
+                    yield fragment
+
+            if re.search(r'(?m)^#EXT-X-ENDLIST', manifest):
+                return
+            mobj = re.search(r'#EXT-X-TARGETDURATION:\s*([\d.]+)', manifest)
+            target_duration = float_or_none(mobj and mobj.group(1)) or self._LIVE_DEFAULT_TARGET_DURATION
+            if time.monotonic() - last_update > self._LIVE_TIMEOUT * target_duration:
+                self.report_warning(
+                    f'The live playlist has not been updated for {self._LIVE_TIMEOUT * target_duration:.0f} '
+                    'seconds; stopping the recording')
+                return
+            # The fragments are still downloaded and appended until the reload
+            wait = LiveReloadWait((target_duration if new else target_duration / 2) - (time.monotonic() - reloaded))
+            yield wait
+            try:
+                playlist = None if wait.interrupted else self._fetch_live_manifest(info_dict, info_dict['url'])
+            except KeyboardInterrupt:
+                wait.interrupted = True
+            if wait.interrupted:
+                self.to_screen(f'[{self.FD_NAME}] Interrupted by user; finishing the recording')
+                return
+            if not playlist:
+                return
+            manifest, man_url = playlist[0].decode('utf-8', 'ignore'), playlist[1]
+
+    def real_download(self, filename, info_dict):
+        man_url = info_dict['url']
+
+        s = info_dict.get('hls_media_playlist_data')
+        if s:
+            self.to_screen(f'[{self.FD_NAME}] Using m3u8 manifest from extracted info')
+        else:
+            self.to_screen(f'[{self.FD_NAME}] Downloading m3u8 manifest')
+            urlh = self.ydl.urlopen(self._prepare_url(info_dict, man_url))
+            man_url = urlh.url
+            s_bytes = urlh.read()
+            if self.params.get('write_pages'):
+                dump_filename = _request_dump_filename(
+                    man_url, info_dict['id'], None,
+                    trim_length=self.params.get('trim_file_name'))
+                self.to_screen(f'[{self.FD_NAME}] Saving request to {dump_filename}')
+                with open(dump_filename, 'wb') as outf:
+                    outf.write(s_bytes)
+            s = s_bytes.decode('utf-8', 'ignore')
+
+        can_download, message = self.can_download(s, info_dict, self.params.get('allow_unplayable_formats')), None
+        if can_download:
+            has_ffmpeg = FFmpegFD.available()
+            if not Cryptodome.AES and '#EXT-X-KEY:METHOD=AES-128' in s:
+                # Even if pycryptodomex isn't available, force HlsFD for m3u8s that won't work with ffmpeg
+                ffmpeg_can_dl = not traverse_obj(info_dict, ((
+                    'extra_param_to_segment_url', 'extra_param_to_key_url',
+                    'hls_media_playlist_data', ('hls_aes', ('uri', 'key', 'iv')),
+                ), any))
+                message = 'The stream has AES-128 encryption and {} available'.format(
+                    'neither ffmpeg nor pycryptodomex are' if ffmpeg_can_dl and not has_ffmpeg else
+                    'pycryptodomex is not')
+                if has_ffmpeg and ffmpeg_can_dl:
+                    can_download = False
+                else:
+                    message += '; decryption will be performed natively, but will be extremely slow'
+        if not can_download:
+            if self._has_drm(s) and not self.params.get('allow_unplayable_formats'):
+                if info_dict.get('has_drm') and self.params.get('test'):
+                    self.to_screen(f'[{self.FD_NAME}] This format is DRM protected', skip_eol=True)
+                else:
+                    self.report_error(
+                        'This format is DRM protected; Try selecting another format with --format or '
+                        'add --check-formats to automatically fallback to the next best format', tb=False)
+                return False
+            message = message or 'Unsupported features have been detected'
+            fd = FFmpegFD(self.ydl, self.params)
+            self.report_warning(f'{message}; extraction will be delegated to {fd.get_basename()}')
+            return fd.real_download(filename, info_dict)
+        elif message:
+            self.report_warning(message)
+
+        is_live = self._is_live(s, info_dict)
+        if is_live:
+            self.to_screen(f'[{self.FD_NAME}] Recording live stream; the playlist will be refreshed until it ends')
+
+        is_webvtt = info_dict['ext'] == 'vtt'
+        if is_webvtt or is_live:
+            # Packing the fragments and refreshing the playlist are not currently supported for external downloader
+            real_downloader = None
+        else:
+            real_downloader = get_suitable_downloader(
+                info_dict, self.params, None, protocol='m3u8_frag_urls', to_stdout=(filename == '-'))
+        if real_downloader and not real_downloader.supports_manifest(s):
+            real_downloader = None
+        if real_downloader:
+            self.to_screen(f'[{self.FD_NAME}] Fragment downloads will be delegated to {real_downloader.get_basename()}')
+
+        if is_live:
+            ctx = {
+                'filename': filename,
+                'total_frags': None,
+                'live': True,
+            }
+        else:
+            media_frags, ad_frags = self._count_fragments(s)
+            ctx = {
+                'filename': filename,
+                'total_frags': media_frags,
+                'ad_frags': ad_frags,
+            }
+
+        if real_downloader:
+            self._prepare_external_frag_download(ctx)
+        else:
+            self._prepare_and_start_frag_download(ctx, info_dict)
+
+        extra_state = ctx.setdefault('extra_state', {})
+
+        if is_live:
+            fragments = self._live_fragments(s, man_url, info_dict)
+        else:
+            try:
+                fragments = self._parse_fragments(s, man_url, info_dict, info_dict.get('format_index'))
+            except ValueError as e:
+                self.report_error(f'{e}, unable to download')
+                return False
+            for frag_index, fragment in enumerate(fragments, 1):
+                fragment['frag_index'] = frag_index
+            fragments = [fragment for fragment in fragments if fragment['frag_index'] > ctx['fragment_index']]
 
         # We only download the first fragment during the test
         if self.params.get('test', False):
-            fragments = [fragments[0] if fragments else None]
+            fragments = [next(iter(fragments), None)]
 
         if real_downloader:
-            info_dict['fragments'] = fragments
+            info_dict['fragments'] = FragmentTable(fragments)
             fd = real_downloader(self.ydl, self.params)
             # TODO: Make progress updates work without hooking twice
             # for ph in self._progress_hooks:
@@ -311,6 +423,13 @@ def is_ad_fragment_end(s):
             return fd.real_download(filename, info_dict)
 
         if is_webvtt:
+            def dedup_window():
+                # It is only serialized at checkpoints, and restored as JSON when resuming
+                window = extra_state.get('webvtt_dedup_window')
+                if not isinstance(window, webvtt.CueDedupWindow):
+                    window = extra_state['webvtt_dedup_window'] = webvtt.CueDedupWindow.from_json(window or [])
+                return window
+
             def pack_fragment(frag_content, frag_index):
                 output = io.StringIO()
                 adjust = 0
@@ -325,35 +444,9 @@ def pack_fragment(frag_content, frag_index):
                         block.start += adjust
                         block.end += adjust
 
-                        dedup_window = extra_state.setdefault('webvtt_dedup_window', [])
-
-                        ready = []
-
-                        i = 0
-                        is_new = True
-                        while i < len(dedup_window):
-                            wcue = dedup_window[i]
-                            wblock = webvtt.CueBlock.from_json(wcue)
-                            i += 1
-                            if wblock.hinges(block):
-                                wcue['end'] = block.end
-                                is_new = False
-                                continue
-                            if wblock == block:
-                                is_new = False
-                                continue
-                            if wblock.end > block.start:
-                                continue
-                            ready.append(wblock)
-                            i -= 1
-                            del dedup_window[i]
-
-                        if is_new:
-                            dedup_window.append(block.as_json)
-                        for block in ready:
-                            block.write_into(output)
-
                         # we only emit cues once they fall out of the duplicate window
+                        for cue in dedup_window().add(block):
+                            cue.write_into(output)
                         continue
                     elif isinstance(block, webvtt.Magic):
                         # take care of MPEG PES timestamp overflow
@@ -390,20 +483,19 @@ def pack_fragment(frag_content, frag_index):
                 return output.getvalue().encode()
 
             def fin_fragments():
-                dedup_window = extra_state.get('webvtt_dedup_window')
-                if not dedup_window:
+                if not dedup_window():
                     return b''
 
                 output = io.StringIO()
-                for cue in dedup_window:
-                    webvtt.CueBlock.from_json(cue).write_into(output)
+                for cue in dedup_window():
+                    cue.write_into(output)
 
                 return output.getvalue().encode()
 
-            if len(fragments) == 1:
-                self.download_and_append_fragments(ctx, fragments, info_dict)
+            if not is_live and len(fragments) == 1:
+                return self.download_and_append_fragments(ctx, fragments, info_dict)
             else:
-                self.download_and_append_fragments(
+                return self.download_and_append_fragments(
                     ctx, fragments, info_dict, pack_func=pack_fragment, finish_func=fin_fragments)
         else:
             return self.download_and_append_fragments(ctx, fragments, info_dict)
@@ -0,0 +1,116 @@
+import base64
+import collections
+import hashlib
+import json
+import re
+import threading
+import time
+
+
+class HlsCache:
+    """
+    Cache of HLS keys and initialization segments shared by all the downloads in the process
+
+    Entries are keyed by the url and the request headers, so that the different
+    formats of a video, and downloads restarted in the same process, do not fetch
+    them again. They expire after the max-age of the response (TTL seconds by
+    default) and the least recently used ones are evicted once the cache holds
+    more than MAX_SIZE bytes. Entries up to MAX_PERSISTED_SIZE bytes are also
+    stored in the yt-dlp cache if one is given to `get` and `put`
+    """
+
+    TTL = 3600
+    MAX_SIZE = 32 * 1024 * 1024
+    MAX_PERSISTED_SIZE = 1024 * 1024
+    _CACHE_SECTION = 'hls'
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expiry time, data), least recently used first
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def make_key(kind, url, headers=None):
+        """@param kind  'key' or 'init'"""
+        headers = sorted((name.title(), value) for name, value in (headers or {}).items())
+        digest = hashlib.sha256(json.dumps([url, headers]).encode()).hexdigest()
+        return f'{kind}-{digest}'
+
+    @classmethod
+    def ttl(cls, headers):
+        """@returns how long a response with these headers may be cached, in seconds"""
+        cache_control = (headers.get('Cache-Control') or '').lower()
+        if re.search(r'\bno-(?:store|cache)\b', cache_control):
+            return 0
+        mobj = re.search(r'\bmax-age\s*=\s*"?(\d+)', cache_control)
+        return int(mobj.group(1)) if mobj else cls.TTL
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry) and entry[0] > time.time()
+
+    def get(self, key, cache=None):
+        """@returns the cached data, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+            elif entry:
+                self._remove(key)
+        if cache is None:
+            return None
+        stored = cache.load(self._CACHE_SECTION, key)
+        try:
+            expires, data = stored['expires'], base64.b64decode(stored['data'])
+        except (TypeError, KeyError, ValueError):
+            return None
+        if expires <= now:
+            return None
+        with self._lock:
+            self._add(key, expires, data)
+        return data
+
+    def put(self, key, data, cache=None, ttl=None):
+        if ttl is None:
+            ttl = self.TTL
+        if ttl <= 0 or len(data) > self.MAX_SIZE:
+            return
+        expires = time.time() + ttl
+        with self._lock:
+            self._add(key, expires, data)
+        if cache is not None and len(data) <= self.MAX_PERSISTED_SIZE:
+            cache.store(self._CACHE_SECTION, key, {
+                'expires': expires,
+                'data': base64.b64encode(data).decode(),
+            })
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _add(self, key, expires, data):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = expires, data
+        self._size += len(data)
+        while self._size > self.MAX_SIZE:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, data = self._entries.pop(key)
+        self._size -= len(data)
@@ -1,5 +1,9 @@
+import concurrent.futures
+import itertools
+import json
 import os
 import random
+import threading
 import time
 
 from .common import FileDownloader
@@ -15,12 +19,29 @@
     ThrottledDownload,
     int_or_none,
     parse_http_range,
+    timeconvert,
+    traverse_obj,
     try_call,
+    write_json_file,
 )
 from ..utils.networking import HTTPHeaderDict
 
 
 class HttpFD(FileDownloader):
+    """
+    Available options:
+
+    http_connections:   Download the file over this many connections at once,
+                        each fetching a range of the file, if the server
+                        supports range requests. The progress of each range is
+                        kept in the .ytdl file to resume the download
+    """
+
+    # Files are not split into ranges smaller than this
+    _MIN_SEGMENT_SIZE = 1024 * 1024
+    # Interval in seconds between progress reports and saves of the range state
+    _SEGMENT_STATE_INTERVAL = 1
+
     def real_download(self, filename, info_dict):
         url = info_dict['url']
         request_data = info_dict.get('request_data', None)
@@ -36,7 +57,10 @@ class DownloadContext(dict):
 
         ctx = DownloadContext()
         ctx.filename = filename
-        ctx.tmpfilename = self.temp_name(filename)
+        # A file-like object can be given instead of a filename to download into memory
+        ctx.to_buffer = hasattr(filename, 'write')
+        ctx.tmpfilename = filename if ctx.to_buffer else self.temp_name(filename)
+        ctx.to_pipe = not ctx.to_buffer and self.is_pipe(ctx.tmpfilename)
         ctx.stream = None
 
         # Disable compression
@@ -56,11 +80,22 @@ class DownloadContext(dict):
         # parse given Range
         req_start, req_end, _ = parse_http_range(headers.get('Range'))
 
-        if self.params.get('continuedl', True):
+        if self.params.get('continuedl', True) and not ctx.to_buffer:
             # Establish possible resume length
             if os.path.isfile(ctx.tmpfilename):
                 ctx.resume_len = os.path.getsize(ctx.tmpfilename)
 
+        connections = self.params.get('http_connections') or 1
+        if (connections > 1 and not is_test and not ctx.to_buffer and not ctx.to_pipe
+                and req_start is None and req_end is None):
+            result = self._download_segmented(
+                filename, info_dict, Request(url, request_data, headers, extensions=request_extensions),
+                connections, chunk_size)
+            if result is not None:
+                return result
+
+        if ctx.resume_len:
+            ctx.resume_len = self._resume_segments_in_order(filename, ctx.tmpfilename, ctx.resume_len)
         ctx.is_resume = ctx.resume_len > 0
 
         class SucceedDownload(Exception):
@@ -193,11 +228,15 @@ def establish_connection():
 
         def close_stream():
             if ctx.stream is not None:
-                if ctx.tmpfilename != '-':
+                if ctx.tmpfilename != '-' and not ctx.to_buffer:
                     ctx.stream.close()
                 ctx.stream = None
 
         def download():
+            if ctx.to_pipe and ctx.stream is not None and ctx.open_mode == 'wb':
+                self.report_error('Unable to resume, and the data that was written into the pipe cannot be rewritten')
+                return False
+
             data_len = ctx.data.headers.get('Content-length')
 
             if ctx.data.headers.get('Content-encoding'):
@@ -233,10 +272,14 @@ def download():
             # measure time over whole while-loop, so slow_down() and best_block_size() work together properly
             now = None  # needed for slow_down() in the first loop run
             before = start  # start measuring
+            # Blocks are read into a reused buffer instead of allocating a bytes object for each of them
+            buffer = memoryview(bytearray(block_size))
 
             def retry(e):
-                close_stream()
-                if ctx.tmpfilename == '-':
+                if not ctx.to_pipe:
+                    # A pipe is kept open, since its reader would take closing it as the end of the data
+                    close_stream()
+                if ctx.to_pipe or ctx.to_buffer:
                     ctx.resume_len = byte_counter
                 else:
                     try:
@@ -246,9 +289,12 @@ def retry(e):
                 raise RetryDownload(e)
 
             while True:
+                read_size = block_size if not is_test else min(block_size, data_len - byte_counter)
+                if read_size > len(buffer):
+                    buffer = memoryview(bytearray(read_size))
                 try:
                     # Download and write
-                    data_block = ctx.data.read(block_size if not is_test else min(block_size, data_len - byte_counter))
+                    data_block = buffer[:ctx.data.readinto(buffer[:read_size])]
                 except TransportError as err:
                     retry(err)
 
@@ -259,7 +305,12 @@ def retry(e):
                     break
 
                 # Open destination file just in time
-                if ctx.stream is None:
+                if ctx.stream is None and ctx.to_buffer:
+                    ctx.stream = ctx.tmpfilename
+                    if ctx.open_mode == 'wb':
+                        ctx.stream.seek(0)
+                        ctx.stream.truncate()
+                elif ctx.stream is None:
                     try:
                         ctx.stream, ctx.tmpfilename = self.sanitize_open(
                             ctx.tmpfilename, ctx.open_mode)
@@ -318,8 +369,7 @@ def retry(e):
                     if ctx.throttle_start is None:
                         ctx.throttle_start = now
                     elif now - ctx.throttle_start > 3:
-                        if ctx.stream is not None and ctx.tmpfilename != '-':
-                            ctx.stream.close()
+                        close_stream()
                         raise ThrottledDownload
                 elif speed:
                     ctx.throttle_start = None
@@ -333,18 +383,22 @@ def retry(e):
                 ctx.resume_len = byte_counter
                 raise NextFragment
 
-            if ctx.tmpfilename != '-':
-                ctx.stream.close()
-
             if data_len is not None and byte_counter != data_len:
                 err = ContentTooShortError(byte_counter, int(data_len))
                 retry(err)
 
-            self.try_rename(ctx.tmpfilename, ctx.filename)
+            if ctx.tmpfilename != '-' and not ctx.to_buffer:
+                ctx.stream.close()
+
+            if ctx.to_buffer:
+                if self.params.get('updatetime'):
+                    info_dict['filetime'] = timeconvert(ctx.data.headers.get('last-modified'))
+            else:
+                self.try_rename(ctx.tmpfilename, ctx.filename)
 
-            # Update file modification time
-            if self.params.get('updatetime'):
-                info_dict['filetime'] = self.try_utime(ctx.filename, ctx.data.headers.get('last-modified', None))
+                # Update file modification time
+                if self.params.get('updatetime'):
+                    info_dict['filetime'] = self.try_utime(ctx.filename, ctx.data.headers.get('last-modified', None))
 
             self._hook_progress({
                 'downloaded_bytes': byte_counter,
@@ -374,3 +428,210 @@ def retry(e):
                 close_stream()
                 raise
         return False
+
+    def _read_segments_state(self, state_filename, total):
+        try:
+            with open(state_filename, encoding='utf-8') as f:
+                state = traverse_obj(json.load(f), ('downloader', 'http_segments', {dict}))
+        except (OSError, ValueError):
+            return None
+        segments = traverse_obj(state, ('ranges', {list}))
+        if not segments or state.get('size') != total or not all(
+                isinstance(segment, list) and len(segment) == 2
+                and all(isinstance(x, int) for x in segment) for segment in segments):
+            return None
+        return segments
+
+    def _resume_segments_in_order(self, filename, tmpfilename, size):
+        """
+        Get the length of a partial file that can be resumed over a single connection
+
+        A file left by a segmented download has its full size, but is only complete
+        up to the first range that has not been downloaded. It is truncated there,
+        and its range state is removed
+        """
+        state_filename = self.ytdl_filename(filename)
+        segments = self._read_segments_state(state_filename, size)
+        if segments is None:
+            return size
+        resume_len = min((start for start, end in segments if start <= end), default=size)
+        try:
+            if resume_len < size:
+                os.truncate(tmpfilename, resume_len)
+        except OSError:
+            resume_len = 0
+        self.try_remove(state_filename)
+        return resume_len
+
+    def _download_segmented(self, filename, info_dict, request, connections, chunk_size):
+        """
+        Download the file into place over several connections, each fetching a range of it
+
+        Returns None if the server does not support range requests or the file is
+        too small to be split, and the download should be done over one connection
+        """
+        probe = request.copy()
+        probe.headers['Range'] = 'bytes=0-0'
+        try:
+            response = self.ydl.urlopen(probe)
+        except (HTTPError, TransportError):
+            return None
+        with response:
+            _, _, total = parse_http_range(response.headers.get('Content-Range'))
+            if response.headers.get('Content-Encoding'):
+                total = None
+            last_modified = response.headers.get('Last-Modified')
+        if not total:
+            return None
+
+        min_data_len = self.params.get('min_filesize')
+        max_data_len = self.params.get('max_filesize')
+        if min_data_len is not None and total < min_data_len:
+            self.to_screen(
+                f'\r[download] File is smaller than min-filesize ({total} bytes < {min_data_len} bytes). Aborting.')
+            return False
+        if max_data_len is not None and total > max_data_len:
+            self.to_screen(
+                f'\r[download] File is larger than max-filesize ({total} bytes > {max_data_len} bytes). Aborting.')
+            return False
+
+        tmpfilename = self.temp_name(filename)
+        state_filename = self.ytdl_filename(filename)
+        segments = None
+        if os.path.isfile(tmpfilename):
+            # A partial file without range state is resumed over a single connection
+            if not self.params.get('continuedl', True) or os.path.getsize(tmpfilename) != total:
+                return None
+            segments = self._read_segments_state(state_filename, total)
+            if segments is None:
+                return None
+        if segments is None:
+            count = min(connections, total // self._MIN_SEGMENT_SIZE)
+            if count < 2:
+                return None
+            bounds = [total * i // count for i in range(count + 1)]
+            # Each range is [position of the next byte to download, last byte]
+            segments = [[start, end - 1] for start, end in itertools.pairwise(bounds)]
+
+        lock = threading.Lock()
+
+        def save_state():
+            with lock:
+                state = [segment.copy() for segment in segments]
+            write_json_file({'downloader': {'http_segments': {'size': total, 'ranges': state}}}, state_filename)
+
+        try:
+            # The state is written first, so that the preallocated file is never taken as complete
+            save_state()
+            stream, tmpfilename = self.sanitize_open(tmpfilename, 'r+b' if os.path.isfile(tmpfilename) else 'wb')
+            stream.truncate(total)
+        except OSError as err:
+            self.report_error(f'unable to open for writing: {err}')
+            return False
+        filename = self.undo_temp_name(tmpfilename)
+        self.report_destination(filename)
+
+        remaining = sum(end - start + 1 for start, end in segments if start <= end)
+        resume_len = downloaded = total - remaining
+        if resume_len:
+            self.report_resuming_byte(resume_len)
+        stop = threading.Event()
+        start_time = time.time()
+
+        def write(data, position):
+            if hasattr(os, 'pwrite'):
+                os.pwrite(stream.fileno(), data, position)
+                return
+            with lock:
+                stream.seek(position)
+                stream.write(data)
+
+        def download_segment(segment):
+            nonlocal downloaded
+            block_size = self.params.get('buffersize', 1024)
+            buffer = memoryview(bytearray(block_size))
+            for retry in RetryManager(self.params.get('retries'), self.report_retry):
+                try:
+                    while segment[0] <= segment[1] and not stop.is_set():
+                        end = segment[1] if not chunk_size else min(segment[1], segment[0] + chunk_size - 1)
+                        range_request = request.copy()
+                        range_request.headers['Range'] = f'bytes={segment[0]}-{end}'
+                        with self.ydl.urlopen(range_request) as data:
+                            if parse_http_range(data.headers.get('Content-Range'))[0] != segment[0]:
+                                self.report_error(f'The server did not return the requested range {segment[0]}-{end}')
+                                return False
+                            while segment[0] <= end and not stop.is_set():
+                                before = time.time()
+                                read_size = min(block_size, end - segment[0] + 1)
+                                if read_size > len(buffer):
+                                    buffer = memoryview(bytearray(read_size))
+                                data_block = buffer[:data.readinto(buffer[:read_size])]
+                                if not data_block:
+                                    raise ContentTooShortError(segment[0], end + 1)
+                                write(data_block, segment[0])
+                                with lock:
+                                    segment[0] += len(data_block)
+                                    downloaded += len(data_block)
+                                now = time.time()
+                                self.slow_down(start_time, now, downloaded - resume_len)
+                                if not self.params.get('noresizebuffer', False):
+                                    block_size = self.best_block_size(now - before, len(data_block))
+                except HTTPError as err:
+                    if err.status < 500 or err.status >= 600:
+                        raise
+                    retry.error = err
+                except (TransportError, ContentTooShortError) as err:
+                    if isinstance(err, CertificateVerifyError):
+                        raise
+                    retry.error = err
+            return segment[0] > segment[1]
+
+        def report_progress(status='downloading'):
+            now = time.time()
+            speed = self.calc_speed(start_time, now, downloaded - resume_len)
+            self._hook_progress({
+                'status': status,
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'tmpfilename': tmpfilename,
+                'filename': filename,
+                'eta': self.calc_eta(start_time, now, total - resume_len, downloaded - resume_len),
+                'speed': speed,
+                'elapsed': now - start_time,
+                'ctx_id': info_dict.get('ctx_id'),
+            }, info_dict)
+
+        pending = [segment for segment in segments if segment[0] <= segment[1]]
+        try:
+            with concurrent.futures.ThreadPoolExecutor(len(pending) or 1) as pool:
+                futures = [pool.submit(download_segment, segment) for segment in pending]
+                try:
+                    while True:
+                        done, not_done = concurrent.futures.wait(
+                            futures, self._SEGMENT_STATE_INTERVAL, concurrent.futures.FIRST_EXCEPTION)
+                        save_state()
+                        if not not_done or any(future.exception() for future in done):
+                            break
+                        report_progress()
+                finally:
+                    stop.set()
+                    save_state()
+                results = [future.result() for future in futures]
+        finally:
+            stream.close()
+        if not all(results):
+            return False
+
+        self.try_remove(state_filename)
+        self.try_rename(tmpfilename, filename)
+        if self.params.get('updatetime'):
+            info_dict['filetime'] = self.try_utime(filename, last_modified)
+        self._hook_progress({
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - start_time,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+        return True
@@ -2,7 +2,8 @@
 import time
 
 from .fragment import FragmentFD
-from ..networking.exceptions import HTTPError
+from ..networking import Request
+from ..networking.exceptions import HTTPError, TransportError
 from ..utils import (
     RegexNotFoundError,
     RetryManager,
@@ -14,7 +15,15 @@
 
 
 class YoutubeLiveChatFD(FragmentFD):
-    """ Downloads YouTube live chats fragment by fragment """
+    """
+    Downloads YouTube live chats continuation by continuation
+
+    The actions of each continuation are written to the output as they are received,
+    without going through fragment files. The continuation to request next is
+    checkpointed in the .ytdl journal with the output, so that an interrupted download
+    resumes exactly where it stopped. The live chat is polled as often as the
+    server asks for in the timeoutMs of the continuations
+    """
 
     def real_download(self, filename, info_dict):
         video_id = info_dict['video_id']
@@ -28,6 +37,8 @@ def real_download(self, filename, info_dict):
         ctx = {
             'filename': filename,
             'live': True,
+            # The continuation is checkpointed as the extra_state
+            'resumable': True,
             'total_frags': None,
         }
 
@@ -35,21 +46,39 @@ def real_download(self, filename, info_dict):
 
         ie = YoutubeBaseInfoExtractor(self.ydl)
 
-        start_time = int(time.time() * 1000)
+        received_bytes = 0
 
-        def dl_fragment(url, data=None, headers=None):
-            http_headers = HTTPHeaderDict(info_dict.get('http_headers'), headers)
-            return self._download_fragment(ctx, url, info_dict, http_headers, data)
+        def fetch(url, data=None, headers=None):
+            """@returns the response body, or None if the retries are exhausted"""
+            nonlocal received_bytes
+            request = Request(url, data, HTTPHeaderDict(info_dict.get('http_headers'), headers))
+            for retry in RetryManager(
+                    self.params.get('fragment_retries'), self.report_retry, frag_index=ctx['fragment_index'] + 1):
+                try:
+                    content = self.ydl.urlopen(request).read()
+                except (HTTPError, TransportError) as err:
+                    retry.error = err
+                    continue
+                # The continuations are reported as the progress of one growing download
+                received_bytes += len(content)
+                ctx['dl']._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': received_bytes,
+                    'filename': None,
+                    'ctx_id': ctx.get('ctx_id'),
+                }, {'url': url, 'ctx_id': ctx.get('ctx_id')})
+                ctx['fragment_index'] += 1
+                return content
+            return None
 
         def parse_actions_replay(live_chat_continuation):
             offset = continuation_id = click_tracking_params = None
-            processed_fragment = bytearray()
+            processed = []
             for action in live_chat_continuation.get('actions', []):
                 if 'replayChatItemAction' in action:
                     replay_chat_item_action = action['replayChatItemAction']
                     offset = int(replay_chat_item_action['videoOffsetTimeMsec'])
-                processed_fragment.extend(
-                    json.dumps(action, ensure_ascii=False).encode() + b'\n')
+                processed.append(json.dumps(action, ensure_ascii=False))
             if offset is not None:
                 continuation = try_get(
                     live_chat_continuation,
@@ -57,8 +86,7 @@ def parse_actions_replay(live_chat_continuation):
                 if continuation:
                     continuation_id = continuation.get('continuation')
                     click_tracking_params = continuation.get('clickTrackingParams')
-            self._append_fragment(ctx, processed_fragment)
-            return continuation_id, offset, click_tracking_params
+            return processed, continuation_id, offset, click_tracking_params, None
 
         def try_refresh_replay_beginning(live_chat_continuation):
             # choose the second option that contains the unfiltered live chat replay
@@ -66,20 +94,15 @@ def try_refresh_replay_beginning(live_chat_continuation):
                 live_chat_continuation,
                 lambda x: x['header']['liveChatHeaderRenderer']['viewSelector']['sortFilterSubMenuRenderer']['subMenuItems'][1]['continuation']['reloadContinuationData'], dict)
             if refresh_continuation:
-                # no data yet but required to call _append_fragment
-                self._append_fragment(ctx, b'')
-                refresh_continuation_id = refresh_continuation.get('continuation')
-                offset = 0
-                click_tracking_params = refresh_continuation.get('trackingParams')
-                return refresh_continuation_id, offset, click_tracking_params
+                return [], refresh_continuation.get('continuation'), 0, refresh_continuation.get('trackingParams'), None
             return parse_actions_replay(live_chat_continuation)
 
-        live_offset = 0
+        start_time = live_offset = None
 
         def parse_actions_live(live_chat_continuation):
             nonlocal live_offset
-            continuation_id = click_tracking_params = None
-            processed_fragment = bytearray()
+            continuation_id = click_tracking_params = timeout_ms = None
+            processed = []
             for action in live_chat_continuation.get('actions', []):
                 timestamp = self.parse_live_timestamp(action)
                 if timestamp is not None:
@@ -90,8 +113,7 @@ def parse_actions_live(live_chat_continuation):
                     'videoOffsetTimeMsec': str(live_offset),
                     'isLive': True,
                 }
-                processed_fragment.extend(
-                    json.dumps(pseudo_action, ensure_ascii=False).encode() + b'\n')
+                processed.append(json.dumps(pseudo_action, ensure_ascii=False))
             continuation_data_getters = [
                 lambda x: x['continuations'][0]['invalidationContinuationData'],
                 lambda x: x['continuations'][0]['timedContinuationData'],
@@ -101,93 +123,107 @@ def parse_actions_live(live_chat_continuation):
                 continuation_id = continuation_data.get('continuation')
                 click_tracking_params = continuation_data.get('clickTrackingParams')
                 timeout_ms = int_or_none(continuation_data.get('timeoutMs'))
-                if timeout_ms is not None:
-                    time.sleep(timeout_ms / 1000)
-            self._append_fragment(ctx, processed_fragment)
-            return continuation_id, live_offset, click_tracking_params
-
-        def download_and_parse_fragment(url, frag_index, request_data=None, headers=None):
-            for retry in RetryManager(self.params.get('fragment_retries'), self.report_retry, frag_index=frag_index):
-                try:
-                    success = dl_fragment(url, request_data, headers)
-                    if not success:
-                        return False, None, None, None
-                    raw_fragment = self._read_fragment(ctx)
-                    try:
-                        data = ie.extract_yt_initial_data(video_id, raw_fragment.decode('utf-8', 'replace'))
-                    except RegexNotFoundError:
-                        data = None
-                    if not data:
-                        data = json.loads(raw_fragment)
-                    live_chat_continuation = try_get(
-                        data,
-                        lambda x: x['continuationContents']['liveChatContinuation'], dict) or {}
-
-                    func = ((info_dict['protocol'] == 'youtube_live_chat' and parse_actions_live)
-                            or (frag_index == 1 and try_refresh_replay_beginning)
-                            or parse_actions_replay)
-                    return (True, *func(live_chat_continuation))
-                except HTTPError as err:
-                    retry.error = err
-                    continue
-            return False, None, None, None
+            return processed, continuation_id, live_offset, click_tracking_params, timeout_ms
 
         self._prepare_and_start_frag_download(ctx, info_dict)
+        # The journal may have restored the state of an interrupted download
+        state = ctx.get('extra_state') or {}
+        # Offsets of the live chat are relative to the start of the first download
+        start_time = state.get('start_time') or int(time.time() * 1000)
+        live_offset = state.get('offset') or 0
 
-        success = dl_fragment(info_dict['url'])
-        if not success:
-            return False
-        raw_fragment = self._read_fragment(ctx)
+        finished = False
         try:
-            data = ie.extract_yt_initial_data(video_id, raw_fragment.decode('utf-8', 'replace'))
-        except RegexNotFoundError:
-            return False
-        continuation_id = try_get(
-            data,
-            lambda x: x['contents']['twoColumnWatchNextResults']['conversationBar']['liveChatRenderer']['continuations'][0]['reloadContinuationData']['continuation'])
-        # no data yet but required to call _append_fragment
-        self._append_fragment(ctx, b'')
-
-        ytcfg = ie.extract_ytcfg(video_id, raw_fragment.decode('utf-8', 'replace'))
-
-        if not ytcfg:
-            return False
-        api_key = try_get(ytcfg, lambda x: x['INNERTUBE_API_KEY'])
-        innertube_context = try_get(ytcfg, lambda x: x['INNERTUBE_CONTEXT'])
-        if not api_key or not innertube_context:
-            return False
-        visitor_data = try_get(innertube_context, lambda x: x['client']['visitorData'], str)
-        if info_dict['protocol'] == 'youtube_live_chat_replay':
-            url = 'https://www.youtube.com/youtubei/v1/live_chat/get_live_chat_replay?key=' + api_key
-            chat_page_url = 'https://www.youtube.com/live_chat_replay?continuation=' + continuation_id
-        elif info_dict['protocol'] == 'youtube_live_chat':
-            url = 'https://www.youtube.com/youtubei/v1/live_chat/get_live_chat?key=' + api_key
-            chat_page_url = 'https://www.youtube.com/live_chat?continuation=' + continuation_id
-
-        frag_index = offset = 0
-        click_tracking_params = None
-        while continuation_id is not None:
-            frag_index += 1
-            request_data = {
-                'context': innertube_context,
-                'continuation': continuation_id,
-            }
-            if frag_index > 1:
-                request_data['currentPlayerState'] = {'playerOffsetMs': str(max(offset - 5000, 0))}
-                if click_tracking_params:
-                    request_data['context']['clickTracking'] = {'clickTrackingParams': click_tracking_params}
-                headers = ie.generate_api_headers(ytcfg=ytcfg, visitor_data=visitor_data)
-                headers.update({'content-type': 'application/json'})
-                fragment_request_data = json.dumps(request_data, ensure_ascii=False).encode() + b'\n'
-                success, continuation_id, offset, click_tracking_params = download_and_parse_fragment(
-                    url, frag_index, fragment_request_data, headers)
-            else:
-                success, continuation_id, offset, click_tracking_params = download_and_parse_fragment(
-                    chat_page_url, frag_index)
-            if not success:
+            raw_page = fetch(info_dict['url'])
+            if raw_page is None:
+                return False
+            raw_page = raw_page.decode('utf-8', 'replace')
+            try:
+                data = ie.extract_yt_initial_data(video_id, raw_page)
+            except RegexNotFoundError:
                 return False
-            if test:
-                break
+            continuation_id = try_get(
+                data,
+                lambda x: x['contents']['twoColumnWatchNextResults']['conversationBar']['liveChatRenderer']['continuations'][0]['reloadContinuationData']['continuation'])
+
+            ytcfg = ie.extract_ytcfg(video_id, raw_page)
+
+            if not ytcfg:
+                return False
+            api_key = try_get(ytcfg, lambda x: x['INNERTUBE_API_KEY'])
+            innertube_context = try_get(ytcfg, lambda x: x['INNERTUBE_CONTEXT'])
+            if not api_key or not innertube_context:
+                return False
+            visitor_data = try_get(innertube_context, lambda x: x['client']['visitorData'], str)
+            if info_dict['protocol'] == 'youtube_live_chat_replay':
+                url = 'https://www.youtube.com/youtubei/v1/live_chat/get_live_chat_replay?key=' + api_key
+                chat_page_url = 'https://www.youtube.com/live_chat_replay?continuation=' + continuation_id
+                parse_actions = parse_actions_replay
+            elif info_dict['protocol'] == 'youtube_live_chat':
+                url = 'https://www.youtube.com/youtubei/v1/live_chat/get_live_chat?key=' + api_key
+                chat_page_url = 'https://www.youtube.com/live_chat?continuation=' + continuation_id
+                parse_actions = parse_actions_live
+
+            is_first = 'continuation' not in state
+            if not is_first:
+                self.to_screen(f'[{self.FD_NAME}] Resuming the live chat download')
+                continuation_id = state['continuation']
+            offset = state.get('offset') or 0
+            click_tracking_params = state.get('click_tracking_params')
+
+            while continuation_id is not None:
+                requested = time.monotonic()
+                if is_first:
+                    raw_fragment = fetch(chat_page_url)
+                else:
+                    request_data = {
+                        'context': innertube_context,
+                        'continuation': continuation_id,
+                        'currentPlayerState': {'playerOffsetMs': str(max(offset - 5000, 0))},
+                    }
+                    if click_tracking_params:
+                        request_data['context']['clickTracking'] = {'clickTrackingParams': click_tracking_params}
+                    headers = ie.generate_api_headers(ytcfg=ytcfg, visitor_data=visitor_data)
+                    headers.update({'content-type': 'application/json'})
+                    raw_fragment = fetch(url, json.dumps(request_data, ensure_ascii=False).encode() + b'\n', headers)
+                if raw_fragment is None:
+                    return False
+
+                try:
+                    data = ie.extract_yt_initial_data(video_id, raw_fragment.decode('utf-8', 'replace'))
+                except RegexNotFoundError:
+                    data = None
+                if not data:
+                    data = json.loads(raw_fragment)
+                live_chat_continuation = try_get(
+                    data, lambda x: x['continuationContents']['liveChatContinuation'], dict) or {}
+
+                func = (try_refresh_replay_beginning if is_first and parse_actions is parse_actions_replay
+                        else parse_actions)
+                processed, continuation_id, offset, click_tracking_params, timeout_ms = func(live_chat_continuation)
+                ctx['extra_state'] = {
+                    'continuation': continuation_id,
+                    'offset': offset,
+                    'click_tracking_params': click_tracking_params,
+                    'start_time': start_time,
+                }
+                # The actions of the continuation are written at once, and flushed in batches with the checkpoints
+                self._append_fragment(ctx, ''.join(f'{line}\n' for line in processed).encode())
+                is_first = False
+                if test:
+                    break
+                if timeout_ms is not None:
+                    # The timeout is counted from the request, so that the time spent downloading is not added to it
+                    time.sleep(max(requested + timeout_ms / 1000 - time.monotonic(), 0))
+
+            finished = True
+        finally:
+            if not finished:
+                # Also checkpoints the continuations appended before an error or interruption
+                if 'fragment_journal' in ctx:
+                    self._flush_fragment_journal(ctx)
+                    ctx['fragment_journal'].close()
+                ctx['dest_stream'].close()
 
         return self._finish_frag_download(ctx, info_dict)
 
@@ -42,6 +42,7 @@
     IDENTITY,
     JSON_LD_RE,
     NO_DEFAULT,
+    DashFragments,
     ExtractorError,
     FormatSorter,
     GeoRestrictedError,
@@ -2849,7 +2850,7 @@ def _merge_mpd_periods(self, periods):
                 if format_key not in formats:
                     formats[format_key] = f
                 elif 'fragments' in f:
-                    formats[format_key].setdefault('fragments', []).extend(f['fragments'])
+                    formats[format_key].setdefault('fragments', DashFragments()).extend(f['fragments'])
 
             if subtitles and period['subtitles']:
                 self.report_warning(bug_reports_message(
@@ -2862,9 +2863,13 @@ def _merge_mpd_periods(self, periods):
 
         return list(formats.values()), subtitles
 
-    def _parse_mpd_periods(self, mpd_doc, mpd_id=None, mpd_base_url='', mpd_url=None):
+    def _parse_mpd_periods(self, mpd_doc, mpd_id=None, mpd_base_url='', mpd_url=None, now=None):
         """
         Parse formats from MPD manifest.
+
+        With now (a timestamp), the SegmentTemplates of a dynamic manifest that have
+        neither a SegmentTimeline nor a known period duration are expanded to the
+        segments that are available at that time, e.g. when refreshing a live manifest.
         References:
          1. MPEG-DASH Standard, ISO/IEC 23009-1:2014(E),
             http://standards.iso.org/ittf/PubliclyAvailableStandards/c065274_ISO_IEC_23009-1_2014.zip
@@ -2941,14 +2946,23 @@ def extract_Initialization(source):
             return ms_info
 
         mpd_duration = parse_duration(mpd_doc.get('mediaPresentationDuration'))
+        live_edge = None
+        if now is not None and mpd_doc.get('type') == 'dynamic':
+            live_edge = now - (parse_iso8601(mpd_doc.get('availabilityStartTime')) or 0)
+            time_shift_buffer = parse_duration(mpd_doc.get('timeShiftBufferDepth'))
         stream_numbers = collections.defaultdict(int)
+        period_start = period_duration = 0
         for period_idx, period in enumerate(mpd_doc.findall(_add_ns('Period'))):
             period_entry = {
                 'id': period.get('id', f'period-{period_idx}'),
                 'formats': [],
                 'subtitles': collections.defaultdict(list),
             }
+            period_start = (parse_duration(period.get('start')) or 0) if period.get('start') else (
+                period_start + (period_duration or 0))
             period_duration = parse_duration(period.get('duration')) or mpd_duration
+            # The end of a live period is not known yet
+            is_live_period = live_edge is not None and not period_duration
             period_ms_info = extract_multisegment_info(period, {
                 'start_number': 1,
                 'timescale': 1,
@@ -3093,47 +3107,43 @@ def location_key(location):
                         # can't be used at the same time
                         if '%(Number' in media_template and 's' not in representation_ms_info:
                             segment_duration = None
+                            first_segment = 0
                             if 'total_number' not in representation_ms_info and 'segment_duration' in representation_ms_info:
                                 segment_duration = float_or_none(representation_ms_info['segment_duration'], representation_ms_info['timescale'])
-                                representation_ms_info['total_number'] = math.ceil(float_or_none(period_duration, segment_duration, default=0))
-                            representation_ms_info['fragments'] = [{
-                                media_location_key: media_template % {
-                                    'Number': segment_number,
-                                    'Bandwidth': bandwidth,
-                                },
-                                'duration': segment_duration,
-                            } for segment_number in range(
-                                representation_ms_info['start_number'],
-                                representation_ms_info['total_number'] + representation_ms_info['start_number'])]
+                                if is_live_period:
+                                    # Only the segments that have been completely published are available
+                                    representation_ms_info['total_number'] = max(0, math.floor(
+                                        (live_edge - period_start) / segment_duration))
+                                    if time_shift_buffer is not None:
+                                        first_segment = max(0, representation_ms_info['total_number'] - math.floor(
+                                            time_shift_buffer / segment_duration))
+                                else:
+                                    representation_ms_info['total_number'] = math.ceil(float_or_none(period_duration, segment_duration, default=0))
+                            # The segments are only expanded when the fragments are accessed
+                            representation_ms_info['fragments'] = DashFragments()
+                            representation_ms_info['fragments'].add_template(
+                                media_location_key, media_template, representation_ms_info['timescale'], [(
+                                    representation_ms_info['start_number'] + first_segment,
+                                    first_segment * representation_ms_info['segment_duration'] if segment_duration else 0,
+                                    representation_ms_info['segment_duration'] if segment_duration else None,
+                                    representation_ms_info['total_number'] - first_segment)],
+                                Bandwidth=bandwidth)
                         else:
                             # $Number*$ or $Time$ in media template with S list available
                             # Example $Number*$: http://www.svtplay.se/klipp/9023742/stopptid-om-bjorn-borg
-                            representation_ms_info['fragments'] = []
+                            runs = []
                             segment_time = 0
-                            segment_d = None
                             segment_number = representation_ms_info['start_number']
-
-                            def add_segment_url():
-                                segment_url = media_template % {
-                                    'Time': segment_time,
-                                    'Bandwidth': bandwidth,
-                                    'Number': segment_number,
-                                }
-                                representation_ms_info['fragments'].append({
-                                    media_location_key: segment_url,
-                                    'duration': float_or_none(segment_d, representation_ms_info['timescale']),
-                                })
-
                             for s in representation_ms_info['s']:
                                 segment_time = s.get('t') or segment_time
-                                segment_d = s['d']
-                                add_segment_url()
-                                segment_number += 1
-                                for _ in range(s.get('r', 0)):
-                                    segment_time += segment_d
-                                    add_segment_url()
-                                    segment_number += 1
-                                segment_time += segment_d
+                                count = max(s.get('r', 0), 0) + 1
+                                runs.append((segment_number, segment_time, s['d'], count))
+                                segment_number += count
+                                segment_time += count * s['d']
+                            representation_ms_info['fragments'] = DashFragments()
+                            representation_ms_info['fragments'].add_template(
+                                media_location_key, media_template, representation_ms_info['timescale'], runs,
+                                Bandwidth=bandwidth)
                     elif 'segment_urls' in representation_ms_info and 's' in representation_ms_info:
                         # No media template,
                         # e.g. https://www.youtube.com/watch?v=iXZV5uAYMJI
@@ -3176,7 +3186,7 @@ def add_segment_url():
                             # NB: mpd_url may be empty when MPD manifest is parsed from a string
                             'url': mpd_url or base_url,
                             'fragment_base_url': base_url,
-                            'fragments': [],
+                            'fragments': DashFragments(),
                             'protocol': 'mhtml' if mime_type in ('image/avif', 'image/jpeg') else 'http_dash_segments',
                         })
                         if 'initialization_url' in representation_ms_info:
@@ -3186,9 +3196,10 @@ def add_segment_url():
                             f['fragments'].append({location_key(initialization_url): initialization_url})
                         f['fragments'].extend(representation_ms_info['fragments'])
                         if not period_duration:
-                            period_duration = try_get(
-                                representation_ms_info,
-                                lambda r: sum(frag['duration'] for frag in r['fragments']), float)
+                            fragments = representation_ms_info['fragments']
+                            # The segments of a template are not expanded for this
+                            period_duration = fragments.duration() if isinstance(fragments, DashFragments) else try_get(
+                                fragments, lambda r: sum(frag['duration'] for frag in r), float)
                     else:
                         # Assuming direct URL to unfragmented media.
                         f['url'] = base_url
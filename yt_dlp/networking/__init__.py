@@ -23,6 +23,13 @@
 except Exception as e:
     warnings.warn(f'Failed to import "requests" request handler: {e}' + bug_reports_message())
 
+try:
+    from . import _httpx
+except ImportError:
+    pass
+except Exception as e:
+    warnings.warn(f'Failed to import "httpx" request handler: {e}' + bug_reports_message())
+
 try:
     from . import _websockets
 except ImportError:
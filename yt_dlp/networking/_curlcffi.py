@@ -225,6 +225,7 @@ def send(self, request: Request) -> Response:
         response.extensions['impersonate'] = target
         return response
 
+    @InstanceStoreMixin.leases_instances
     def _send(self, request: Request):
         max_redirects_exceeded = False
         session: curl_cffi.requests.Session = self._get_instance(
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
+import collections
 import contextlib
 import functools
+import itertools
 import os
+import queue
 import socket
 import ssl
 import sys
+import threading
+import time
 import typing
 import urllib.parse
 import urllib.request
+import weakref
+from collections.abc import Hashable, Mapping
 
-from .exceptions import RequestError
+from .exceptions import HTTPError, RequestError
 from ..dependencies import certifi
 from ..socks import ProxyType, sockssocket
 
@@ -154,32 +161,136 @@ def make_ssl_context(
     return context
 
 
+def _instance_key(value):
+    """@returns a hashable key for the value, which is equal for equal containers and identical objects otherwise"""
+    if isinstance(value, Mapping):
+        return frozenset((k, _instance_key(v)) for k, v in value.items())
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_instance_key(v) for v in value)
+    elif isinstance(value, (list, tuple)):
+        return tuple(_instance_key(v) for v in value)
+    elif isinstance(value, Hashable):
+        return value
+    # The store keeps a reference to the value with the instance, so the id is not reused while it is stored
+    return ('id', id(value))
+
+
 class InstanceStoreMixin:
+    """Stores the instances (e.g. sessions) of a request handler by the arguments they are created with
+
+    At most _MAX_INSTANCES are kept, and the least recently used one is evicted to make room for a new one.
+    An evicted instance is closed once it is no longer in use by a request (see leases_instances)
+    """
+    _MAX_INSTANCES = 32
+
     def __init__(self, **kwargs):
-        self.__instances = []
+        # key -> (kwargs, instance), the least recently used first
+        self.__instances = collections.OrderedDict()
+        # id(instance) -> number of requests using it
+        self.__leases = {}
+        # id(instance) -> instance evicted while in use
+        self.__evicted = {}
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__hits = self.__misses = self.__evictions = 0
         super().__init__(**kwargs)  # So that both MRO works
 
+    @staticmethod
+    def leases_instances(send):
+        """Decorator for the _send of a request handler
+
+        The instances that it gets are leased to the request until its response,
+        or that of the HTTPError it raises, is no longer referenced
+        """
+        @functools.wraps(send)
+        def wrapper(self, request):
+            outer_leases, self.__local.leases = getattr(self.__local, 'leases', None), []
+            response = None
+            try:
+                response = send(self, request)
+                return response
+            except HTTPError as e:
+                response = e.response
+                raise
+            finally:
+                leases, self.__local.leases = self.__local.leases, outer_leases
+                if response is None:
+                    self.__release_instances(leases)
+                elif leases:
+                    # The response may still be reading from the connections of the instances
+                    weakref.finalize(response, self.__release_instances, leases).atexit = False
+
+        return wrapper
+
     @staticmethod
     def _create_instance(**kwargs):
         raise NotImplementedError
 
     def _get_instance(self, **kwargs):
-        for key, instance in self.__instances:
-            if key == kwargs:
-                return instance
-
-        instance = self._create_instance(**kwargs)
-        self.__instances.append((kwargs, instance))
+        key = _instance_key(kwargs)
+        evicted = []
+        with self.__lock:
+            entry = self.__instances.get(key)
+            if entry is not None:
+                self.__hits += 1
+                self.__instances.move_to_end(key)
+                instance = entry[1]
+            else:
+                self.__misses += 1
+                instance = self._create_instance(**kwargs)
+                self.__instances[key] = (kwargs, instance)
+                while len(self.__instances) > self._MAX_INSTANCES:
+                    evicted_instance = self.__instances.popitem(last=False)[1][1]
+                    self.__evictions += 1
+                    if id(evicted_instance) in self.__leases:
+                        self.__evicted[id(evicted_instance)] = evicted_instance
+                    else:
+                        evicted.append(evicted_instance)
+
+            leases = getattr(self.__local, 'leases', None)
+            if leases is not None:
+                leases.append(instance)
+                self.__leases[id(instance)] = self.__leases.get(id(instance), 0) + 1
+
+        for evicted_instance in evicted:
+            self._close_instance(evicted_instance)
         return instance
 
+    def __release_instances(self, instances):
+        evicted = []
+        with self.__lock:
+            for instance in instances:
+                self.__leases[id(instance)] -= 1
+                if not self.__leases[id(instance)]:
+                    del self.__leases[id(instance)]
+                    if id(instance) in self.__evicted:
+                        evicted.append(self.__evicted.pop(id(instance)))
+
+        for evicted_instance in evicted:
+            self._close_instance(evicted_instance)
+
     def _close_instance(self, instance):
         if callable(getattr(instance, 'close', None)):
             instance.close()
 
     def _clear_instances(self):
-        for _, instance in self.__instances:
+        with self.__lock:
+            instances = [instance for _, instance in self.__instances.values()]
+            instances.extend(self.__evicted.values())
+            self.__instances.clear()
+            self.__evicted.clear()
+        for instance in instances:
             self._close_instance(instance)
-        self.__instances.clear()
+
+    def _instance_stats(self):
+        """@returns the number of hits, misses and evictions of the store, and of the live instances"""
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'live': len(self.__instances),
+            }
 
 
 def add_accept_encoding_header(headers: HTTPHeaderDict, supported_encodings: Iterable[str]):
@@ -232,6 +343,133 @@ def create_socks_proxy_socket(dest_addr, proxy_args, proxy_ip_addr, timeout, sou
         raise
 
 
+class DNSCache:
+    """In-process cache of socket.getaddrinfo() results
+
+    getaddrinfo() does not expose the TTL of the records, so the addresses are kept for TTL seconds.
+    Hostnames that do not resolve are remembered for NEGATIVE_TTL seconds, but not temporary failures
+    """
+    TTL = 30
+    NEGATIVE_TTL = 5
+    MAX_ENTRIES = 256
+    # Errors that the resolver is authoritative about
+    _NEGATIVE_ERRORS = {socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expiry, addrinfos or socket.gaierror)
+        self._entries = {}
+
+    def getaddrinfo(self, host, port, family=0, type=0):
+        key = (host, port, family, type)
+        with self._lock:
+            expiry, result = self._entries.get(key, (0, None))
+        if expiry > time.monotonic():
+            if isinstance(result, socket.gaierror):
+                raise socket.gaierror(*result.args)
+            return list(result)
+
+        try:
+            result = socket.getaddrinfo(host, port, family, type)
+        except socket.gaierror as e:
+            if e.errno in self._NEGATIVE_ERRORS:
+                self._store(key, self.NEGATIVE_TTL, e)
+            raise
+        self._store(key, self.TTL, tuple(result))
+        return result
+
+    def _store(self, key, ttl, result):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.MAX_ENTRIES:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + ttl, result)
+
+    def invalidate(self, host):
+        """Forget the addresses of a host, e.g. when none of them could be connected to"""
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != host}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dns_cache = DNSCache()
+
+
+def _interleave_addrinfos(addrinfos):
+    """Alternate between the address families, starting with the first one (RFC 8305, section 4)"""
+    families = {}
+    for addrinfo in addrinfos:
+        families.setdefault(addrinfo[0], []).append(addrinfo)
+    return [addrinfo for group in itertools.zip_longest(*families.values()) for addrinfo in group if addrinfo]
+
+
+# RFC 8305 "Connection Attempt Delay"
+HAPPY_EYEBALLS_DELAY = 0.25
+
+
+def _happy_eyeballs_connect(ip_addrs, timeout, source_address, create_socket_func):
+    """
+    Start a connection attempt to the next address whenever the previous ones have not succeeded
+    for HAPPY_EYEBALLS_DELAY seconds, or have all failed. The first socket to connect is returned
+    """
+    results = queue.Queue()
+    lock = threading.Lock()
+    done = False
+
+    def attempt(ip_addr):
+        try:
+            result = create_socket_func(ip_addr, timeout, source_address), None
+        except Exception as e:
+            result = None, e
+        with lock:
+            if done:
+                if result[0] is not None:
+                    result[0].close()
+                return
+            results.put(result)
+
+    def finish():
+        nonlocal done
+        with lock:
+            done = True
+            while not results.empty():
+                sock, _ = results.get_nowait()
+                if sock is not None:
+                    sock.close()
+
+    remaining = iter(ip_addrs)
+    next_addr = next(remaining, None)
+    pending, err = 0, None
+    try:
+        while True:
+            if next_addr is not None:
+                threading.Thread(target=attempt, args=(next_addr,), daemon=True).start()
+                pending += 1
+                next_addr = next(remaining, None)
+            if not pending:
+                raise err
+            try:
+                sock, error = results.get(timeout=HAPPY_EYEBALLS_DELAY if next_addr is not None else None)
+            except queue.Empty:
+                continue
+            pending -= 1
+            if sock is not None:
+                return sock
+            if not isinstance(error, OSError):
+                raise error
+            err = error
+    finally:
+        finish()
+        # Explicitly break __traceback__ reference cycle
+        # https://bugs.python.org/issue36820
+        err = None
+
+
 def create_connection(
     address,
     timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
@@ -243,7 +481,7 @@ def create_connection(
     # This filters the addresses based on the given source_address.
     # Based on: https://github.com/python/cpython/blob/main/Lib/socket.py#L810
     host, port = address
-    ip_addrs = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    ip_addrs = dns_cache.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
     if not ip_addrs:
         raise OSError('getaddrinfo returns an empty list')
     if source_address is not None:
@@ -254,20 +492,11 @@ def create_connection(
                 f'No remote IPv{4 if af == socket.AF_INET else 6} addresses available for connect. '
                 f'Can\'t use "{source_address[0]}" as source address')
 
-    err = None
-    for ip_addr in ip_addrs:
-        try:
-            sock = _create_socket_func(ip_addr, timeout, source_address)
-            # Explicitly break __traceback__ reference cycle
-            # https://bugs.python.org/issue36820
-            err = None
-            return sock
-        except OSError as e:
-            err = e
-
     try:
-        raise err
-    finally:
-        # Explicitly break __traceback__ reference cycle
-        # https://bugs.python.org/issue36820
-        err = None
+        if len(ip_addrs) == 1:
+            return _create_socket_func(ip_addrs[0], timeout, source_address)
+        return _happy_eyeballs_connect(_interleave_addrinfos(ip_addrs), timeout, source_address, _create_socket_func)
+    except OSError:
+        # The addresses may be stale
+        dns_cache.invalidate(host)
+        raise
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import io
+import ssl
+import urllib.parse
+
+from ..dependencies import brotli, httpx
+from ..utils import int_or_none
+
+if httpx is None:
+    raise ImportError('httpx module is not installed')
+
+httpx_version = tuple(int_or_none(x, default=0) for x in httpx.__version__.split('.'))
+
+if httpx_version < (0, 26):
+    httpx._yt_dlp__version = f'{httpx.__version__} (unsupported)'
+    raise ImportError('Only httpx >= 0.26 is supported')
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    raise ImportError('h2 module is not installed, which httpx needs for HTTP/2') from None
+
+from ._helper import InstanceStoreMixin, add_accept_encoding_header
+from .common import (
+    Features,
+    RequestHandler,
+    Response,
+    register_preference,
+    register_rh,
+)
+from .exceptions import (
+    CertificateVerifyError,
+    HTTPError,
+    IncompleteRead,
+    ProxyError,
+    RequestError,
+    SSLError,
+    TransportError,
+)
+from ..utils.networking import select_proxy
+
+SUPPORTED_ENCODINGS = [
+    'gzip', 'deflate',
+]
+
+if brotli is not None:
+    SUPPORTED_ENCODINGS.append('br')
+
+# Same as urllib's HTTPRedirectHandler
+MAX_REDIRECTS = 10
+
+
+def _origin(url):
+    parsed = urllib.parse.urlparse(url)
+    scheme = parsed.scheme.lower()
+    return scheme, parsed.hostname, parsed.port or {'http': 80, 'https': 443}.get(scheme)
+
+
+def _find_ssl_error(e):
+    while e is not None:
+        if isinstance(e, ssl.SSLError):
+            return e
+        e = e.__cause__ or e.__context__
+    return None
+
+
+class HttpxResponseReader(io.IOBase):
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self._iterator = response.iter_bytes()
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=None):
+        exception_raised = True
+        try:
+            chunks, length = [self._buffer], len(self._buffer)
+            while self._iterator and (size is None or size < 0 or length < size):
+                chunk = next(self._iterator, None)
+                if chunk is None:
+                    self._iterator = None
+                    break
+                chunks.append(chunk)
+                length += len(chunk)
+
+            data = b''.join(chunks)
+            if size is None or size < 0:
+                self._buffer = b''
+            else:
+                data, self._buffer = data[:size], data[size:]
+
+            # Release the connection, or the stream of a HTTP/2 connection, once the response is fully read
+            if not self._iterator and not self._buffer:
+                self.close()
+            exception_raised = False
+            return data
+        finally:
+            if exception_raised:
+                self.close()
+
+    def close(self):
+        if not self.closed:
+            self.response.close()
+            self._iterator = None
+            self._buffer = b''
+        super().close()
+
+
+class HttpxResponseAdapter(Response):
+    fp: HttpxResponseReader
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(
+            fp=HttpxResponseReader(response),
+            headers={},
+            url=str(response.url),
+            status=response.status_code,
+            reason=response.reason_phrase,
+            extensions={'http_version': response.http_version})
+        # Keep repeated headers such as Set-Cookie separate
+        for name, value in response.headers.multi_items():
+            self.headers.add_header(name, value)
+
+    def read(self, amt=None):
+        try:
+            data = self.fp.read(amt)
+            if self.fp.closed:
+                self.close()
+            return data
+        except httpx.RemoteProtocolError as e:
+            # The body is counted as received, before it is decoded
+            received = self.fp.response.num_bytes_downloaded
+            content_length = int_or_none(self.get_header('Content-Length'))
+            if content_length is not None and received < content_length:
+                raise IncompleteRead(partial=received, expected=content_length - received, cause=e) from e
+            raise TransportError(cause=e) from e
+        except (httpx.HTTPError, httpx.StreamError) as e:
+            raise TransportError(cause=e) from e
+
+
+@register_rh
+class HttpxRH(RequestHandler, InstanceStoreMixin):
+
+    """HTTPX RequestHandler
+    https://github.com/encode/httpx
+
+    HTTP/2 is negotiated with ALPN on https connections. The concurrent requests to a
+    server that supports it, such as the fragments of a download, are multiplexed as
+    streams of a single connection. Other servers are spoken to over HTTP/1.1
+    """
+    _SUPPORTED_URL_SCHEMES = ('http', 'https')
+    _SUPPORTED_ENCODINGS = tuple(SUPPORTED_ENCODINGS)
+    _SUPPORTED_PROXY_SCHEMES = ('http', 'https')
+    _SUPPORTED_FEATURES = (Features.NO_PROXY, Features.ALL_PROXY)
+    RH_NAME = 'httpx'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # origin -> whether the server negotiated HTTP/2, used by httpx_preference
+        self._http2_origins = {}
+        # origins of the requests that are finding it out
+        self._http2_probes = set()
+
+    def close(self):
+        self._clear_instances()
+
+    def supports_http2(self, url):
+        """@returns whether the server of the url negotiated HTTP/2, or None if it is not known yet"""
+        return self._http2_origins.get(_origin(url))
+
+    def probing_http2(self, url):
+        """@returns whether a request is finding out if the server of the url negotiates HTTP/2"""
+        return _origin(url) in self._http2_probes
+
+    def _check_extensions(self, extensions):
+        super()._check_extensions(extensions)
+        extensions.pop('cookiejar', None)
+        extensions.pop('timeout', None)
+        extensions.pop('legacy_ssl', None)
+
+    def _create_instance(self, proxy, cookiejar, legacy_ssl_support=None):
+        ssl_context = self._make_sslcontext(legacy_ssl_support=legacy_ssl_support)
+        ssl_context.set_alpn_protocols(['h2', 'http/1.1'])
+        if proxy:
+            # Connections to a https proxy are not negotiated to HTTP/2
+            proxy = httpx.Proxy(proxy, ssl_context=self._make_sslcontext(legacy_ssl_support=legacy_ssl_support))
+        client = httpx.Client(
+            transport=httpx.HTTPTransport(
+                verify=ssl_context,
+                http1=True,
+                http2=True,
+                proxy=proxy,
+                local_address=self.source_address,
+                retries=0,
+            ),
+            cookies=cookiejar,
+            follow_redirects=False,
+            trust_env=False,  # no need, we already load proxies from env
+        )
+        # Do not send the default headers of httpx
+        client.headers.clear()
+        return client
+
+    def _prepare_headers(self, _, headers):
+        add_accept_encoding_header(headers, SUPPORTED_ENCODINGS)
+
+    @InstanceStoreMixin.leases_instances
+    def _send(self, request):
+        client = self._get_instance(
+            # The proxy is part of the transport, so each one needs its own client
+            proxy=select_proxy(request.url, self._get_proxies(request)),
+            cookiejar=self._get_cookiejar(request),
+            legacy_ssl_support=request.extensions.get('legacy_ssl'),
+        )
+        httpx_request = client.build_request(
+            method=request.method,
+            url=request.url,
+            content=request.data,
+            headers=self._get_headers(request),
+            timeout=self._calculate_timeout(request),
+        )
+
+        origin = _origin(request.url)
+        if origin[0] == 'https' and origin not in self._http2_origins:
+            self._http2_probes.add(origin)
+        try:
+            httpx_response = client.send(httpx_request, stream=True)
+            # Redirects are followed here, so that the last response can be raised with a redirect loop error
+            for _ in range(MAX_REDIRECTS):
+                next_request = httpx_response.next_request
+                if next_request is None:
+                    break
+                httpx_response.close()
+                if next_request.method != httpx_request.method:
+                    # Same as our urllib redirect handler
+                    next_request.headers.pop('Content-Type', None)
+                httpx_request = next_request
+                httpx_response = client.send(httpx_request, stream=True)
+
+        except httpx.ProxyError as e:
+            raise ProxyError(cause=e) from e
+
+        except httpx.TransportError as e:
+            ssl_error = _find_ssl_error(e)
+            if isinstance(ssl_error, ssl.SSLCertVerificationError):
+                raise CertificateVerifyError(cause=e) from e
+            elif ssl_error:
+                raise SSLError(cause=e) from e
+            raise TransportError(cause=e) from e
+
+        except (httpx.InvalidURL, httpx.HTTPError) as e:
+            # Miscellaneous httpx exceptions. May not necessary be network related e.g. CookieConflict
+            raise RequestError(cause=e) from e
+
+        finally:
+            self._http2_probes.discard(origin)
+
+        if httpx_response.url.scheme == 'https':
+            self._http2_origins[_origin(str(httpx_response.url))] = httpx_response.http_version == 'HTTP/2'
+
+        res = HttpxResponseAdapter(httpx_response)
+
+        if not 200 <= res.status < 300:
+            raise HTTPError(res, redirect_loop=httpx_response.next_request is not None)
+
+        return res
+
+
+@register_preference(HttpxRH)
+def httpx_preference(rh, request):
+    # Only https servers can negotiate HTTP/2, and those that did not are left to the other handlers
+    if _origin(request.url)[0] != 'https':
+        return -50
+    supports_http2 = rh.supports_http2(request.url)
+    if supports_http2 is None:
+        # The first request to a server finds out whether it negotiates HTTP/2,
+        # and the others are left to the other handlers until it is known
+        return 0 if rh.probing_http2(request.url) else 200
+    return 200 if supports_http2 else -50
@@ -310,6 +310,7 @@ def _prepare_headers(self, _, headers):
         add_accept_encoding_header(headers, SUPPORTED_ENCODINGS)
         headers.setdefault('Connection', 'keep-alive')
 
+    @InstanceStoreMixin.leases_instances
     def _send(self, request):
 
         headers = self._get_headers(request)
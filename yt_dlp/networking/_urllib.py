@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import collections
 import functools
 import http.client
 import io
+import select
 import ssl
+import threading
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -62,6 +66,98 @@ def _create_http_connection(http_class, source_address, *args, **kwargs):
     return hc
 
 
+def _is_connection_dropped(sock):
+    """@returns whether an idle connection has been closed, or has unexpected data to read"""
+    if sock is None:
+        return True
+    try:
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            return bool(poller.poll(0))
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class _PooledHTTPResponse(http.client.HTTPResponse):
+    """HTTPResponse that releases its connection once it is closed"""
+    _release = None
+    _chunked_complete = False
+
+    def _read_and_discard_trailer(self):
+        super()._read_and_discard_trailer()
+        # Only reached after the last chunk
+        self._chunked_complete = True
+
+    def _close_conn(self):
+        # The connection can only be reused for another request if the body has been read to the end
+        complete = self._chunked_complete if self.chunked else self.length == 0
+        super()._close_conn()
+        release, self._release = self._release, None
+        if release:
+            release(complete and not self.will_close)
+
+
+class HTTPConnectionPool:
+    """
+    Idle keep-alive connections of a HTTPHandler
+
+    Connections are keyed by the scheme, host, port, proxy and tunnel they were opened for.
+    At most MAX_PER_HOST idle connections are kept for each key, and they are closed
+    once they have been idle for IDLE_TIMEOUT seconds, or when the server drops them
+    """
+
+    MAX_PER_HOST = 8
+    IDLE_TIMEOUT = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> deque of (connection, time it became idle), most recently used last
+        self._idle = {}
+        self._closed = False
+
+    def get(self, key):
+        """@returns an idle connection for the key, or None"""
+        with self._lock:
+            self._evict(time.monotonic())
+            connections = self._idle.get(key)
+            while connections:
+                connection, _ = connections.pop()
+                if not _is_connection_dropped(connection.sock):
+                    return connection
+                connection.close()
+        return None
+
+    def put(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, collections.deque())
+            if self._closed or len(connections) >= self.MAX_PER_HOST or connection.sock is None:
+                connection.close()
+            else:
+                connections.append((connection, time.monotonic()))
+
+    def _evict(self, now):
+        for key, connections in list(self._idle.items()):
+            while connections and now - connections[0][1] >= self.IDLE_TIMEOUT:
+                connections.popleft()[0].close()
+            if not connections:
+                del self._idle[key]
+
+    def close(self):
+        """Close the idle connections; the ones in use are closed when they are released"""
+        with self._lock:
+            self._closed = True
+            for connections in self._idle.values():
+                for connection, _ in connections:
+                    connection.close()
+            self._idle.clear()
+
+    def __del__(self):
+        # Do not leave the sockets to the garbage collector when the handler was not closed
+        self.close()
+
+
 class HTTPHandler(urllib.request.AbstractHTTPHandler):
     """Handler for HTTP requests and responses.
 
@@ -81,6 +177,7 @@ def __init__(self, context=None, source_address=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._source_address = source_address
         self._context = context
+        self._pool = HTTPConnectionPool()
 
     @staticmethod
     def _make_conn_class(base, req):
@@ -91,16 +188,96 @@ def _make_conn_class(base, req):
         return conn_class
 
     def http_open(self, req):
+        socks_proxy = req.headers.get('Ytdl-socks-proxy')
         conn_class = self._make_conn_class(http.client.HTTPConnection, req)
         return self.do_open(functools.partial(
-            _create_http_connection, conn_class, self._source_address), req)
+            _create_http_connection, conn_class, self._source_address), req, socks_proxy=socks_proxy)
 
     def https_open(self, req):
+        socks_proxy = req.headers.get('Ytdl-socks-proxy')
         conn_class = self._make_conn_class(http.client.HTTPSConnection, req)
         return self.do_open(
             functools.partial(
                 _create_http_connection, conn_class, self._source_address),
-            req, context=self._context)
+            req, socks_proxy=socks_proxy, context=self._context)
+
+    def do_open(self, http_class, req, socks_proxy=None, **http_conn_args):
+        """
+        Send the request over a keep-alive connection from the pool, or a new one
+
+        Based on AbstractHTTPHandler.do_open from CPython, which closes the connection after every request.
+        The connection is returned to the pool once the body of the response has been read to the end,
+        unless either side asked to close it
+        """
+        if not req.host:
+            raise urllib.error.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items() if k not in headers})
+        headers = {name.title(): val for name, val in headers.items()}
+
+        tunnel_headers = {}
+        if req._tunnel_host and 'Proxy-Authorization' in headers:
+            # Proxy-Authorization should not be sent to origin server
+            tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+
+        key = (req.type, req.host, req._tunnel_host, tuple(tunnel_headers.items()), socks_proxy)
+        # A request is only sent again over a new connection if its body can be read again
+        replayable = req.data is None or isinstance(req.data, (bytes, bytearray, memoryview))
+        # and, once it may have reached the server, if sending it twice does no harm (RFC 9110, 9.2.2)
+        idempotent = req.get_method() in ('GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE')
+        while True:
+            connection = self._pool.get(key)
+            reused = connection is not None
+            if reused:
+                connection.timeout = req.timeout
+                connection.sock.settimeout(req.timeout)
+            else:
+                # will parse host:port
+                connection = http_class(req.host, timeout=req.timeout, **http_conn_args)
+                connection.set_debuglevel(self._debuglevel)
+                connection.response_class = _PooledHTTPResponse
+                if req._tunnel_host:
+                    connection.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+
+            try:
+                try:
+                    connection.request(req.get_method(), req.selector, req.data, headers,
+                                       encode_chunked=req.has_header('Transfer-encoding'))
+                except OSError as err:  # timeout error
+                    if reused and replayable and isinstance(err, ConnectionError):
+                        # The server closed the idle connection just before it was reused
+                        connection.close()
+                        continue
+                    raise urllib.error.URLError(err)
+                response = connection.getresponse()
+            except ConnectionError:  # including http.client.RemoteDisconnected
+                connection.close()
+                if reused and replayable and idempotent:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            break
+
+        if headers.get('Connection', '').lower() == 'close':
+            response.will_close = True
+        response._release = functools.partial(self._release, key, connection)
+
+        response.url = req.get_full_url()
+        # urllib clients expect the response to have the reason in .msg
+        response.msg = response.reason
+        return response
+
+    def _release(self, key, connection, reusable):
+        if reusable:
+            self._pool.put(key, connection)
+        else:
+            connection.close()
+
+    def close(self):
+        self._pool.close()
 
     @staticmethod
     def deflate(data):
@@ -304,33 +481,47 @@ def __init__(self, res: http.client.HTTPResponse | urllib.response.addinfourl):
             fp=res, headers=res.headers, url=res.url,
             status=getattr(res, 'status', None) or res.getcode(), reason=getattr(res, 'reason', None))
 
+    def _close_if_exhausted(self, amt):
+        underlying = getattr(self.fp, 'fp', None)
+        if isinstance(self.fp, http.client.HTTPResponse) and underlying is None:
+            # http.client.HTTPResponse automatically closes itself when fully read
+            self.close()
+        elif isinstance(self.fp, urllib.response.addinfourl) and underlying is not None:
+            # urllib's addinfourl does not close the underlying fp automatically when fully read
+            if isinstance(underlying, io.BytesIO):
+                # data URLs or in-memory responses (e.g. gzip/deflate/brotli decoded)
+                if underlying.tell() >= len(underlying.getbuffer()):
+                    self.close()
+            elif isinstance(underlying, io.BufferedReader) and amt is None:
+                # file URLs.
+                # XXX: this will not mark the response as closed if it was fully read with amt.
+                self.close()
+        elif underlying is not None and underlying.closed:
+            # Catch-all for any cases where underlying file is closed
+            self.close()
+
     def read(self, amt=None):
         if self.closed:
             return b''
         try:
             data = self.fp.read(amt)
-            underlying = getattr(self.fp, 'fp', None)
-            if isinstance(self.fp, http.client.HTTPResponse) and underlying is None:
-                # http.client.HTTPResponse automatically closes itself when fully read
-                self.close()
-            elif isinstance(self.fp, urllib.response.addinfourl) and underlying is not None:
-                # urllib's addinfourl does not close the underlying fp automatically when fully read
-                if isinstance(underlying, io.BytesIO):
-                    # data URLs or in-memory responses (e.g. gzip/deflate/brotli decoded)
-                    if underlying.tell() >= len(underlying.getbuffer()):
-                        self.close()
-                elif isinstance(underlying, io.BufferedReader) and amt is None:
-                    # file URLs.
-                    # XXX: this will not mark the response as closed if it was fully read with amt.
-                    self.close()
-            elif underlying is not None and underlying.closed:
-                # Catch-all for any cases where underlying file is closed
-                self.close()
+            self._close_if_exhausted(amt)
             return data
         except Exception as e:
             handle_response_read_exceptions(e)
             raise e
 
+    def readinto(self, b):
+        if self.closed:
+            return 0
+        try:
+            size = self.fp.readinto(b)
+            self._close_if_exhausted(len(b))
+            return size
+        except Exception as e:
+            handle_response_read_exceptions(e)
+            raise e
+
 
 def handle_sslerror(e: ssl.SSLError):
     if not isinstance(e, ssl.SSLError):
@@ -398,9 +589,18 @@ def _create_instance(self, proxies, cookiejar, legacy_ssl_support=None):
         opener.addheaders = []
         return opener
 
+    def _close_instance(self, opener):
+        # OpenerDirector.close does not close its handlers
+        for handler in opener.handlers:
+            handler.close()
+
+    def close(self):
+        self._clear_instances()
+
     def _prepare_headers(self, _, headers):
         add_accept_encoding_header(headers, SUPPORTED_ENCODINGS)
 
+    @InstanceStoreMixin.leases_instances
     def _send(self, request):
         headers = self._get_headers(request)
         urllib_req = urllib.request.Request(
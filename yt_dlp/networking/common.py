@@ -57,35 +57,72 @@ class RequestDirector:
     can be registered into the `preferences` set. These are used to sort handlers
     in order of preference.
 
+    Whether a handler supports a request is remembered for requests with the same url scheme,
+    proxies and extensions (which includes the impersonate target), as these are what is validated.
+
     @param logger: Logger instance.
     @param verbose: Print debug request information to stdout.
     """
 
+    # Routes are only kept for this many different routing keys, e.g. per-request cookiejars
+    _MAX_ROUTES = 256
+
     def __init__(self, logger, verbose=False):
         self.handlers: dict[str, RequestHandler] = {}
         self.preferences: set[Preference] = set()
         self.logger = logger  # TODO(Grub4k): default logger
         self.verbose = verbose
+        # routing key -> {handler: UnsupportedRequest raised by its validation, or None}
+        self._routes: dict[tuple, dict[RequestHandler, UnsupportedRequest | None]] = {}
 
     def close(self):
         for handler in self.handlers.values():
             handler.close()
         self.handlers.clear()
+        self._routes.clear()
 
     def add_handler(self, handler: RequestHandler):
         """Add a handler. If a handler of the same RH_KEY exists, it will overwrite it"""
         assert isinstance(handler, RequestHandler), 'handler must be a RequestHandler'
         self.handlers[handler.RH_KEY] = handler
+        self._routes.clear()
 
-    def _get_handlers(self, request: Request) -> list[RequestHandler]:
+    def _get_handlers(self, request: Request, handlers: Iterable[RequestHandler] | None = None) -> list[RequestHandler]:
         """Sorts handlers by preference, given a request"""
+        if handlers is None:
+            handlers = self.handlers.values()
         preferences = {
             rh: sum(pref(rh, request) for pref in self.preferences)
-            for rh in self.handlers.values()
+            for rh in handlers
         }
-        self._print_verbose('Handler preferences for this request: {}'.format(', '.join(
-            f'{rh.RH_NAME}={pref}' for rh, pref in preferences.items())))
-        return sorted(self.handlers.values(), key=preferences.get, reverse=True)
+        if self.verbose:
+            self._print_verbose('Handler preferences for this request: {}'.format(', '.join(
+                f'{rh.RH_NAME}={pref}' for rh, pref in preferences.items())))
+        return sorted(preferences, key=preferences.get, reverse=True)
+
+    @staticmethod
+    def _routing_key(request: Request):
+        """@returns the attributes of the request that handlers are validated against, or None if they are not hashable"""
+        try:
+            return (
+                # Same scheme as urllib.parse.urlparse for urls that have one, and a distinct key otherwise
+                request.url.partition(':')[0].lower(),
+                frozenset(request.proxies.items()),
+                frozenset(request.extensions.items()),
+            )
+        except TypeError:
+            return None
+
+    def _get_routes(self, request: Request):
+        key = self._routing_key(request)
+        if key is None:
+            return {}
+        routes = self._routes.get(key)
+        if routes is None:
+            if len(self._routes) >= self._MAX_ROUTES:
+                self._routes.clear()
+            routes = self._routes[key] = {}
+        return routes
 
     def _print_verbose(self, msg):
         if self.verbose:
@@ -100,18 +137,30 @@ def send(self, request: Request) -> Response:
 
         assert isinstance(request, Request)
 
-        unexpected_errors = []
+        routes = self._get_routes(request)
+        supported_handlers = []
         unsupported_errors = []
-        for handler in self._get_handlers(request):
+        for handler in self.handlers.values():
             self._print_verbose(f'Checking if "{handler.RH_NAME}" supports this request.')
-            try:
-                handler.validate(request)
-            except UnsupportedRequest as e:
-                self._print_verbose(
-                    f'"{handler.RH_NAME}" cannot handle this request (reason: {error_to_str(e)})')
-                unsupported_errors.append(e)
+            if handler not in routes:
+                try:
+                    handler.validate(request)
+                    routes[handler] = None
+                except UnsupportedRequest as e:
+                    routes[handler] = e
+            error = routes[handler]
+            if error is None:
+                supported_handlers.append(handler)
                 continue
+            self._print_verbose(
+                f'"{handler.RH_NAME}" cannot handle this request (reason: {error_to_str(error)})')
+            unsupported_errors.append(error)
+
+        if len(supported_handlers) > 1:
+            supported_handlers = self._get_handlers(request, supported_handlers)
 
+        unexpected_errors = []
+        for handler in supported_handlers:
             self._print_verbose(f'Sending request via "{handler.RH_NAME}"')
             try:
                 response = handler.send(request)
@@ -165,7 +214,8 @@ class RequestHandler(abc.ABC):
     Any other exception raised will be treated as a handler issue.
 
     If a Request is not supported by the handler, an UnsupportedRequest
-    should be raised with a reason.
+    should be raised with a reason. Whether a Request is supported should only depend on
+    its url scheme, proxies and extensions, as the RequestDirector remembers it for these.
 
     By default, some checks are done on the request in _validate() based on the following class variables:
     - `_SUPPORTED_URL_SCHEMES`: a tuple of supported url schemes.
@@ -561,6 +611,12 @@ def read(self, amt: int | None = None) -> bytes:
         except Exception as e:
             raise TransportError(cause=e) from e
 
+    def readinto(self, b) -> int:
+        # Subclasses should redefine this method if the response can be read without a copy
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
     def close(self):
         if not self.fp.closed:
             self.fp.close()
@@ -568,6 +568,7 @@ def _preset_alias_callback(option, opt_str, value, parser):
                 'embed-metadata', 'seperate-video-versions', 'no-clean-infojson', 'no-keep-subs', 'no-certifi',
                 'no-youtube-channel-redirect', 'no-youtube-unavailable-videos', 'no-youtube-prefer-utc-upload-date',
                 'prefer-legacy-http-handler', 'manifest-filesize-approx', 'allow-unsafe-ext', 'prefer-vp9-sort', 'mtime-by-default',
+                'no-fused-postprocessors',
             }, 'aliases': {
                 'youtube-dl': ['all', '-multistreams', '-playlist-match-filter', '-manifest-filesize-approx', '-allow-unsafe-ext', '-prefer-vp9-sort'],
                 'youtube-dlc': ['all', '-no-youtube-channel-redirect', '-no-live-chat', '-playlist-match-filter', '-manifest-filesize-approx', '-allow-unsafe-ext', '-prefer-vp9-sort'],
@@ -953,6 +954,17 @@ def _preset_alias_callback(option, opt_str, value, parser):
             'Containers that may be used when merging formats, separated by "/", e.g. "mp4/mkv". '
             'Ignored if no merge is required. '
             f'(currently supported: {", ".join(sorted(FFmpegMergerPP.SUPPORTED_EXTS))})'))
+    video_format.add_option(
+        '--stream-merge',
+        action='store_true', dest='stream_merge', default=False,
+        help=(
+            'Merge the formats with ffmpeg while they are downloaded, instead of merging the downloaded files. '
+            'Falls back to merging the files when a format cannot be read without seeking. '
+            'Not supported on Windows'))
+    video_format.add_option(
+        '--no-stream-merge',
+        action='store_false', dest='stream_merge',
+        help='Download the formats into separate files before merging them (default)')
     video_format.add_option(
         '--allow-unplayable-formats',
         action='store_true', dest='allow_unplayable_formats', default=False,
@@ -1006,6 +1018,12 @@ def _preset_alias_callback(option, opt_str, value, parser):
         '-N', '--concurrent-fragments',
         dest='concurrent_fragment_downloads', metavar='N', default=1, type=int,
         help='Number of fragments of a dash/hlsnative video that should be downloaded concurrently (default is %default)')
+    downloader.add_option(
+        '--http-connections',
+        dest='http_connections', metavar='N', default=1, type=int,
+        help=(
+            'Number of connections over which a file downloaded with the native HTTP downloader is fetched concurrently, '
+            'each downloading a range of the file. Only used if the server supports range requests (default is %default)'))
     downloader.add_option(
         '-r', '--limit-rate', '--rate-limit',
         dest='ratelimit', metavar='RATE',
@@ -1055,6 +1073,12 @@ def _preset_alias_callback(option, opt_str, value, parser):
         '--no-keep-fragments',
         action='store_false', dest='keep_fragments',
         help='Delete downloaded fragments after downloading is finished (default)')
+    downloader.add_option(
+        '--fragment-buffer-size',
+        dest='fragment_buffer_size', metavar='SIZE', default=None,
+        help=(
+            'Download fragments of dash/hlsnative videos into memory instead of temporary files, e.g. 10M. '
+            'Fragments larger than SIZE are written to disk. Has no effect with --keep-fragments (default is disabled)'))
     downloader.add_option(
         '--buffer-size',
         dest='buffersize', metavar='SIZE', default='1024',
@@ -1119,6 +1143,16 @@ def _preset_alias_callback(option, opt_str, value, parser):
         help=(
             'Do not use the mpegts container for HLS videos. '
             'This is default when not downloading live streams'))
+    downloader.add_option(
+        '--hls-persistent-cache',
+        action='store_true', dest='hls_persistent_cache', default=False,
+        help=(
+            'Store the decryption keys and initialization segments of HLS formats in the cache directory, '
+            'so that they are not fetched again when the download is restarted'))
+    downloader.add_option(
+        '--no-hls-persistent-cache',
+        action='store_false', dest='hls_persistent_cache',
+        help='Only keep the HLS keys and initialization segments in memory (default)')
     downloader.add_option(
         '--download-sections',
         metavar='REGEX', dest='download_ranges', action='append',
@@ -1158,6 +1192,19 @@ def _preset_alias_callback(option, opt_str, value, parser):
             'For ffmpeg, arguments can be passed to different positions using the same syntax as --postprocessor-args. '
             'You can use this option multiple times to give different arguments to different downloaders '
             '(Alias: --external-downloader-args)'))
+    downloader.add_option(
+        '--aria2c-rpc',
+        metavar='URL', dest='aria2c_rpc', default=None,
+        help=(
+            'Submit the downloads of aria2c to one aria2c daemon through its JSON-RPC interface, '
+            'instead of running aria2c for each download. '
+            'URL is the RPC endpoint of a running daemon (e.g. "http://localhost:6800/jsonrpc"), '
+            'or "auto" to start one that is shared by all the downloads. '
+            'The daemon must be able to write to the output directory'))
+    downloader.add_option(
+        '--aria2c-rpc-secret',
+        metavar='SECRET', dest='aria2c_rpc_secret', default=None,
+        help='Secret authorization token of the aria2c daemon given with --aria2c-rpc')
     downloader.add_option(
         '--selenium-browner-timeout', dest='selenium_browner_timeout', metavar='NUMBER', default=20, type='float')
     downloader.add_option(
@@ -1521,6 +1568,16 @@ def _preset_alias_callback(option, opt_str, value, parser):
         '--no-clean-info-json', '--no-clean-infojson',
         action='store_false', dest='clean_infojson',
         help='Write all fields to the infojson')
+    filesystem.add_option(
+        '--compact-fragments',
+        action='store_true', dest='compact_fragments', default=False,
+        help=(
+            'Write the fragments of the formats as a compact table in the infojson and the JSON output. '
+            'Such infojsons can only be read back by --load-info-json'))
+    filesystem.add_option(
+        '--no-compact-fragments',
+        action='store_false', dest='compact_fragments',
+        help='Write the fragments of the formats as a list of objects (default)')
     filesystem.add_option(
         '--write-comments', '--get-comments',
         action='store_true', dest='getcomments', default=False,
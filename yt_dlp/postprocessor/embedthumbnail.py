@@ -4,7 +4,7 @@
 import subprocess
 
 from .common import PostProcessor
-from .ffmpeg import FFmpegPostProcessor, FFmpegThumbnailsConvertorPP
+from .ffmpeg import FFmpegPostProcessor, FFmpegStep, FFmpegThumbnailsConvertorPP
 from ..compat import imghdr
 from ..dependencies import mutagen
 from ..utils import (
@@ -28,6 +28,7 @@ class EmbedThumbnailPPError(PostProcessingError):
 
 
 class EmbedThumbnailPP(FFmpegPostProcessor):
+    _FUSABLE = True
 
     def __init__(self, downloader=None, already_have_thumbnail=False):
         FFmpegPostProcessor.__init__(self, downloader)
@@ -84,19 +85,15 @@ def run(self, info):
             thumbnail_filename = convertor.convert_thumbnail(thumbnail_filename, 'png')
             thumbnail_ext = 'png'
 
-        mtime = os.stat(filename).st_mtime
+        def delete_thumbnails():
+            converted = original_thumbnail != thumbnail_filename
+            self._delete_downloaded_files(
+                thumbnail_filename if converted or not self._already_have_thumbnail else None,
+                original_thumbnail if converted and not self._already_have_thumbnail else None,
+                info=info)
 
-        success = True
-        if info['ext'] == 'mp3':
-            options = [
-                '-c', 'copy', '-map', '0:0', '-map', '1:0', '-write_id3v1', '1', '-id3v2_version', '3',
-                '-metadata:s:v', 'title=Album cover', '-metadata:s:v', 'comment=Cover (front)']
-
-            self._report_run('ffmpeg', filename)
-            self.run_ffmpeg_multiple_files([filename, thumbnail_filename], temp_filename, options)
-
-        elif info['ext'] in ['mkv', 'mka']:
-            options = list(self.stream_copy_opts())
+        if info['ext'] in ['mkv', 'mka']:
+            options = []
 
             mimetype = f'image/{thumbnail_ext.replace("jpg", "jpeg")}'
             old_stream, new_stream = self.get_stream_number(
@@ -110,7 +107,23 @@ def run(self, info):
                 f'-metadata:s:{new_stream}', f'filename=cover.{thumbnail_ext}'])
 
             self._report_run('ffmpeg', filename)
-            self.run_ffmpeg(filename, temp_filename, options)
+            self._run_step(filename, FFmpegStep(
+                self, options, changes_streams=True, keep_mtime=True, cleanup=delete_thumbnails))
+            return [], info
+
+        # The other methods read the file directly
+        if self._fused_pass:
+            self._fused_pass.sync(filename)
+        mtime = os.stat(filename).st_mtime
+
+        success = True
+        if info['ext'] == 'mp3':
+            options = [
+                '-c', 'copy', '-map', '0:0', '-map', '1:0', '-write_id3v1', '1', '-id3v2_version', '3',
+                '-metadata:s:v', 'title=Album cover', '-metadata:s:v', 'comment=Cover (front)']
+
+            self._report_run('ffmpeg', filename)
+            self.run_ffmpeg_multiple_files([filename, thumbnail_filename], temp_filename, options)
 
         elif info['ext'] in ['m4a', 'mp4', 'm4v', 'mov']:
             prefer_atomicparsley = 'embed-thumbnail-atomicparsley' in self.get_param('compat_opts', [])
@@ -223,11 +236,9 @@ def run(self, info):
 
         if success and temp_filename != filename:
             os.replace(temp_filename, filename)
+        # mutagen modifies the file in place
+        self._invalidate_probe(filename)
 
         self.try_utime(filename, mtime, mtime)
-        converted = original_thumbnail != thumbnail_filename
-        self._delete_downloaded_files(
-            thumbnail_filename if converted or not self._already_have_thumbnail else None,
-            original_thumbnail if converted and not self._already_have_thumbnail else None,
-            info=info)
+        delete_thumbnails()
         return [], info
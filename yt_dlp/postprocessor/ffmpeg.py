@@ -1,11 +1,14 @@
 import collections
+import contextlib
 import contextvars
+import copy
 import functools
 import itertools
 import json
 import os
 import re
 import subprocess
+import threading
 import time
 
 from .common import PostProcessor
@@ -85,6 +88,10 @@ class FFmpegPostProcessorError(PostProcessingError):
 
 class FFmpegPostProcessor(PostProcessor):
     _ffmpeg_location = contextvars.ContextVar('ffmpeg_location', default=None)
+    # Whether the file is only rewritten with _run_step, so that a FFmpegFusedPP can run it
+    _FUSABLE = False
+    # The FFmpegFusedPP that is running this postprocessor
+    _fused_pass = None
 
     def __init__(self, downloader=None):
         PostProcessor.__init__(self, downloader)
@@ -129,6 +136,11 @@ def _determine_executables(self):
 
     _version_cache, _features_cache = {None: None}, {}
 
+    # Output of ffprobe by path, along with the state of the file it was taken from
+    _probe_cache = collections.OrderedDict()
+    _probe_cache_lock = threading.Lock()
+    _PROBE_CACHE_SIZE = 64
+
     def _get_ffmpeg_version(self, prog):
         path = self._paths.get(prog)
         if path in self._version_cache:
@@ -232,6 +244,13 @@ def check_version(self):
     def get_audio_codec(self, path):
         if not self.probe_available and not self.available:
             raise PostProcessingError('ffprobe and ffmpeg not found. Please install or provide the path using --ffmpeg-location')
+        if self.probe_basename == 'ffprobe':
+            try:
+                streams = self.get_metadata_object(path)['streams']
+            except (PostProcessingError, OSError):
+                return None
+            return next((
+                stream.get('codec_name') for stream in streams if stream.get('codec_type') == 'audio'), None)
         try:
             if self.probe_available:
                 cmd = [
@@ -267,17 +286,46 @@ def get_audio_codec(self, path):
         return None
 
     def get_metadata_object(self, path, opts=[]):
+        """
+        ffprobe output for the format, streams and chapters of a file
+
+        Without opts, the result is cached until the file is changed or replaced,
+        so that the postprocessors of a video share a single probe of each file
+        """
         if self.probe_basename != 'ffprobe':
             if self.probe_available:
                 self.report_warning('Only ffprobe is supported for metadata extraction')
             raise PostProcessingError('ffprobe not found. Please install or provide the path using --ffmpeg-location')
         self.check_version()
 
+        if self._fused_pass:
+            self._fused_pass.sync(path, streams_only=True)
+        if opts:
+            return self._run_ffprobe(path, opts)
+        key = os.path.realpath(path)
+        stat = os.stat(path)
+        # The ctime also changes when a file is modified in place and its mtime is restored
+        state = (self.probe_executable, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+        with self._probe_cache_lock:
+            cached = self._probe_cache.get(key)
+            if cached and cached[0] == state:
+                self._probe_cache.move_to_end(key)
+                return copy.deepcopy(cached[1])
+        metadata = self._run_ffprobe(path)
+        with self._probe_cache_lock:
+            self._probe_cache[key] = state, metadata
+            self._probe_cache.move_to_end(key)
+            while len(self._probe_cache) > self._PROBE_CACHE_SIZE:
+                self._probe_cache.popitem(last=False)
+        return copy.deepcopy(metadata)
+
+    def _run_ffprobe(self, path, opts=()):
         cmd = [
             self.probe_executable,
             encodeArgument('-hide_banner'),
             encodeArgument('-show_format'),
             encodeArgument('-show_streams'),
+            encodeArgument('-show_chapters'),
             encodeArgument('-print_format'),
             encodeArgument('json'),
         ]
@@ -285,8 +333,18 @@ def get_metadata_object(self, path, opts=[]):
         cmd += opts
         cmd.append(self._ffmpeg_filename_argument(path))
         self.write_debug(f'ffprobe command line: {shell_quote(cmd)}')
-        stdout, _, _ = Popen.run(cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        return json.loads(stdout)
+        stdout, stderr, _ = Popen.run(cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+        try:
+            return json.loads(stdout)
+        except ValueError:
+            raise FFmpegPostProcessorError(
+                (stderr.strip().splitlines() or ['ffprobe returned invalid output'])[-1])
+
+    @classmethod
+    def _invalidate_probe(cls, path):
+        """Forget the cached ffprobe output of a file that was rewritten"""
+        with cls._probe_cache_lock:
+            cls._probe_cache.pop(os.path.realpath(path), None)
 
     def get_stream_number(self, path, keys, value):
         streams = self.get_metadata_object(path)['streams']
@@ -325,10 +383,27 @@ def run_ffmpeg_multiple_files(self, input_paths, out_path, opts, **kwargs):
 
     def real_run_ffmpeg(self, input_path_opts, output_path_opts, *, expected_retcodes=(0,)):
         self.check_version()
+        if self._fused_pass:
+            for path, _ in input_path_opts:
+                self._fused_pass.sync(path)
 
         oldest_mtime = min(
             os.stat(path).st_mtime for path, _ in input_path_opts if path)
 
+        cmd = self._ffmpeg_command(input_path_opts, output_path_opts)
+        self.write_debug(f'ffmpeg command line: {shell_quote(cmd)}')
+        _, stderr, returncode = Popen.run(
+            cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+        if returncode not in variadic(expected_retcodes):
+            self.write_debug(stderr)
+            raise FFmpegPostProcessorError(stderr.strip().splitlines()[-1])
+        for out_path, _ in output_path_opts:
+            if out_path:
+                self._invalidate_probe(out_path)
+                self.try_utime(out_path, oldest_mtime, oldest_mtime)
+        return stderr
+
+    def _ffmpeg_command(self, input_path_opts, output_path_opts):
         cmd = [self.executable, encodeArgument('-y')]
         # avconv does not have repeat option
         if self.basename == 'ffmpeg':
@@ -351,21 +426,18 @@ def make_args(file, args, name, number):
             cmd += itertools.chain.from_iterable(
                 make_args(path, list(opts), arg_type, i + 1)
                 for i, (path, opts) in enumerate(path_opts) if path)
-
-        self.write_debug(f'ffmpeg command line: {shell_quote(cmd)}')
-        _, stderr, returncode = Popen.run(
-            cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        if returncode not in variadic(expected_retcodes):
-            self.write_debug(stderr)
-            raise FFmpegPostProcessorError(stderr.strip().splitlines()[-1])
-        for out_path, _ in output_path_opts:
-            if out_path:
-                self.try_utime(out_path, oldest_mtime, oldest_mtime)
-        return stderr
+        return cmd
 
     def run_ffmpeg(self, path, out_path, opts, **kwargs):
         return self.run_ffmpeg_multiple_files([path], out_path, opts, **kwargs)
 
+    def _run_step(self, path, step):
+        """Replace the file with the output of a FFmpegStep, or hold it back for the fused pass that is running"""
+        if self._fused_pass:
+            self._fused_pass.add(path, step)
+        else:
+            FFmpegStep.run(path, [step])
+
     @staticmethod
     def _ffmpeg_filename_argument(fn):
         # Always use 'file:' because the filename may contain ':' (ffmpeg
@@ -429,6 +501,189 @@ def _concat_spec(cls, in_files, concat_opts=None):
                     yield f'{directive} {opts[directive]}\n'
 
 
+class FFmpegStep:
+    """
+    A stream copy of a media file, with more inputs and options, that replaces the file
+
+    @param opts             The output options, or a function that returns them
+                            given the index of the first of the inputs
+    @param inputs           Additional input files
+    @param copy_opts        Options that select and copy the streams (default: stream_copy_opts)
+    @param bsfs             Bitstream filters, as (stream type or None, filter) tuples
+    @param changes_streams  Whether streams are added or removed
+    @param retimes          Whether the timestamps of the output are changed
+    @param keep_mtime       Whether the file keeps its mtime, instead of that of the oldest input
+    @param cleanup          Function to call once the file is replaced
+    """
+
+    def __init__(self, pp, opts, *, inputs=(), copy_opts=None, bsfs=(),
+                 changes_streams=False, retimes=False, keep_mtime=False, cleanup=None):
+        self.pp = pp
+        self.opts = opts if callable(opts) else lambda _: opts
+        self.inputs = list(filter(None, inputs))
+        self.copy_opts = list(FFmpegPostProcessor.stream_copy_opts() if copy_opts is None else copy_opts)
+        self.bsfs = list(bsfs)
+        self.changes_streams = changes_streams
+        self.retimes = retimes
+        self.keep_mtime = keep_mtime
+        self.cleanup = cleanup
+
+    @staticmethod
+    def _merge_copy_opts(a, b):
+        """@returns copy options that fit the steps with copy options a and b, or None"""
+        if a == b:
+            return a
+        # The subtitle codec only matters to the steps that add subtitles
+        plain = list(FFmpegPostProcessor.stream_copy_opts())
+        for x, y in ((a, b), (b, a)):
+            if x == plain and y == [*plain, '-c:s', 'mov_text']:
+                return y
+        return None
+
+    def can_follow(self, steps):
+        """Whether this step can be run in the same command as the steps"""
+        if self.retimes and any(step.inputs for step in steps):
+            return False
+        if self.inputs and any(step.retimes for step in steps):
+            return False
+        return functools.reduce(
+            lambda a, b: None if a is None else self._merge_copy_opts(a, b),
+            (step.copy_opts for step in steps), self.copy_opts) is not None
+
+    @staticmethod
+    def _bsf_opts(bsfs):
+        if all(stream_type is None for stream_type, _ in bsfs):
+            if bsfs:
+                yield from ('-bsf', ','.join(bsf for _, bsf in bsfs))
+            return
+        # A filter for a stream type replaces the filters given for all streams
+        for stream_type in ('v', 'a', 's'):
+            filters = [bsf for spec, bsf in bsfs if spec in (None, stream_type)]
+            if filters:
+                yield from (f'-bsf:{stream_type}', ','.join(filters))
+
+    @classmethod
+    def run(cls, path, steps):
+        """Replace the file with the output of the steps, using a single ffmpeg command"""
+        inputs, opts, bsfs = [path], [], []
+        for step in steps:
+            opts.extend(step.opts(len(inputs)))
+            inputs.extend(step.inputs)
+            bsfs.extend(step.bsfs)
+        copy_opts = functools.reduce(cls._merge_copy_opts, (step.copy_opts for step in steps))
+
+        mtime = None
+        if any(step.keep_mtime for step in steps):
+            mtime = min(os.stat(input_path).st_mtime for input_path in (
+                path, *itertools.chain.from_iterable(step.inputs for step in steps if not step.keep_mtime)))
+
+        temp_filename = prepend_extension(path, 'temp')
+        steps[0].pp.run_ffmpeg_multiple_files(inputs, temp_filename, [*copy_opts, *cls._bsf_opts(bsfs), *opts])
+        os.replace(temp_filename, path)
+        if mtime is not None:
+            steps[0].pp.try_utime(path, mtime, mtime)
+        for step in steps:
+            if step.cleanup:
+                step.cleanup()
+
+
+class FFmpegFusedPP(FFmpegPostProcessor):
+    """
+    Runs consecutive postprocessors so that a single ffmpeg command rewrites the file
+
+    The postprocessors run as usual, but the FFmpegSteps that they run are held back
+    and merged. The pending steps are run when a step cannot follow them, before
+    the file is read or written otherwise, and after the last postprocessor
+    """
+
+    def __init__(self, downloader, pps):
+        super().__init__(downloader)
+        self._pps = pps
+        self._path, self._steps = None, []
+
+    @classmethod
+    def fuse(cls, downloader, pps):
+        """@returns pps, with each run of fusable postprocessors replaced by a FFmpegFusedPP"""
+        if 'no-fused-postprocessors' in downloader.params.get('compat_opts', []):
+            return pps
+        pp_args = downloader.params.get('postprocessor_args')
+
+        def fusable(pp):
+            if not (isinstance(pp, FFmpegPostProcessor) and pp._FUSABLE):
+                return False
+            # The arguments given for one postprocessor would be used for all of them
+            return not (isinstance(pp_args, dict)
+                        and any(key.partition('+')[0] == pp.pp_key().lower() for key in pp_args))
+
+        result = []
+        for is_fusable, group in itertools.groupby(pps, fusable):
+            group = list(group)
+            if is_fusable and len(group) > 1:
+                result.append(cls(downloader, group))
+            else:
+                result.extend(group)
+        return result
+
+    def add(self, path, step):
+        if self._steps and not (self._is_pending(path) and step.can_follow(self._steps)):
+            self.flush()
+        self._path = path
+        self._steps.append(step)
+
+    def _is_pending(self, path):
+        return bool(self._steps) and os.path.realpath(path) == os.path.realpath(self._path)
+
+    def sync(self, path, streams_only=False):
+        """
+        Run the pending steps before the file is read
+
+        With streams_only, they are only run if they change the streams or their timestamps
+        """
+        if not self._is_pending(path):
+            return
+        if streams_only and not any(step.changes_streams or step.retimes for step in self._steps):
+            return
+        self.flush()
+
+    def flush(self):
+        steps, self._steps = self._steps, []
+        if not steps:
+            return
+        if len(steps) == 1:
+            return FFmpegStep.run(self._path, steps)
+        pp_keys = ', '.join(step.pp.pp_key() for step in steps)
+        self.write_debug(f'Running {pp_keys} in a single ffmpeg command')
+        try:
+            FFmpegStep.run(self._path, steps)
+        except FFmpegPostProcessorError as e:
+            self.report_warning(f'Unable to run {pp_keys} in a single ffmpeg command: {e}; running them one at a time')
+            for step in steps:
+                FFmpegStep.run(self._path, [step])
+
+    def _hook_progress(self, status, info_dict):
+        # The postprocessors that are run report their own progress
+        pass
+
+    def run(self, info):
+        files_to_delete = []
+        for pp in self._pps:
+            pp._fused_pass = self
+            try:
+                deleted, info = pp.run(info)
+            except PostProcessingError as e:
+                # The changes of the previous postprocessors are kept
+                self.flush()
+                if self.get_param('ignoreerrors') is not True:
+                    raise
+                self._downloader.report_error(e)
+                continue
+            finally:
+                pp._fused_pass = None
+            files_to_delete.extend(deleted)
+        self.flush()
+        return files_to_delete, info
+
+
 class FFmpegExtractAudioPP(FFmpegPostProcessor):
     COMMON_AUDIO_EXTS = (*MEDIA_EXTENSIONS.common_audio, 'wma')
     SUPPORTED_EXTS = tuple(ACODECS.keys())
@@ -580,6 +835,7 @@ def _options(target_ext):
 
 class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
     SUPPORTED_EXTS = ('mp4', 'mov', 'm4a', 'webm', 'mkv', 'mka')
+    _FUSABLE = True
 
     def __init__(self, downloader=None, already_have_subtitle=False):
         super().__init__(downloader)
@@ -634,32 +890,29 @@ def run(self, info):
         if not sub_langs:
             return [], info
 
-        input_files = [filename, *sub_filenames]
-
-        opts = [
-            *self.stream_copy_opts(ext=info['ext']),
+        def opts(first_input):
             # Don't copy the existing subtitles, we may be running the
             # postprocessor a second time
-            '-map', '-0:s',
-        ]
-        for i, (lang, name) in enumerate(zip(sub_langs, sub_names, strict=True)):
-            opts.extend(['-map', f'{i + 1}:0'])
-            lang_code = ISO639Utils.short2long(lang) or lang
-            opts.extend([f'-metadata:s:s:{i}', f'language={lang_code}'])
-            if name:
-                opts.extend([f'-metadata:s:s:{i}', f'handler_name={name}',
-                             f'-metadata:s:s:{i}', f'title={name}'])
+            yield from ('-map', '-0:s')
+            for i, (lang, name) in enumerate(zip(sub_langs, sub_names, strict=True)):
+                yield from ('-map', f'{first_input + i}:0')
+                lang_code = ISO639Utils.short2long(lang) or lang
+                yield from (f'-metadata:s:s:{i}', f'language={lang_code}')
+                if name:
+                    yield from (f'-metadata:s:s:{i}', f'handler_name={name}',
+                                f'-metadata:s:s:{i}', f'title={name}')
 
-        temp_filename = prepend_extension(filename, 'temp')
         self.to_screen(f'Embedding subtitles in "{filename}"')
-        self.run_ffmpeg_multiple_files(input_files, temp_filename, opts)
-        os.replace(temp_filename, filename)
+        self._run_step(filename, FFmpegStep(
+            self, opts, inputs=sub_filenames, copy_opts=self.stream_copy_opts(ext=info['ext']),
+            changes_streams=True))
 
         files_to_delete = [] if self._already_have_subtitle else sub_filenames
         return files_to_delete, info
 
 
 class FFmpegMetadataPP(FFmpegPostProcessor):
+    _FUSABLE = True
 
     def __init__(self, downloader, add_metadata=True, add_chapters=True, add_infojson='if_exists'):
         FFmpegPostProcessor.__init__(self, downloader)
@@ -681,35 +934,41 @@ def run(self, info):
         files_to_delete, options = [], []
         if self._add_chapters and info.get('chapters'):
             metadata_filename = replace_extension(filename, 'meta')
-            options.extend(self._get_chapter_opts(info['chapters'], metadata_filename))
+            self._write_chapters(info['chapters'], metadata_filename)
             files_to_delete.append(metadata_filename)
         if self._add_metadata:
             options.extend(self._get_metadata_opts(info))
 
+        changes_streams = False
         if self._add_infojson:
             if info['ext'] in ('mkv', 'mka'):
                 infojson_filename = info.get('infojson_filename')
-                options.extend(self._get_infojson_opts(info, infojson_filename))
+                infojson_opts = list(self._get_infojson_opts(info, infojson_filename))
+                options.extend(infojson_opts)
+                changes_streams = bool(infojson_opts)
                 if not infojson_filename:
                     files_to_delete.append(info.get('infojson_filename'))
             elif self._add_infojson is True:
                 self.to_screen('The info-json can only be attached to mkv/mka files')
 
-        if not options:
+        if not (metadata_filename or options):
             self.to_screen('There isn\'t any metadata to add')
             return [], info
 
-        temp_filename = prepend_extension(filename, 'temp')
+        def opts(first_input):
+            if metadata_filename:
+                yield from ('-map_metadata', str(first_input))
+            for opt in options:
+                yield from opt
+
         self.to_screen(f'Adding metadata to "{filename}"')
-        self.run_ffmpeg_multiple_files(
-            (filename, metadata_filename), temp_filename,
-            itertools.chain(self._options(info['ext']), *options))
-        self._delete_downloaded_files(*files_to_delete)
-        os.replace(temp_filename, filename)
+        self._run_step(filename, FFmpegStep(
+            self, opts, inputs=[metadata_filename], copy_opts=self._options(info['ext']),
+            changes_streams=changes_streams, cleanup=lambda: self._delete_downloaded_files(*files_to_delete)))
         return [], info
 
     @staticmethod
-    def _get_chapter_opts(chapters, metadata_filename):
+    def _write_chapters(chapters, metadata_filename):
         with open(metadata_filename, 'w', encoding='utf-8') as f:
             def ffmpeg_escape(text):
                 return re.sub(r'([\\=;#\n])', r'\\\1', text)
@@ -723,7 +982,6 @@ def ffmpeg_escape(text):
                 if chapter_title:
                     metadata_file_content += f'title={ffmpeg_escape(chapter_title)}\n'
             f.write(metadata_file_content)
-        yield ('-map_metadata', '1')
 
     def _get_metadata_opts(self, info):
         meta_prefix = 'meta'
@@ -795,7 +1053,9 @@ def _get_infojson_opts(self, info, infofn):
             if not self._downloader._ensure_dir_exists(infofn):
                 return
             self.write_debug(f'Writing info-json to: {infofn}')
-            write_json_file(self._downloader.sanitize_info(info, self.get_param('clean_infojson', True)), infofn)
+            write_json_file(self._downloader.sanitize_info(
+                info, self.get_param('clean_infojson', True),
+                compact_fragments=self.get_param('compact_fragments')), infofn)
             info['infojson_filename'] = infofn
 
         old_stream, new_stream = self.get_stream_number(info['filepath'], ('tags', 'mimetype'), 'application/json')
@@ -812,26 +1072,118 @@ def _get_infojson_opts(self, info, infofn):
 
 class FFmpegMergerPP(FFmpegPostProcessor):
     SUPPORTED_EXTS = MEDIA_EXTENSIONS.common_video
+    # Unless they are fragmented, files in these containers may have their index at the end
+    _UNSTREAMABLE_EXTS = ('mp4', 'm4a', 'm4v', 'mov', '3gp')
 
     @PostProcessor._restrict_to(images=False)
     def run(self, info):
         filename = info['filepath']
         temp_filename = prepend_extension(filename, 'temp')
+        args = self._merge_args(info['requested_formats'], lambda fmt: self.get_audio_codec(fmt['filepath']))
+        self.to_screen(f'Merging formats into "{filename}"')
+        self.run_ffmpeg_multiple_files(info['__files_to_merge'], temp_filename, args)
+        os.rename(temp_filename, filename)
+        return info['__files_to_merge'], info
+
+    @staticmethod
+    def _merge_args(formats, get_audio_codec):
         args = ['-c', 'copy']
         audio_streams = 0
-        for (i, fmt) in enumerate(info['requested_formats']):
+        for (i, fmt) in enumerate(formats):
             if fmt.get('acodec') != 'none':
                 args.extend(['-map', f'{i}:a:0'])
-                aac_fixup = fmt['protocol'].startswith('m3u8') and self.get_audio_codec(fmt['filepath']) == 'aac'
+                aac_fixup = fmt['protocol'].startswith('m3u8') and get_audio_codec(fmt) == 'aac'
                 if aac_fixup:
                     args.extend([f'-bsf:a:{audio_streams}', 'aac_adtstoasc'])
                 audio_streams += 1
             if fmt.get('vcodec') != 'none':
                 args.extend(['-map', f'{i}:v:0'])
-        self.to_screen(f'Merging formats into "{filename}"')
-        self.run_ffmpeg_multiple_files(info['__files_to_merge'], temp_filename, args)
-        os.rename(temp_filename, filename)
-        return info['__files_to_merge'], info
+        return args
+
+    @staticmethod
+    def _format_audio_codec(fmt):
+        acodec = fmt.get('acodec')
+        return 'aac' if acodec and re.match(r'(?:mp4a|aac)\b', acodec) else acodec
+
+    def can_stream(self, info):
+        """Whether the requested formats can be merged while they are downloaded, reading each from a pipe"""
+        # The pipes are passed to ffmpeg by their file descriptors
+        if os.name == 'nt' or not self.available:
+            return False
+        for fmt in info['requested_formats']:
+            if (fmt.get('protocol') in ('http', 'https') and fmt.get('ext') in self._UNSTREAMABLE_EXTS
+                    and not (fmt.get('container') or '').endswith('_dash')):
+                return False
+            # Otherwise, whether aac_adtstoasc is needed is only known from the downloaded file
+            if fmt.get('protocol', '').startswith('m3u8') and fmt.get('acodec') != 'none' and not fmt.get('acodec'):
+                return False
+        return True
+
+    def stream(self, info, filename, download):
+        """
+        Merge the requested formats into filename while they are downloaded
+
+        download(fmt, path) is called in a thread for each format, and should write
+        it into path, which is a pipe read by ffmpeg. It returns whether it succeeded
+        @returns whether all the downloads succeeded
+        """
+        self.check_version()
+        formats = info['requested_formats']
+        temp_filename = prepend_extension(filename, 'temp')
+        pipes = [os.pipe() for _ in formats]
+        cmd = self._ffmpeg_command(
+            [(f'/dev/fd/{read_fd}', []) for read_fd, _ in pipes],
+            [(temp_filename, self._merge_args(formats, self._format_audio_codec))])
+        self.to_screen(f'Merging formats into "{filename}" while they are downloaded')
+        self.write_debug(f'ffmpeg command line: {shell_quote(cmd)}')
+        try:
+            proc = Popen(
+                cmd, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE,
+                pass_fds=[read_fd for read_fd, _ in pipes])
+        except BaseException:
+            for _, write_fd in pipes:
+                os.close(write_fd)
+            raise
+        finally:
+            # Once ffmpeg exits, writing into the pipes fails instead of blocking
+            for read_fd, _ in pipes:
+                os.close(read_fd)
+
+        results, errors, killed = [False] * len(formats), [], threading.Event()
+
+        def run(i, write_fd):
+            try:
+                results[i] = download(formats[i], f'/dev/fd/{write_fd}')
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                os.close(write_fd)
+                if not results[i] and proc.poll() is None:
+                    # ffmpeg would otherwise keep waiting for the rest of the data
+                    killed.set()
+                    proc.kill()
+
+        threads = [threading.Thread(target=run, args=(i, write_fd), daemon=True)
+                   for i, (_, write_fd) in enumerate(pipes)]
+        with proc:
+            for thread in threads:
+                thread.start()
+            _, stderr = proc.communicate_or_kill()
+        for thread in threads:
+            thread.join()
+
+        if proc.returncode == 0 and not errors and all(results):
+            os.replace(temp_filename, filename)
+            return True
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_filename)
+        # When ffmpeg fails by itself, the downloads fail because the pipes are closed
+        if proc.returncode != 0 and not killed.is_set():
+            self.write_debug(stderr)
+            raise FFmpegPostProcessorError(stderr.strip().splitlines()[-1])
+        if errors:
+            raise errors[0]
+        return False
 
     def can_merge(self):
         # TODO: figure out merge-capable ffmpeg version
@@ -839,13 +1191,11 @@ def can_merge(self):
 
 
 class FFmpegFixupPostProcessor(FFmpegPostProcessor):
-    def _fixup(self, msg, filename, options):
-        temp_filename = prepend_extension(filename, 'temp')
+    _FUSABLE = True
 
+    def _fixup(self, msg, filename, options, **kwargs):
         self.to_screen(f'{msg} of "{filename}"')
-        self.run_ffmpeg(filename, temp_filename, options)
-
-        os.replace(temp_filename, filename)
+        self._run_step(filename, FFmpegStep(self, options, **kwargs))
 
 
 class FFmpegFixupStretchedPP(FFmpegFixupPostProcessor):
@@ -853,8 +1203,7 @@ class FFmpegFixupStretchedPP(FFmpegFixupPostProcessor):
     def run(self, info):
         stretched_ratio = info.get('stretched_ratio')
         if stretched_ratio not in (None, 1):
-            self._fixup('Fixing aspect ratio', info['filepath'], [
-                *self.stream_copy_opts(), '-aspect', f'{stretched_ratio:f}'])
+            self._fixup('Fixing aspect ratio', info['filepath'], ['-aspect', f'{stretched_ratio:f}'])
         return [], info
 
 
@@ -862,7 +1211,7 @@ class FFmpegFixupM4aPP(FFmpegFixupPostProcessor):
     @PostProcessor._restrict_to(images=False, video=False)
     def run(self, info):
         if info.get('container') == 'm4a_dash':
-            self._fixup('Correcting container', info['filepath'], [*self.stream_copy_opts(), '-f', 'mp4'])
+            self._fixup('Correcting container', info['filepath'], ['-f', 'mp4'])
         return [], info
 
 
@@ -881,11 +1230,10 @@ def _needs_fixup(self, info):
     @PostProcessor._restrict_to(images=False)
     def run(self, info):
         if all(self._needs_fixup(info)):
-            args = ['-f', 'mp4']
+            bsfs = []
             if self.get_audio_codec(info['filepath']) == 'aac':
-                args.extend(['-bsf:a', 'aac_adtstoasc'])
-            self._fixup('Fixing MPEG-TS in MP4 container', info['filepath'], [
-                *self.stream_copy_opts(), *args])
+                bsfs.append(('a', 'aac_adtstoasc'))
+            self._fixup('Fixing MPEG-TS in MP4 container', info['filepath'], ['-f', 'mp4'], bsfs=bsfs)
         return [], info
 
 
@@ -903,10 +1251,11 @@ def run(self, info):
             self.report_warning(
                 'A re-encode is needed to fix timestamps in older versions of ffmpeg. '
                 'Please install ffmpeg 4.4 or later to fixup without re-encoding')
-            opts = ['-vf', 'setpts=PTS-STARTPTS']
+            self._fixup('Fixing frame timestamp', info['filepath'], ['-vf', 'setpts=PTS-STARTPTS', '-ss', self.trim],
+                        copy_opts=self.stream_copy_opts(False), retimes=True)
         else:
-            opts = ['-c', 'copy', '-bsf', 'setts=ts=TS-STARTPTS']
-        self._fixup('Fixing frame timestamp', info['filepath'], [*opts, *self.stream_copy_opts(False), '-ss', self.trim])
+            self._fixup('Fixing frame timestamp', info['filepath'], ['-ss', self.trim],
+                        bsfs=[(None, 'setts=ts=TS-STARTPTS')], retimes=True)
         return [], info
 
 
@@ -915,7 +1264,7 @@ class FFmpegCopyStreamPP(FFmpegFixupPostProcessor):
 
     @PostProcessor._restrict_to(images=False)
     def run(self, info):
-        self._fixup(self.MESSAGE, info['filepath'], self.stream_copy_opts())
+        self._fixup(self.MESSAGE, info['filepath'], [])
         return [], info
 
 
@@ -144,7 +144,9 @@ def _resolve_address(self, destaddr, default, use_remote_dns, family=None):
         if use_remote_dns and self._proxy.remote_dns:
             return 0, default
         else:
-            res = socket.getaddrinfo(destaddr, None, family=family or 0)
+            from .networking._helper import dns_cache  # Avoid circular import
+
+            res = dns_cache.getaddrinfo(destaddr, None, family=family or 0)
             f, _, _, _, ipaddr = res[0]
             return f, socket.inet_pton(f, ipaddr[0])
 
@@ -1,5 +1,7 @@
+import array
 import base64
 import binascii
+import bisect
 import calendar
 import codecs
 import collections
@@ -1604,7 +1606,7 @@ class locked_file:
     locked = False
 
     def __init__(self, filename, mode, block=True, encoding=None):
-        if mode not in {'r', 'rb', 'a', 'ab', 'w', 'wb'}:
+        if mode not in {'r', 'rb', 'r+', 'r+b', 'a', 'ab', 'w', 'wb'}:
             raise NotImplementedError(mode)
         self.mode, self.block = mode, block
 
@@ -1623,7 +1625,7 @@ def __init__(self, filename, mode, block=True, encoding=None):
         self.f = os.fdopen(os.open(filename, flags, 0o666), mode, encoding=encoding)
 
     def __enter__(self):
-        exclusive = 'r' not in self.mode
+        exclusive = 'r' not in self.mode or '+' in self.mode
         try:
             _lock_file(self.f, exclusive, self.block)
             self.locked = True
@@ -2286,6 +2288,340 @@ def __str__(self):
         return repr(self.exhaust())
 
 
+class _FragmentSequence(collections.abc.Sequence):
+    """Base of the compact sequences of fragments, which compare equal to a list of the same fragments"""
+
+    def _get(self, idx):
+        raise NotImplementedError('This method must be implemented by subclasses')
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        elif not isinstance(idx, int):
+            raise TypeError('indices must be integers or slices')
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('fragment index out of range')
+        return self._get(idx)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other, strict=True))
+
+    def __repr__(self):
+        # repr should mimic a list
+        return repr(list(self))
+
+
+class DashFragments(_FragmentSequence):
+    """
+    Fragments of a DASH representation, expanded from its SegmentTemplate only when accessed
+
+    Fragments that are given explicitly are stored in a FragmentTable, while the segments
+    of a template are stored as runs of (number, time, duration, count), so that no dict
+    is created per segment for the formats that are not downloaded. It compares equal to
+    a list of the same fragments. The fragments are created anew on each access, so
+    changes made to them are not kept
+    """
+
+    def __init__(self, fragments=()):
+        self._parts = []
+        # Number of fragments up to the end of each part
+        self._ends = []
+        self.extend(fragments)
+
+    def _add_part(self, part):
+        if len(part):
+            self._ends.append(len(self) + len(part))
+            self._parts.append(part)
+
+    def append(self, fragment):
+        self._add_part([fragment])
+
+    def extend(self, fragments):
+        if isinstance(fragments, DashFragments):
+            for part in fragments._parts:
+                self._add_part(part)
+        else:
+            self._add_part(FragmentTable(fragments))
+
+    def add_template(self, location_key, template, timescale, runs, **values):
+        """
+        Add the segments of a media template
+
+        @param location_key  'url' or 'path'
+        @param template      Template for the % operator. Number and Time are
+                             filled in for each segment, the other fields from values
+        @param runs          (number, time, duration, count) of each run of segments
+                             that have the same duration, in units of the timescale
+        """
+        self._add_part(_SegmentTemplateRuns(location_key, template, timescale, runs, values))
+
+    def __len__(self):
+        return self._ends[-1] if self._ends else 0
+
+    def duration(self):
+        """@returns the total duration of the fragments, or None if that of one of them is unknown"""
+        total = 0
+        for part in self._parts:
+            if isinstance(part, _SegmentTemplateRuns):
+                duration = part.duration()
+            else:
+                duration = try_call(lambda: sum(fragment['duration'] for fragment in part))
+            if duration is None:
+                return None
+            total += duration
+        return float(total)
+
+    def positions(self):
+        """
+        Yield the $Number$ of each segment of a template that uses it, its $Time$
+        for the other templates, and None for the fragments that were given explicitly
+        """
+        for part in self._parts:
+            if isinstance(part, _SegmentTemplateRuns):
+                yield from part.positions()
+            else:
+                yield from itertools.repeat(None, len(part))
+
+    def _get(self, idx):
+        part = bisect.bisect_right(self._ends, idx)
+        return self._parts[part][idx - (self._ends[part - 1] if part else 0)]
+
+    def __iter__(self):
+        for part in self._parts:
+            yield from part
+
+
+class _SegmentTemplateRuns:
+    def __init__(self, location_key, template, timescale, runs, values):
+        self._location_key, self._template = location_key, template
+        self._timescale, self._values = timescale, values
+        self._runs = [run for run in runs if run[3] > 0]
+        self._ends = list(itertools.accumulate(count for *_, count in self._runs))
+
+    def __len__(self):
+        return self._ends[-1] if self._ends else 0
+
+    def duration(self):
+        if any(duration is None for _, _, duration, _ in self._runs):
+            return None
+        return sum(duration * count for _, _, duration, count in self._runs) / self._timescale
+
+    def positions(self):
+        # The segments are identified by the value that their URLs are made from
+        by_number = '%(Number' in self._template
+        for number, start_time, duration, count in self._runs:
+            for offset in range(count):
+                yield number + offset if by_number else start_time + offset * (duration or 0)
+
+    def _fragment(self, run, offset):
+        number, time, duration, _ = run
+        return {
+            self._location_key: self._template % {
+                **self._values,
+                'Number': number + offset,
+                'Time': time + offset * (duration or 0),
+            },
+            'duration': float_or_none(duration, self._timescale),
+        }
+
+    def __getitem__(self, idx):
+        run = bisect.bisect_right(self._ends, idx)
+        return self._fragment(self._runs[run], idx - (self._ends[run] - self._runs[run][3]))
+
+    def __iter__(self):
+        for run in self._runs:
+            for offset in range(run[3]):
+                yield self._fragment(run, offset)
+
+
+class FragmentTable(_FragmentSequence):
+    """
+    Compact table of fragments, which stores each of their fields as a column
+
+    Strings are stored as suffixes of their common prefix and numbers in arrays.
+    Fields whose value rarely changes from one fragment to the next, like the
+    duration or decrypt_info, are stored as runs of the same value, which is shared
+    by the fragments of the run. Dicts, like byte_range, are stored in a nested table.
+    It compares equal to a list of the same fragments. The fragment dicts are created
+    anew on each access, so changes made to them are not kept.
+
+    to_json gives its compact JSON encoding, which from_json reads back
+    """
+
+    JSON_VERSION = 1
+
+    def __init__(self, fragments=()):
+        fragments = list(fragments)
+        self._len = len(fragments)
+        # key -> (column, indices, whether the indices are of the fragments that have the key
+        #         rather than of those that do not), storing whichever indices are fewer
+        self._columns = {}
+        for key in dict.fromkeys(itertools.chain.from_iterable(fragments)):
+            absent = frozenset(i for i, fragment in enumerate(fragments) if key not in fragment)
+            self._add_column(key, [fragment.get(key) for fragment in fragments], absent)
+
+    def _add_column(self, key, values, absent):
+        column = _make_fragment_column(values, absent)
+        if len(absent) * 2 > self._len:
+            self._columns[key] = column, frozenset(range(self._len)) - absent, True
+        else:
+            self._columns[key] = column, absent, False
+
+    def __len__(self):
+        return self._len
+
+    def _get(self, idx):
+        return {
+            key: column[idx] for key, (column, indices, listed_present) in self._columns.items()
+            if (idx in indices) == listed_present}
+
+    def __iter__(self):
+        for idx in range(self._len):
+            yield self._get(idx)
+
+    def to_json(self):
+        columns = {}
+        for key, (column, indices, listed_present) in self._columns.items():
+            columns[key] = column.to_json()
+            if listed_present or indices:
+                columns[key]['present' if listed_present else 'absent'] = sorted(indices)
+        return {'fragment_table': self.JSON_VERSION, 'count': self._len, 'columns': columns}
+
+    @staticmethod
+    def is_json(obj):
+        return isinstance(obj, dict) and obj.get('fragment_table') == FragmentTable.JSON_VERSION
+
+    @classmethod
+    def from_json(cls, obj):
+        table = cls()
+        table._len = obj['count']
+        for key, column in obj['columns'].items():
+            if 'prefix' in column:
+                values = [column['prefix'] + suffix for suffix in column['suffixes']]
+            elif 'runs' in column:
+                values = [value for value, count in column['runs'] for _ in range(count)]
+            elif 'table' in column:
+                values = list(cls.from_json(column['table']))
+            else:
+                values = column['values']
+            if 'present' in column:
+                absent = frozenset(range(table._len)) - frozenset(column['present'])
+            else:
+                absent = frozenset(column.get('absent') or ())
+            table._add_column(key, values, absent)
+        return table
+
+    @classmethod
+    def load_json(cls, obj):
+        """Replace the fragment tables in JSON data by FragmentTable"""
+        if cls.is_json(obj):
+            return cls.from_json(obj)
+        elif isinstance(obj, dict):
+            return {key: cls.load_json(value) for key, value in obj.items()}
+        elif isinstance(obj, list):
+            return list(map(cls.load_json, obj))
+        return obj
+
+
+def _make_fragment_column(values, absent):
+    """Choose the most compact column for the values; the values at the absent indices are ignored"""
+    present = [value for i, value in enumerate(values) if i not in absent]
+    if absent:
+        # Continue the runs over the absent values
+        filled = []
+        for i, value in enumerate(values):
+            filled.append((filled[-1] if filled else present[0]) if i in absent and present else value)
+    else:
+        filled = values
+    # Keep the type of the values, since e.g. 1 == True
+    run_count = sum(1 for _ in itertools.groupby(filled, lambda v: (type(v), v)))
+    if run_count * 4 <= len(values):
+        return _RunColumn(filled)
+    types = set(map(type, present))
+    if types == {str}:
+        return _PrefixColumn(values, os.path.commonprefix(present))  # noqa: RUF071
+    elif types == {dict}:
+        return _TableColumn(values)
+    elif types == {int}:
+        with contextlib.suppress(OverflowError):
+            return _ArrayColumn('q', values)
+    elif types == {float}:
+        return _ArrayColumn('d', values)
+    return _ListColumn(values)
+
+
+class _PrefixColumn:
+    def __init__(self, values, prefix):
+        self._prefix = prefix
+        suffixes = [value[len(prefix):] if isinstance(value, str) else '' for value in values]
+        self._data = ''.join(suffixes)
+        self._offsets = array.array('Q', itertools.accumulate(map(len, suffixes), initial=0))
+
+    def __getitem__(self, idx):
+        return self._prefix + self._data[self._offsets[idx]:self._offsets[idx + 1]]
+
+    def to_json(self):
+        return {
+            'prefix': self._prefix,
+            'suffixes': [self._data[start:end] for start, end in itertools.pairwise(self._offsets)],
+        }
+
+
+class _RunColumn:
+    def __init__(self, values):
+        self._values, counts = [], []
+        for _, run in itertools.groupby(values, lambda v: (type(v), v)):
+            run = list(run)
+            self._values.append(run[0])
+            counts.append(len(run))
+        self._ends = array.array('Q', itertools.accumulate(counts))
+
+    def __getitem__(self, idx):
+        return self._values[bisect.bisect_right(self._ends, idx)]
+
+    def to_json(self):
+        return {'runs': [
+            [value, end - start] for value, (start, end)
+            in zip(self._values, itertools.pairwise([0, *self._ends]), strict=True)]}
+
+
+class _TableColumn:
+    def __init__(self, values):
+        self._table = FragmentTable(value or {} for value in values)
+
+    def __getitem__(self, idx):
+        return self._table[idx]
+
+    def to_json(self):
+        return {'table': self._table.to_json()}
+
+
+class _ArrayColumn:
+    def __init__(self, typecode, values):
+        self._values = array.array(typecode, (value or 0 for value in values))
+
+    def __getitem__(self, idx):
+        return self._values[idx]
+
+    def to_json(self):
+        return {'values': self._values.tolist()}
+
+
+class _ListColumn:
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, idx):
+        return self._values[idx]
+
+    def to_json(self):
+        return {'values': list(self._values)}
+
+
 class PagedList:
 
     class IndexError(IndexError):  # noqa: A001
@@ -8,7 +8,10 @@
 in RFC 8216 §3.5 <https://tools.ietf.org/html/rfc8216#section-3.5>.
 """
 
+import collections
+import heapq
 import io
+import itertools
 import re
 
 from .utils import int_or_none, timetuple_from_msec
@@ -353,6 +356,92 @@ def hinges(self, other):
         return self.start <= self.end == other.start <= other.end
 
 
+class CueDedupWindow:
+    """
+    The cues of a segmented WebVTT stream that may still be repeated by later segments
+
+    Segmenters repeat a cue in every segment that it overlaps, or split it into
+    consecutive cues with the same text. A cue is therefore held back until a cue
+    starting after its end is added; repetitions are dropped and continuations
+    extend it. The cues are kept in a heap ordered by end time and indexed by
+    their text, so that adding a cue does not need to look at the whole window
+    """
+
+    def __init__(self, cues=()):
+        self._cues = {}  # sequence number -> cue, in the order they were added
+        self._by_text = collections.defaultdict(set)  # (text, settings) -> sequence numbers
+        self._ends = []  # heap of (end, sequence number); outdated once the cue is extended or removed
+        self._sequence = itertools.count()
+        for cue in cues:
+            self._insert(cue)
+
+    def __len__(self):
+        return len(self._cues)
+
+    def __iter__(self):
+        return iter(self._cues.values())
+
+    def add(self, cue):
+        """
+        Add a cue, unless it repeats or continues one in the window
+
+        @returns the cues that ended before it starts, in the order they were added
+        """
+        matched = set()
+        for seq in self._by_text.get((cue.text, cue.settings), ()):
+            wcue = self._cues[seq]
+            if wcue.hinges(cue):
+                if wcue.end != cue.end:
+                    wcue.end = cue.end
+                    heapq.heappush(self._ends, (wcue.end, seq))
+            elif wcue != cue:
+                continue
+            matched.add(seq)
+
+        ready, kept = [], []
+        while self._ends and self._ends[0][0] <= cue.start:
+            end, seq = heapq.heappop(self._ends)
+            wcue = self._cues.get(seq)
+            if wcue is None or wcue.end != end:
+                continue
+            if seq in matched:
+                kept.append((end, seq))
+                continue
+            ready.append(seq)
+        for entry in kept:
+            heapq.heappush(self._ends, entry)
+
+        if not matched:
+            self._insert(cue)
+        return [self._remove(seq) for seq in sorted(ready)]
+
+    def _insert(self, cue):
+        seq = next(self._sequence)
+        self._cues[seq] = cue
+        self._by_text[cue.text, cue.settings].add(seq)
+        heapq.heappush(self._ends, (cue.end, seq))
+
+    def _remove(self, seq):
+        cue = self._cues.pop(seq)
+        key = cue.text, cue.settings
+        self._by_text[key].discard(seq)
+        if not self._by_text[key]:
+            del self._by_text[key]
+        return cue
+
+    @property
+    def as_json(self):
+        return [[cue.id, cue.start, cue.end, cue.text, cue.settings] for cue in self]
+
+    @classmethod
+    def from_json(cls, json):
+        # Older versions stored the window as a list of CueBlock.as_json
+        return cls(
+            CueBlock.from_json(cue) if isinstance(cue, dict)
+            else CueBlock(id=cue[0], start=cue[1], end=cue[2], text=cue[3], settings=cue[4])
+            for cue in json)
+
+
 def parse_fragment(frag_content):
     """
     A generator that yields (partially) parsed WebVTT blocks when given